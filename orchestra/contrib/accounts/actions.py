@@ -209,11 +209,10 @@ def disable_selected(modeladmin, request, queryset, disable=True):
     # The user has already confirmed the deletion.
     # Do the disable and return a None to display the change list view again.
     if request.POST.get('post'):
-        n = 0
-        for account in queryset:
-            account.disable() if disable else account.enable()
+        accounts = queryset.disable() if disable else queryset.enable()
+        for account in accounts:
             modeladmin.log_change(request, account, verbose_action_name.capitalize())
-            n += 1
+        n = len(accounts)
         modeladmin.message_user(request, ungettext(
             _("One account has been successfully %s.") % verbose_action_name,
             _("%i accounts have been successfully %s.") % (n, verbose_action_name),
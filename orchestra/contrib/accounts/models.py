@@ -10,13 +10,34 @@ from django.utils.translation import ugettext_lazy as _
 #from orchestra.contrib.orchestration.middlewares import OperationsMiddleware
 #from orchestra.contrib.orchestration import Operation
 from orchestra.core import services
+from orchestra.core.signals import post_save_many
 from orchestra.models.utils import has_db_field
 from orchestra.utils.mail import send_email_template
 
 from . import settings
 
 
-class AccountManager(auth.UserManager):
+class AccountQuerySet(models.QuerySet):
+    def disable(self):
+        return self.set_active(False)
+    
+    def enable(self):
+        return self.set_active(True)
+    
+    def set_active(self, is_active):
+        """ bulk version of Account.disable()/enable(), returns the affected accounts """
+        accounts = list(self)
+        Account.objects.filter(pk__in=[account.pk for account in accounts]).update(
+            is_active=is_active)
+        for account in accounts:
+            account.is_active = is_active
+        if accounts:
+            post_save_many.send(sender=Account, instances=accounts, update_fields=('is_active',))
+            Account.notify_related_many(accounts)
+        return accounts
+
+
+class AccountManager(auth.UserManager.from_queryset(AccountQuerySet)):
     def get_main(self):
         return self.get(pk=settings.ACCOUNTS_MAIN_PK)
 
@@ -82,32 +103,54 @@ class Account(auth.AbstractBaseUser):
     
     def disable(self):
         self.is_active = False
+        # save() notifies related services when is_active changes
         self.save(update_fields=('is_active',))
-        self.notify_related()
     
     def enable(self):
         self.is_active = True
         self.save(update_fields=('is_active',))
-        self.notify_related()
     
-    def get_services_to_disable(self):
+    @classmethod
+    def get_related_services(cls):
+        """ reverse relations of the services that depend on the account state """
         related_fields = [
-            f for f in self._meta.get_fields()
+            f for f in cls._meta.get_fields()
             if (f.one_to_many or f.one_to_one)
             and f.auto_created and not f.concrete
         ]
         for rel in related_fields:
             source = getattr(rel, 'related_model', rel.model)
             if source in services and hasattr(source, 'active'):
-                for obj in getattr(self, rel.get_accessor_name()).all():
-                    yield obj
+                yield rel
+    
+    def get_services_to_disable(self):
+        for rel in self.get_related_services():
+            source = getattr(rel, 'related_model', rel.model)
+            for obj in source.objects.filter(**{rel.field.name: self}):
+                yield obj
     
     def notify_related(self):
         """ Trigger save() on related objects that depend on this account """
-        for obj in self.get_services_to_disable():
-            signals.pre_save.send(sender=type(obj), instance=obj)
-            signals.post_save.send(sender=type(obj), instance=obj)
-#            OperationsMiddleware.collect(Operation.SAVE, instance=obj, update_fields=())
+        type(self).notify_related_many([self])
+    
+    @classmethod
+    def notify_related_many(cls, accounts):
+        """
+        notify_related() of many accounts, related services are fetched and post_save_many
+        is sent once per model instead of one post_save per object.
+        post_save is not sent, receivers that need it have to handle post_save_many.
+        """
+        accounts = {account.pk: account for account in accounts}
+        for rel in cls.get_related_services():
+            source = getattr(rel, 'related_model', rel.model)
+            field = rel.field
+            objs = list(source.objects.filter(**{'%s__in' % field.name: list(accounts)}))
+            for obj in objs:
+                # Related services see the in-memory account state
+                setattr(obj, field.name, accounts[getattr(obj, field.attname)])
+                signals.pre_save.send(sender=source, instance=obj)
+            if objs:
+                post_save_many.send(sender=source, instances=objs)
     
     def get_contacts_emails(self, usages=None):
         contacts = self.contacts.all()
@@ -0,0 +1,98 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import signals
+
+from orchestra.contrib.orchestration import backends
+from orchestra.contrib.orchestration.middlewares import OperationsMiddleware
+from orchestra.contrib.orchestration.models import Route, Server
+from orchestra.contrib.services.models import Service
+from orchestra.contrib.systemusers.backends import UNIXUserController
+from orchestra.contrib.systemusers.models import SystemUser
+from orchestra.utils.python import AttrDict
+from orchestra.utils.tests import BaseTestCase
+
+
+def disable(account):
+    """ Former implementation, one pre_save and post_save per related service """
+    account.is_active = False
+    super(type(account), account).save(update_fields=('is_active',))
+    for obj in account.get_services_to_disable():
+        signals.pre_save.send(sender=type(obj), instance=obj)
+        signals.post_save.send(sender=type(obj), instance=obj)
+
+
+class DisableTests(BaseTestCase):
+    DEPENDENCIES = (
+        'orchestra.contrib.orchestration',
+        'orchestra.contrib.orders',
+        'orchestra.contrib.services',
+        'orchestra.contrib.systemusers',
+    )
+    
+    def setUp(self):
+        Route._meta.get_field('backend')._choices = backends.ServiceBackend.get_choices()
+        server = Server.objects.create(name='web.example.com')
+        Route.objects.create(backend=UNIXUserController.get_name(), host=server, match='True')
+        Service.objects.create(
+            description="System user",
+            content_type=ContentType.objects.get_for_model(SystemUser),
+            match='systemuser.active',
+            billing_period=Service.NEVER,
+            metric='',
+            pricing_period=Service.NEVER,
+            rate_algorithm='orchestra.contrib.plans.ratings.step_price',
+            on_cancel=Service.NOTHING,
+            payment_style=Service.PREPAY,
+            tax=0,
+            nominal_price=10,
+        )
+        OperationsMiddleware.thread_locals.request = AttrDict()
+    
+    def tearDown(self):
+        del OperationsMiddleware.thread_locals.request
+    
+    def create_account(self):
+        account = super(DisableTests, self).create_account()
+        account.main_systemuser.is_active = True
+        account.main_systemuser.save()
+        for suffix in ('ftp', 'sftp'):
+            SystemUser.objects.create_user('%s_%s' % (account.username, suffix), account=account)
+        return account
+    
+    def get_state(self, account):
+        """ collected operations and orders, account independent """
+        operations = OperationsMiddleware.get_pending_operations()
+        operations = sorted(
+            (op.backend.get_name(), op.action, str(op.instance).replace(account.username, ''))
+            for op in operations
+        )
+        orders = account.orders.order_by('id').values_list('description', 'cancelled_on')
+        orders = [(description.replace(account.username, ''), cancelled_on)
+                  for description, cancelled_on in orders]
+        OperationsMiddleware.thread_locals.request = AttrDict()
+        return operations, orders
+    
+    def test_disable(self):
+        former = self.create_account()
+        account = self.create_account()
+        self.assertEqual(3, account.orders.active().count())
+        self.get_state(account)
+        disable(former)
+        account.disable()
+        former_state = self.get_state(former)
+        state = self.get_state(account)
+        self.assertEqual(former_state, state)
+        operations, orders = state
+        self.assertTrue(operations)
+        self.assertEqual(0, account.orders.active().count())
+    
+    def test_disable_many(self):
+        former = self.create_account()
+        accounts = [self.create_account(), self.create_account()]
+        self.get_state(former)
+        disable(former)
+        former_state = self.get_state(former)
+        type(former).objects.filter(pk__in=[account.pk for account in accounts]).disable()
+        operations = OperationsMiddleware.get_pending_operations()
+        self.assertEqual(2*len(former_state[0]), len(operations))
+        for account in accounts:
+            self.assertEqual(former_state[1], self.get_state(account)[1])
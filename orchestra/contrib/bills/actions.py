@@ -1,4 +1,4 @@
-import io
+import tempfile
 import zipfile
 from datetime import date
 
@@ -8,7 +8,7 @@ from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.db import transaction
 from django.forms.models import modelformset_factory
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
 from django.shortcuts import render, redirect
 from django.utils import translation, timezone
 from django.utils.safestring import mark_safe
@@ -20,7 +20,7 @@ from orchestra.admin.utils import get_object_from_url, change_url
 
 from . import settings
 from .forms import SelectSourceForm
-from .helpers import validate_contact, set_context_emails
+from .helpers import validate_contact, set_context_emails, render_many
 from .models import Bill, BillLine
 
 
@@ -49,12 +49,10 @@ def close_bills(modeladmin, request, queryset, action='close_bills'):
     if request.POST.get('post') == 'generic_confirmation':
         formset = SelectSourceFormSet(request.POST, request.FILES, queryset=queryset)
         if formset.is_valid():
-            transactions = []
-            for form in formset.forms:
-                source = form.cleaned_data['source']
-                transaction = form.instance.close(payment=source)
-                if transaction:
-                    transactions.append(transaction)
+            payments = {
+                form.instance.pk: form.cleaned_data['source'] for form in formset.forms
+            }
+            transactions = queryset.close(payments=payments)
             for bill in queryset:
                 modeladmin.log_change(request, bill, 'Closed')
             messages.success(request, _("Selected bills have been closed"))
@@ -107,8 +105,8 @@ def send_bills_action(modeladmin, request, queryset):
         if not validate_contact(request, bill):
             return False
     num = 0
-    for bill in queryset:
-        bill.send()
+    for bill, pdf in zip(queryset, render_many(queryset)):
+        bill.send(pdf=pdf)
         modeladmin.log_change(request, bill, 'Sent')
         num += 1
     messages.success(request, ungettext(
@@ -129,13 +127,13 @@ def download_bills(modeladmin, request, queryset):
         if not validate_contact(request, bill):
             return False
     if len(queryset) > 1:
-        bytesio = io.BytesIO()
-        archive = zipfile.ZipFile(bytesio, 'w')
-        for bill in queryset:
-            pdf = bill.as_pdf()
-            archive.writestr('%s.pdf' % bill.number, pdf)
-        archive.close()
-        response = HttpResponse(bytesio.getvalue(), content_type='application/pdf')
+        # PDFs are written to disk as they are rendered
+        archive_file = tempfile.TemporaryFile()
+        with zipfile.ZipFile(archive_file, 'w') as archive:
+            for bill, pdf in zip(queryset, render_many(queryset)):
+                archive.writestr('%s.pdf' % bill.number, pdf)
+        archive_file.seek(0)
+        response = FileResponse(archive_file, content_type='application/pdf')
         response['Content-Disposition'] = 'attachment; filename="orchestra-bills.zip"'
         return response
     bill = queryset[0]
@@ -237,9 +235,13 @@ def move_lines(modeladmin, request, queryset, action=None):
         return render(request, 'admin/orchestra/generic_confirmation.html', context)
     target = Bill.objects.get(pk=int(pk))
     if request.POST.get('post') == 'generic_confirmation':
+        sources = set()
         for line in queryset:
+            sources.add(line.bill_id)
             line.bill = target
             line.save(update_fields=['bill'])
+        # Target totals are updated on save
+        Bill.objects.filter(pk__in=sources).update_totals()
         # TODO bill history update
         messages.success(request, _("Lines moved"))
     # Final confirmation
@@ -253,7 +253,7 @@ class BillAdminMixin(AccountAdminMixin):
             return '<span title="%s">%s &%s;</span>' % (subtotals, bill.compute_total(), currency)
     display_total_with_subtotals.allow_tags = True
     display_total_with_subtotals.short_description = _("total")
-    display_total_with_subtotals.admin_order_field = 'approx_total'
+    display_total_with_subtotals.admin_order_field = 'computed_total'
 
     def display_payment_state(self, bill):
         if bill.pk:
@@ -281,13 +281,7 @@ class BillAdminMixin(AccountAdminMixin):
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        qs = qs.annotate(
-            models.Count('lines'),
-            # FIXME https://code.djangoproject.com/ticket/10060
-            approx_total=Coalesce(Sum(
-                (F('lines__subtotal') + Coalesce('lines__sublines__total', 0)) * (1+F('lines__tax')/100),
-            ), 0),
-        )
+        qs = qs.annotate(models.Count('lines')).with_totals()
         qs = qs.prefetch_related(
             Prefetch('amends', queryset=Bill.objects.filter(is_open=False), to_attr='closed_amends')
         )
@@ -379,7 +373,7 @@ class BillAdmin(BillAdminMixin, ExtendedModelAdmin):
         return '%s &%s;' % (bill.compute_total(), currency)
     display_total.allow_tags = True
     display_total.short_description = _("total")
-    display_total.admin_order_field = 'approx_total'
+    display_total.admin_order_field = 'computed_total'
     
     def type_link(self, bill):
         bill_type = bill.type.lower()
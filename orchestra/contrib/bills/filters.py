@@ -56,13 +56,13 @@ class TotalListFilter(SimpleListFilter):
     
     def queryset(self, request, queryset):
         if self.value() == 'gt':
-            return queryset.filter(approx_total__gt=0)
+            return queryset.filter(computed_total__gt=0)
         elif self.value() == 'eq':
-            return queryset.filter(approx_total=0)
+            return queryset.filter(computed_total=0)
         elif self.value() == 'lt':
-            return queryset.filter(approx_total__lt=0)
+            return queryset.filter(computed_total__lt=0)
         elif self.value() == 'ne':
-            return queryset.exclude(approx_total=0)
+            return queryset.exclude(computed_total=0)
         return queryset
 
 
@@ -97,17 +97,16 @@ class PaymentStateListFilter(SimpleListFilter):
         )
     
     def queryset(self, request, queryset):
-        # FIXME use queryset.computed_total instead of approx_total, bills.admin.BillAdmin.get_queryset
         Transaction = queryset.model.transactions.field.remote_field.related_model
         if self.value() == 'OPEN':
             return queryset.filter(Q(is_open=True)|Q(type=queryset.model.PROFORMA))
         elif self.value() == 'PAID':
-            zeros = queryset.filter(approx_total=0, approx_total__isnull=True)
+            zeros = queryset.filter(computed_total=0, computed_total__isnull=True)
             zeros = zeros.values_list('id', flat=True)
             amounts = Transaction.objects.exclude(bill_id__in=zeros).secured().group_by('bill_id')
             paid = []
-            relevant = queryset.exclude(approx_total=0, approx_total__isnull=True, is_open=True)
-            for bill_id, total in relevant.values_list('id', 'approx_total'):
+            relevant = queryset.exclude(computed_total=0, computed_total__isnull=True, is_open=True)
+            for bill_id, total in relevant.values_list('id', 'computed_total'):
                 try:
                     amount = sum([t.amount for t in amounts[bill_id]])
                 except KeyError:
@@ -116,8 +115,8 @@ class PaymentStateListFilter(SimpleListFilter):
                     if abs(total) <= abs(amount):
                         paid.append(bill_id)
             return queryset.filter(
-                Q(approx_total=0) |
-                Q(approx_total__isnull=True) |
+                Q(computed_total=0) |
+                Q(computed_total__isnull=True) |
                 Q(id__in=paid)
             ).exclude(is_open=True)
         elif self.value() == 'PENDING':
@@ -127,7 +126,7 @@ class PaymentStateListFilter(SimpleListFilter):
             paid = paid.values_list('id', flat=True).distinct()
             return queryset.filter(pk__in=paid)
         elif self.value() == 'BAD_DEBT':
-            closed = queryset.filter(is_open=False).exclude(approx_total=0)
+            closed = queryset.filter(is_open=False).exclude(computed_total=0)
             return closed.filter(
                 Q(transactions__state=Transaction.REJECTED) |
                 Q(transactions__isnull=True)
@@ -7,6 +7,9 @@ from django.utils.text import capfirst
 from django.utils.translation import ugettext_lazy as _
 
 from orchestra.admin.utils import change_url
+from orchestra.utils.html import html_to_pdf_many
+
+from . import settings
 
 
 def validate_contact(request, bill, error=True):
@@ -42,3 +45,14 @@ def set_context_emails(modeladmin, request, queryset):
     return {
         'display_objects': bills
     }
+
+
+def render_many(bills):
+    """
+    yields the PDFs of bills in the same order, HTML is rendered sequentially (database access)
+    and converted to PDF concurrently by BILLS_RENDER_WORKERS renderers
+    """
+    documents = (
+        (bill.html or bill.render(), bill.has_multiple_pages) for bill in bills
+    )
+    return html_to_pdf_many(documents, workers=settings.BILLS_RENDER_WORKERS)
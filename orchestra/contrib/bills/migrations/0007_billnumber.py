@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0006_auto_20150709_1016'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillNumber',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=16, verbose_name='prefix')),
+                ('year', models.PositiveIntegerField(verbose_name='year')),
+                ('last', models.PositiveIntegerField(default=0, verbose_name='last number')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='billnumber',
+            unique_together=set([('prefix', 'year')]),
+        ),
+    ]
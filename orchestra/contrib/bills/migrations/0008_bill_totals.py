@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def compute_totals(apps, schema_editor):
+    Bill = apps.get_model('bills', 'Bill')
+    BillLine = apps.get_model('bills', 'BillLine')
+    totals = {}
+    for line in BillLine.objects.prefetch_related('sublines'):
+        base = line.subtotal + sum(subline.total for subline in line.sublines.all())
+        bill_totals = totals.setdefault(line.bill_id, [0, 0, 0])
+        bill_totals[0] += base
+        bill_totals[1] += base*line.tax/100
+        bill_totals[2] += base*(1+line.tax/100)
+    for bill_id in Bill.objects.values_list('pk', flat=True):
+        base, tax, total = totals.get(bill_id, (0, 0, 0))
+        Bill.objects.filter(pk=bill_id).update(
+            base=round(base, 2), tax=round(tax, 2), total=round(total, 2))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0007_billnumber'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='base',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='base'),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='tax',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='tax'),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='total',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='total'),
+        ),
+        migrations.RunPython(compute_totals, migrations.RunPython.noop),
+    ]
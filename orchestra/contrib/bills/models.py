@@ -1,10 +1,16 @@
 import datetime
+import threading
+from collections import OrderedDict
+from functools import lru_cache, partial
+
 from dateutil.relativedelta import relativedelta
 
+from django import db
+from django.conf import settings as djsettings
 from django.core.urlresolvers import reverse
 from django.core.validators import ValidationError, RegexValidator
-from django.db import models
-from django.db.models import F, Sum
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, F, Sum, Value, When
 from django.db.models.functions import Coalesce
 from django.template import loader, Context
 from django.utils import timezone, translation
@@ -22,6 +28,22 @@ from orchestra.utils.html import html_to_pdf
 from . import settings
 
 
+@lru_cache()
+def get_cached_bill_template(template):
+    return loader.get_template(template)
+
+
+def get_bill_template(template):
+    """
+    Compiled bill templates are reused, translations are resolved when rendering
+    so the same template serves all the languages. Not cached on DEBUG, template
+    changes are applied without restarting.
+    """
+    if djsettings.DEBUG:
+        return loader.get_template(template)
+    return get_cached_bill_template(template)
+
+
 class BillContact(models.Model):
     account = models.OneToOneField('accounts.Account', verbose_name=_("account"),
         related_name='billcontact')
@@ -52,13 +74,200 @@ class BillContact(models.Model):
         })
 
 
-class BillManager(models.Manager):
+class BillQuerySet(models.QuerySet):
+    def compute_totals(self):
+        """ {bill.pk: (base, tax, total)} computed from lines and sublines with a single query """
+        totals = {}
+        lines = BillLine.objects.filter(bill__in=self.values('pk')).annotate(
+            subline_total=Coalesce(Sum('sublines__total'), 0)
+        )
+        for bill_id, subtotal, tax, subline_total in lines.values_list(
+                'bill_id', 'subtotal', 'tax', 'subline_total'):
+            base = subtotal + subline_total
+            bill_totals = totals.setdefault(bill_id, [0, 0, 0])
+            bill_totals[0] += base
+            bill_totals[1] += base*tax/100
+            bill_totals[2] += base*(1+tax/100)
+        return {
+            bill_id: tuple(round(value, 2) for value in bill_totals)
+                for bill_id, bill_totals in totals.items()
+        }
+    
+    def update_totals(self):
+        """
+        stores base, tax and total of the bills with a single query, bills without lines
+        are zeroed. Returns {bill.pk: (base, tax, total)}
+        """
+        bill_ids = list(self.values_list('pk', flat=True))
+        totals = Bill.objects.filter(pk__in=bill_ids).compute_totals()
+        if bill_ids:
+            values = {}
+            for ix, name in enumerate(('base', 'tax', 'total')):
+                values[name] = Case(
+                    *(When(pk=bill_id, then=Value(bill_totals[ix]))
+                        for bill_id, bill_totals in totals.items()),
+                    default=Value(0), output_field=Bill._meta.get_field(name))
+            Bill.objects.filter(pk__in=bill_ids).update(**values)
+        return {
+            bill_id: totals.get(bill_id, (0, 0, 0)) for bill_id in bill_ids
+        }
+    
+    def with_totals(self):
+        """ computed_total annotation for sorting and filtering, missing totals count as zero """
+        return self.annotate(computed_total=Coalesce(F('total'), 0))
+    
+    def close(self, payments=None):
+        """
+        Bulk version of Bill.close(), returns the created transactions
+        payments: {bill.pk: payment source}, accounts default source when missing
+        HTML is rendered concurrently once the bills have been committed
+        """
+        from orchestra.contrib.payments.models import Transaction
+        payments = dict(payments or {})
+        bills = list(self.select_related('account'))
+        default_payments = {}
+        for bill in bills:
+            if not bill.is_open:
+                raise TypeError("Bill not in Open state.")
+            if bill.pk not in payments:
+                if bill.account_id not in default_payments:
+                    default_payments[bill.account_id] = bill.account.paymentsources.get_default()
+                payments[bill.pk] = default_payments[bill.account_id]
+        # Plain queryset, admin changelist annotations do not mix well with subqueries
+        totals = Bill.objects.filter(pk__in=[bill.pk for bill in bills]).compute_totals()
+        now = timezone.now()
+        with transaction.atomic():
+            pending = OrderedDict()
+            transactions = []
+            for bill in bills:
+                payment = payments[bill.pk]
+                if not bill.due_on:
+                    bill.due_on = bill.get_due_date(payment=payment)
+                if bill.get_type() != bill.PROFORMA:
+                    amount = totals.get(bill.pk, (0, 0, 0))[2]
+                    state = Transaction.objects.get_initial_state(payment, amount)
+                    transactions.append(Transaction(
+                        bill=bill, source=payment, amount=amount, state=state))
+                bill.closed_on = now
+                bill.is_open = False
+                bill.is_sent = False
+                pending.setdefault((type(bill), bill.get_type()), []).append(bill)
+            for group in pending.values():
+                # Closed bills numbers are reserved all at once
+                for bill, number in zip(group, group[0].get_numbers(len(group))):
+                    bill.number = number
+            if bills:
+                Bill.objects.filter(pk__in=[bill.pk for bill in bills]).update(
+                    number=Case(*(When(pk=bill.pk, then=Value(bill.number)) for bill in bills),
+                        output_field=Bill._meta.get_field('number')),
+                    due_on=Case(*(When(pk=bill.pk, then=Value(bill.due_on)) for bill in bills),
+                        output_field=Bill._meta.get_field('due_on')),
+                    closed_on=now,
+                    updated_on=now,
+                    is_open=False,
+                    is_sent=False,
+                )
+            Transaction.objects.bulk_create(transactions)
+            if transactions and not connection.features.can_return_ids_from_bulk_insert:
+                # Each bill gets a single transaction, the last one created
+                ids = dict(Transaction.objects.filter(
+                    bill__in=[obj.bill_id for obj in transactions]).order_by('id').values_list('bill_id', 'id'))
+                for obj in transactions:
+                    obj.pk = ids[obj.bill_id]
+        transaction.on_commit(partial(render_html, bills, payments))
+        return transactions
+
+
+def render_html(bills, payments=None):
+    """ renders and stores the HTML of closed bills using BILLS_RENDER_WORKERS threads """
+    payments = payments or {}
+    
+    def render(chunk):
+        try:
+            for bill in chunk:
+                html = bill.render(payment=payments.get(bill.pk, False))
+                type(bill).objects.filter(pk=bill.pk).update(html=html)
+                bill.html = html
+        finally:
+            if threading.current_thread() is not main_thread:
+                db.connection.close()
+    
+    main_thread = threading.current_thread()
+    workers = max(min(settings.BILLS_RENDER_WORKERS, len(bills)), 1)
+    if workers < 2 or transaction.get_connection().in_atomic_block:
+        # Other connections would not see uncommitted changes
+        render(bills)
+        return
+    threads = []
+    for ix in range(1, workers):
+        thread = threading.Thread(target=render, args=(bills[ix::workers],))
+        thread.start()
+        threads.append(thread)
+    render(bills[0::workers])
+    for thread in threads:
+        thread.join()
+
+
+class BillNumber(models.Model):
+    """ Last number given to each bill number prefix and year, for gap-free bulk allocation """
+    prefix = models.CharField(_("prefix"), max_length=16)
+    year = models.PositiveIntegerField(_("year"))
+    last = models.PositiveIntegerField(_("last number"), default=0)
+    
+    class Meta:
+        unique_together = ('prefix', 'year')
+    
+    def __str__(self):
+        return '%s%s%i' % (self.prefix, self.year, self.last)
+    
+    @classmethod
+    def reserve(cls, prefix, year, count, get_initial):
+        """
+        Returns the first of count consecutive numbers, the counter row is locked until
+        the current transaction ends, so concurrent closings never get the same numbers
+        get_initial() provides the last number in use when the counter does not exist
+        Call it within the transaction that stores the numbers, otherwise numbers are
+        committed on their own and a later rollback leaves a gap
+        """
+        with transaction.atomic():
+            try:
+                counter = cls.objects.select_for_update().get(prefix=prefix, year=year)
+            except cls.DoesNotExist:
+                try:
+                    with transaction.atomic():
+                        counter = cls.objects.create(prefix=prefix, year=year, last=get_initial())
+                except IntegrityError:
+                    # Created concurrently
+                    counter = cls.objects.select_for_update().get(prefix=prefix, year=year)
+            first = counter.last + 1
+            counter.last += count
+            counter.save(update_fields=('last',))
+        return first
+
+
+class BillManager(models.Manager.from_queryset(BillQuerySet)):
     def get_queryset(self):
         queryset = super(BillManager, self).get_queryset()
         if self.model != Bill:
             bill_type = self.model.get_class_type()
             queryset = queryset.filter(type=bill_type)
         return queryset
+    
+    @transaction.atomic
+    def bulk_create(self, bills, *args, **kwargs):
+        """ like Bill.save(), missing types and numbers are provided """
+        pending = OrderedDict()
+        for bill in bills:
+            if not bill.type:
+                bill.type = bill.get_type()
+            if not bill.number:
+                key = (type(bill), bill.type, bill.is_open)
+                pending.setdefault(key, []).append(bill)
+        for group in pending.values():
+            numbers = group[0].get_numbers(len(group))
+            for bill, number in zip(group, numbers):
+                bill.number = number
+        return super(BillManager, self).bulk_create(bills, *args, **kwargs)
 
 
 class Bill(models.Model):
@@ -110,7 +319,13 @@ class Bill(models.Model):
     is_sent = models.BooleanField(_("sent"), default=False)
     due_on = models.DateField(_("due on"), null=True, blank=True)
     updated_on = models.DateField(_("updated on"), auto_now=True)
-#    total = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    # Kept up to date by signals and bulk line changes, see update_totals()
+    base = models.DecimalField(_("base"), max_digits=12, decimal_places=2, null=True,
+        editable=False)
+    tax = models.DecimalField(_("tax"), max_digits=12, decimal_places=2, null=True,
+        editable=False)
+    total = models.DecimalField(_("total"), max_digits=12, decimal_places=2, null=True,
+        editable=False)
     comments = models.TextField(_("comments"), blank=True)
     html = models.TextField(_("HTML"), blank=True)
     
@@ -128,10 +343,6 @@ class Bill(models.Model):
             cls = cls.__base__
         return cls.__name__.upper()
     
-    @cached_property
-    def total(self):
-        return self.compute_total()
-    
     @cached_property
     def seller(self):
         return Account.objects.get_main().billcontact
@@ -226,6 +437,10 @@ class Bill(models.Model):
         return amend_type
     
     def get_number(self):
+        return self.get_numbers(1)[0]
+    
+    def get_numbers(self, count):
+        """ count consecutive numbers following the last one, used for bulk creation """
         cls = type(self)
         if cls is models.DEFERRED:
             cls = cls.__base__
@@ -237,17 +452,22 @@ class Bill(models.Model):
         if self.is_open:
             prefix = 'O{}'.format(prefix)
         year = timezone.now().strftime("%Y")
-        bills = cls.objects.filter(number__regex=r'^%s%s[0-9]+' % (prefix, year))
-        last_number = bills.order_by('-number').values_list('number', flat=True).first()
-        if last_number is None:
-            last_number = 0
-        else:
-            last_number = int(last_number[len(prefix)+4:])
-        number = last_number + 1
+        
+        def get_last_number():
+            bills = cls.objects.filter(number__regex=r'^%s%s[0-9]+' % (prefix, year))
+            last_number = bills.order_by('-number').values_list('number', flat=True).first()
+            if last_number is None:
+                return 0
+            return int(last_number[len(prefix)+4:])
+        
+        first = BillNumber.reserve(prefix, int(year), count, get_last_number)
+        numbers = []
         number_length = settings.BILLS_NUMBER_LENGTH
-        zeros = (number_length - len(str(number))) * '0'
-        number = zeros + str(number)
-        return '{prefix}{year}{number}'.format(prefix=prefix, year=year, number=number)
+        for number in range(first, first+count):
+            zeros = (number_length - len(str(number))) * '0'
+            number = zeros + str(number)
+            numbers.append('{prefix}{year}{number}'.format(prefix=prefix, year=year, number=number))
+        return numbers
     
     def get_due_date(self, payment=None):
         now = timezone.now()
@@ -258,6 +478,7 @@ class Bill(models.Model):
     def get_absolute_url(self):
         return reverse('admin:bills_bill_view', args=(self.pk,))
     
+    @transaction.atomic
     def close(self, payment=False):
         if not self.is_open:
             raise TypeError("Bill not in Open state.")
@@ -280,8 +501,9 @@ class Bill(models.Model):
     def get_billing_contact_emails(self):
         return self.account.get_contacts_emails(usages=(Contact.BILLING,))
     
-    def send(self):
-        pdf = self.as_pdf()
+    def send(self, pdf=None):
+        if pdf is None:
+            pdf = self.as_pdf()
         self.account.send_email(
             template=settings.BILLS_EMAIL_NOTIFICATION_TEMPLATE,
             context={
@@ -319,7 +541,7 @@ class Bill(models.Model):
             })
             template_name = 'BILLS_%s_TEMPLATE' % self.get_type()
             template = getattr(settings, template_name, settings.BILLS_DEFAULT_TEMPLATE)
-            bill_template = loader.get_template(template)
+            bill_template = get_bill_template(template)
             html = bill_template.render(context)
             html = html.replace('-pageskip-', '<pdf:nextpage />')
         return html
@@ -328,10 +550,21 @@ class Bill(models.Model):
         html = self.html or self.render()
         return html_to_pdf(html, pagination=self.has_multiple_pages)
     
+    def update_totals(self):
+        totals = Bill.objects.filter(pk=self.pk).update_totals()
+        self.set_totals(*totals[self.pk])
+    
+    def set_totals(self, base, tax, total):
+        """ in-memory counterpart of update_totals() """
+        self.base, self.tax, self.total = base, tax, total
+        for name in ('compute_base', 'compute_tax', 'compute_total'):
+            self.__dict__.pop('_cached_%s_%i' % (name, id(self)), None)
+    
     def updated(self):
         self.updated_on = timezone.now()
         self.save(update_fields=('updated_on',))
     
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if not self.type:
             self.type = self.get_type()
@@ -355,6 +588,8 @@ class Bill(models.Model):
     
     @cached
     def compute_base(self):
+        if self.base is not None:
+            return self.base
         bases = self.lines.annotate(
             bases=F('subtotal') + Sum(Coalesce('sublines__total', 0))
         )
@@ -362,6 +597,8 @@ class Bill(models.Model):
     
     @cached
     def compute_tax(self):
+        if self.tax is not None:
+            return self.tax
         taxes = self.lines.annotate(
             taxes=(F('subtotal') + Coalesce(Sum('sublines__total'), 0)) * (F('tax')/100)
         )
@@ -369,6 +606,8 @@ class Bill(models.Model):
     
     @cached
     def compute_total(self):
+        if self.total is not None:
+            return self.total
         if 'lines' in getattr(self, '_prefetched_objects_cache', ()):
             total = 0
             for line in self.lines.all():
@@ -407,6 +646,43 @@ class ProForma(Bill):
         proxy = True
 
 
+class BillLineQuerySet(models.QuerySet):
+    """
+    update() and bulk_create() do not send signals, totals of the affected bills are updated here.
+    delete() sends post_delete for each object, handled by signals.
+    """
+    def get_bill_ids(self, pks):
+        return set(self.model.objects.filter(pk__in=pks).values_list('bill_id', flat=True))
+    
+    def get_created_bill_ids(self, lines):
+        return set(line.bill_id for line in lines)
+    
+    def update(self, **kwargs):
+        pks = list(self.values_list('pk', flat=True))
+        bill_ids = self.get_bill_ids(pks)
+        rows = super(BillLineQuerySet, self).update(**kwargs)
+        # Lines may have been moved to other bills
+        bill_ids.update(self.get_bill_ids(pks))
+        if bill_ids:
+            Bill.objects.filter(pk__in=bill_ids).update_totals()
+        return rows
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super(BillLineQuerySet, self).bulk_create(objs, *args, **kwargs)
+        if objs:
+            Bill.objects.filter(pk__in=self.get_created_bill_ids(objs)).update_totals()
+        return objs
+
+
+class BillSublineQuerySet(BillLineQuerySet):
+    def get_bill_ids(self, pks):
+        return set(self.model.objects.filter(pk__in=pks).values_list('line__bill_id', flat=True))
+    
+    def get_created_bill_ids(self, sublines):
+        line_ids = set(subline.line_id for subline in sublines)
+        return set(BillLine.objects.filter(pk__in=line_ids).values_list('bill_id', flat=True))
+
+
 class BillLine(models.Model):
     """ Base model for bill item representation """
     bill = models.ForeignKey(Bill, verbose_name=_("bill"), related_name='lines')
@@ -429,6 +705,8 @@ class BillLine(models.Model):
     amended_line = models.ForeignKey('self', verbose_name=_("amended line"),
         related_name='amendment_lines', null=True, blank=True)
     
+    objects = BillLineQuerySet.as_manager()
+    
     class Meta:
         get_latest_by = 'id'
     
@@ -493,5 +771,7 @@ class BillSubline(models.Model):
     total = models.DecimalField(max_digits=12, decimal_places=2)
     type = models.CharField(_("type"), max_length=16, choices=TYPES, default=OTHER)
     
+    objects = BillSublineQuerySet.as_manager()
+    
     def __str__(self):
         return "%s %i" % (self.description, self.total)
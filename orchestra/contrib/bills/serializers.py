@@ -15,6 +15,9 @@ class BillLineSerializer(serializers.HyperlinkedModelSerializer):
 
 class BillSerializer(AccountSerializerMixin, serializers.HyperlinkedModelSerializer):
 #    lines = BillLineSerializer(source='lines')
+    # Bills created before totals were stored have them computed
+    total = serializers.DecimalField(max_digits=12, decimal_places=2, source='compute_total',
+        read_only=True)
     
     class Meta:
         model = Bill
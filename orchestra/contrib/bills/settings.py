@@ -101,3 +101,9 @@ BILLS_CONTACT_DEFAULT_COUNTRY = Setting('BILLS_CONTACT_DEFAULT_COUNTRY',
     'ES',
     choices=BILLS_CONTACT_COUNTRIES
 )
+
+
+BILLS_RENDER_WORKERS = Setting('BILLS_RENDER_WORKERS',
+    4,
+    help_text="Number of bills converted to PDF concurrently when sending or downloading many bills.",
+)
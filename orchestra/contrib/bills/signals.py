@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Bill, BillLine, BillSubline
+
+
+@receiver(post_save, sender=BillLine, dispatch_uid='bills.line_save_totals')
+@receiver(post_delete, sender=BillLine, dispatch_uid='bills.line_delete_totals')
+def update_line_bill_totals(sender, *args, **kwargs):
+    line = kwargs['instance']
+    Bill.objects.filter(pk=line.bill_id).update_totals()
+
+
+@receiver(post_save, sender=BillSubline, dispatch_uid='bills.subline_save_totals')
+@receiver(post_delete, sender=BillSubline, dispatch_uid='bills.subline_delete_totals')
+def update_subline_bill_totals(sender, *args, **kwargs):
+    subline = kwargs['instance']
+    Bill.objects.filter(lines=subline.line_id).update_totals()
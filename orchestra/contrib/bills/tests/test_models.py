@@ -0,0 +1,139 @@
+import decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from orchestra.contrib.payments.models import PaymentSource, Transaction
+from orchestra.utils.tests import BaseTestCase
+
+from ..models import Bill, BillLine, BillNumber, BillSubline, Invoice
+
+
+class BillNumberTests(BaseTestCase):
+    def setUp(self):
+        self.initial_calls = 0
+    
+    def get_initial(self):
+        self.initial_calls += 1
+        return 7
+    
+    def test_reserve(self):
+        self.assertEqual(8, BillNumber.reserve('I', 2016, 3, self.get_initial))
+        self.assertEqual(10, BillNumber.objects.get(prefix='I', year=2016).last)
+        self.assertEqual(11, BillNumber.reserve('I', 2016, 1, self.get_initial))
+        self.assertEqual(12, BillNumber.reserve('I', 2016, 5, self.get_initial))
+        self.assertEqual(16, BillNumber.objects.get(prefix='I', year=2016).last)
+        # The counter is the only source once it exists
+        self.assertEqual(1, self.initial_calls)
+    
+    def test_reserve_counters(self):
+        self.assertEqual(8, BillNumber.reserve('I', 2016, 2, self.get_initial))
+        self.assertEqual(8, BillNumber.reserve('OI', 2016, 2, self.get_initial))
+        self.assertEqual(8, BillNumber.reserve('I', 2017, 2, self.get_initial))
+        self.assertEqual(10, BillNumber.reserve('I', 2016, 2, self.get_initial))
+        self.assertEqual(3, self.initial_calls)
+    
+    def test_numbers(self):
+        account = self.create_account()
+        year = timezone.now().strftime("%Y")
+        # Numbers given before the counter existed
+        Invoice.objects.create(account=account, is_open=False, number='I%s0041' % year)
+        bills = [Invoice(account=account, is_open=False) for __ in range(3)]
+        Invoice.objects.bulk_create(bills)
+        self.assertEqual(['I%s00%i' % (year, ix) for ix in (42, 43, 44)],
+            [bill.number for bill in bills])
+        bill = Invoice.objects.create(account=account, is_open=False)
+        self.assertEqual('I%s0045' % year, bill.number)
+        bill = Invoice.objects.create(account=account)
+        self.assertEqual('OI%s0001' % year, bill.number)
+    
+    def test_close(self):
+        account = self.create_account()
+        year = timezone.now().strftime("%Y")
+        bills = [Invoice.objects.create(account=account) for __ in range(2)]
+        transactions = Invoice.objects.filter(pk__in=[bill.pk for bill in bills]).close()
+        self.assertEqual(2, len(transactions))
+        self.assertTrue(all(obj.pk for obj in transactions))
+        # Zero totals without payment source
+        states = Transaction.objects.filter(pk__in=[obj.pk for obj in transactions]).values_list(
+            'state', flat=True)
+        self.assertEqual([Transaction.SECURED]*2, list(states))
+        bills = Invoice.objects.filter(pk__in=[bill.pk for bill in bills]).order_by('number')
+        self.assertEqual(['I%s0001' % year, 'I%s0002' % year], [bill.number for bill in bills])
+        for bill in bills:
+            self.assertFalse(bill.is_open)
+            self.assertIsNotNone(bill.closed_on)
+            self.assertIsNotNone(bill.due_on)
+            self.assertEqual(timezone.now().date(), bill.updated_on)
+    
+    def test_close_transaction_states(self):
+        account = self.create_account()
+        source = PaymentSource.objects.create(account=account, method='SEPADirectDebit',
+            data={'name': account.username, 'iban': 'ES6000491500051234567892'})
+        manual, zero, debit = [Invoice.objects.create(account=account) for __ in range(3)]
+        for bill in (manual, debit):
+            BillLine.objects.create(bill=bill, description='line', subtotal=10, tax=21,
+                start_on=timezone.now().date())
+        payments = {
+            manual.pk: None,
+            zero.pk: source,
+            debit.pk: source,
+        }
+        transactions = Invoice.objects.filter(pk__in=list(payments)).close(payments=payments)
+        states = {
+            obj.bill_id: Transaction.objects.get(pk=obj.pk).state for obj in transactions
+        }
+        # Same states as Bill.close() through TransactionQuerySet.create()
+        self.assertEqual(Transaction.WAITTING_EXECUTION, states[manual.pk])
+        self.assertEqual(Transaction.SECURED, states[zero.pk])
+        self.assertEqual(Transaction.WAITTING_PROCESSING, states[debit.pk])
+    
+    def test_close_rollback(self):
+        account = self.create_account()
+        year = timezone.now().strftime("%Y")
+        bill = Invoice.objects.create(account=account)
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                Invoice.objects.filter(pk=bill.pk).close()
+                raise ValueError
+        # Numbers given within a rolled back transaction are given again
+        Invoice.objects.filter(pk=bill.pk).close()
+        self.assertEqual('I%s0001' % year, Invoice.objects.get(pk=bill.pk).number)
+
+
+class BillTotalsTests(BaseTestCase):
+    def setUp(self):
+        self.bill = Invoice.objects.create(account=self.create_account())
+    
+    def create_line(self, subtotal, **kwargs):
+        return BillLine(bill=self.bill, description='line', subtotal=subtotal, tax=21,
+            start_on=timezone.now().date(), **kwargs)
+    
+    def assertTotals(self, base, tax, total):
+        bill = Bill.objects.get(pk=self.bill.pk)
+        self.assertEqual(
+            (decimal.Decimal(base), decimal.Decimal(tax), decimal.Decimal(total)),
+            (bill.base, bill.tax, bill.total))
+    
+    def test_queryset_changes(self):
+        self.create_line(10).save()
+        self.assertTotals('10.00', '2.10', '12.10')
+        BillLine.objects.filter(bill=self.bill).update(subtotal=20)
+        self.assertTotals('20.00', '4.20', '24.20')
+        BillLine.objects.bulk_create([self.create_line(10)])
+        self.assertTotals('30.00', '6.30', '36.30')
+        line = BillLine.objects.filter(bill=self.bill).first()
+        BillSubline.objects.bulk_create([BillSubline(line=line, description='discount', total=-10)])
+        self.assertTotals('20.00', '4.20', '24.20')
+        BillSubline.objects.filter(line__bill=self.bill).update(total=-20)
+        self.assertTotals('10.00', '2.10', '12.10')
+        BillLine.objects.filter(bill=self.bill).delete()
+        self.assertTotals('0.00', '0.00', '0.00')
+    
+    def test_moved_lines(self):
+        self.create_line(10).save()
+        other = Invoice.objects.create(account=self.bill.account)
+        BillLine.objects.filter(bill=self.bill).update(bill=other)
+        self.assertTotals('0.00', '0.00', '0.00')
+        other = Bill.objects.get(pk=other.pk)
+        self.assertEqual(decimal.Decimal('12.10'), other.total)
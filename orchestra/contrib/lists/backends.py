@@ -237,9 +237,10 @@ class MailmanTraffic(ServiceMonitor):
     def prepare(self):
         postlog = settings.LISTS_MAILMAN_POST_LOG_PATH
         context = {
-            'postlogs': str((postlog, postlog+'.1')),
+            'postlog': repr(postlog),
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
         }
+        self.append_log_reader()
         self.append(textwrap.dedent("""\
             import re
             import subprocess
@@ -253,7 +254,7 @@ class MailmanTraffic(ServiceMonitor):
                 date = date.astimezone(tzlocal)
                 return date
             
-            postlogs = {postlogs}
+            postlog = {postlog}
             # Use local timezone
             end_date = to_local_timezone('{current_date}')
             end_date = int(end_date.strftime('%Y%m%d%H%M%S'))
@@ -280,33 +281,32 @@ class MailmanTraffic(ServiceMonitor):
                 ini_date = int(ini_date.strftime('%Y%m%d%H%M%S'))
                 lists[list_name] = [ini_date, object_id, 0]
             
-            def monitor(lists, end_date, months, postlogs):
-                for postlog in postlogs:
+            def monitor(lists, end_date, months, postlog):
+                ini_date = min(opts[0] for opts in lists.values())
+                reader = LogReader(log_state, postlog, ini_date, end_date)
+                for line in reader:
+                    line = line.split()
+                    if len(line) < 11:
+                        continue
+                    month, day, time, year, __, __, __, list_name, __, addr, size = line[:11]
                     try:
-                        with open(postlog, 'r') as postlog:
-                            for line in postlog.readlines():
-                                line = line.split()
-                                if len(line) < 11:
-                                    continue
-                                month, day, time, year, __, __, __, list_name, __, addr, size = line[:11]
-                                try:
-                                    list = lists[list_name]
-                                except KeyError:
-                                    continue
-                                else:
-                                    # discard mailman messages because of inconsistent POST logging
-                                    if mailman_addr.match(addr):
-                                        continue
-                                    date = year + months[month] + day + time.replace(':', '')
-                                    if list[0] < int(date) < end_date:
-                                        size = size[5:-1]
-                                        try:
-                                            list[2] += int(size)
-                                        except ValueError:
-                                            # anonymized post
-                                            pass
-                    except IOError as e:
-                        sys.stderr.write(str(e)+'\\n')
+                        list = lists[list_name]
+                    except KeyError:
+                        continue
+                    else:
+                        # discard mailman messages because of inconsistent POST logging
+                        if mailman_addr.match(addr):
+                            continue
+                        date = int(year + months[month] + day + time.replace(':', ''))
+                        if list[0] < date < end_date:
+                            size = size[5:-1]
+                            try:
+                                list[2] += int(size)
+                            except ValueError:
+                                # anonymized post
+                                pass
+                        elif date >= end_date:
+                            reader.hold()
                 
                 for list_name, opts in lists.items():
                     __, object_id, size = opts
@@ -325,7 +325,8 @@ class MailmanTraffic(ServiceMonitor):
         self.append("prepare(%(object_id)s, '%(list_name)s', '%(last_date)s')" % context)
     
     def commit(self):
-        self.append('monitor(lists, end_date, months, postlogs)')
+        self.append('monitor(lists, end_date, months, postlog)')
+        self.append('log_state.save()')
     
     def get_context(self, mail_list):
         context = {
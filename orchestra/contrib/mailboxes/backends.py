@@ -473,8 +473,9 @@ class PostfixMailscannerTraffic(ServiceMonitor):
         mail_log = settings.MAILBOXES_MAIL_LOG_PATH
         context = {
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'mail_logs': str((mail_log, mail_log+'.1')),
+            'mail_log': repr(mail_log),
         }
+        self.append_log_reader()
         self.append(textwrap.dedent("""\
             import re
             import sys
@@ -488,13 +489,13 @@ class PostfixMailscannerTraffic(ServiceMonitor):
                 date = date.astimezone(tzlocal)
                 return date
             
-            maillogs = {mail_logs}
+            maillog = {mail_log}
             end_datetime = to_local_timezone('{current_date}')
             end_date = int(end_datetime.strftime('%Y%m%d%H%M%S'))
             months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
             months = dict((m, '%02d' % n) for n, m in enumerate(months, 1))
             
-            def inside_period(month, day, time, ini_date):
+            def inside_period(month, day, time, ini_date, reader):
                 global months
                 global end_datetime
                 # Mar  9 17:13:22
@@ -505,8 +506,10 @@ class PostfixMailscannerTraffic(ServiceMonitor):
                 if len(day) == 1:
                     day = '0' + day
                 date = str(year) + month + day
-                date += time.replace(':', '')
-                return ini_date < int(date) < end_date
+                date = int(date + time.replace(':', ''))
+                if date >= end_date:
+                    reader.hold()
+                return ini_date < date < end_date
             
             users = {{}}
             delivers = {{}}
@@ -522,66 +525,63 @@ class PostfixMailscannerTraffic(ServiceMonitor):
                 delivers[mailbox] = set()
                 reverse[mailbox] = set()
             
-            def monitor(users, delivers, reverse, maillogs):
+            def monitor(users, delivers, reverse, maillog):
                 targets = {{}}
                 counter = {{}}
                 user_regex = re.compile(r'\(Authenticated sender: ([^ ]+)\)')
-                for maillog in maillogs:
-                    try:
-                        with open(maillog, 'r') as maillog:
-                            for line in maillog.readlines():
-                                # Only search for Authenticated sendings
-                                if '(Authenticated sender: ' in line:
-                                    username = user_regex.search(line).groups()[0]
-                                    try:
-                                        sender = users[username]
-                                    except KeyError:
-                                        continue
-                                    else:
-                                        month, day, time, __, proc, id = line.split()[:6]
-                                        if inside_period(month, day, time, sender[0]):
-                                            # Add new email
-                                            delivers[id[:-1]] = username
-                                # Look for a MailScanner requeue ID
-                                elif ' Requeue: ' in line:
-                                    id, __, req_id = line.split()[6:9]
-                                    id = id.split('.')[0]
-                                    try:
-                                        username = delivers[id]
-                                    except KeyError:
-                                        pass
-                                    else:
-                                        targets[req_id] = (username, 0)
-                                        reverse[username].add(req_id)
-                                # Look for the mail size and count the number of recipients of each email
+                ini_date = min(user[0] for user in users.values())
+                reader = LogReader(log_state, maillog, ini_date, end_date)
+                for line in reader:
+                    # Only search for Authenticated sendings
+                    if '(Authenticated sender: ' in line:
+                        username = user_regex.search(line).groups()[0]
+                        try:
+                            sender = users[username]
+                        except KeyError:
+                            continue
+                        else:
+                            month, day, time, __, proc, id = line.split()[:6]
+                            if inside_period(month, day, time, sender[0], reader):
+                                # Add new email
+                                delivers[id[:-1]] = username
+                    # Look for a MailScanner requeue ID
+                    elif ' Requeue: ' in line:
+                        id, __, req_id = line.split()[6:9]
+                        id = id.split('.')[0]
+                        try:
+                            username = delivers[id]
+                        except KeyError:
+                            pass
+                        else:
+                            targets[req_id] = (username, 0)
+                            reverse[username].add(req_id)
+                    # Look for the mail size and count the number of recipients of each email
+                    else:
+                        try:
+                            month, day, time, __, proc, req_id, __, msize = line.split()[:8]
+                        except ValueError:
+                            # not interested in this line
+                            continue
+                        if proc.startswith('postfix/'):
+                            req_id = req_id[:-1]
+                            if msize.startswith('size='):
+                                try:
+                                    target = targets[req_id]
+                                except KeyError:
+                                    pass
                                 else:
-                                    try:
-                                        month, day, time, __, proc, req_id, __, msize = line.split()[:8]
-                                    except ValueError:
-                                        # not interested in this line
-                                        continue
-                                    if proc.startswith('postfix/'):
-                                        req_id = req_id[:-1]
-                                        if msize.startswith('size='):
-                                            try:
-                                                target = targets[req_id]
-                                            except KeyError:
-                                                pass
-                                            else:
-                                                targets[req_id] = (target[0], int(msize[5:-1]))
-                                        elif proc.startswith('postfix/smtp'):
-                                            try:
-                                                target = targets[req_id]
-                                            except KeyError:
-                                                pass
-                                            else:
-                                                if inside_period(month, day, time, users[target[0]][0]):
-                                                    try:
-                                                        counter[req_id] += 1
-                                                    except KeyError:
-                                                        counter[req_id] = 1
-                    except IOError as e:
-                        sys.stderr.write(str(e)+'\\n')
+                                    targets[req_id] = (target[0], int(msize[5:-1]))
+                            elif proc.startswith('postfix/smtp'):
+                                try:
+                                    target = targets[req_id]
+                                except KeyError:
+                                    pass
+                                else:
+                                    if inside_period(month, day, time, users[target[0]][0], reader):
+                                        try:
+                                            counter[req_id] += 1
+                                        except KeyError:
+                                            counter[req_id] = 1
                     
                 for username, opts in users.iteritems():
                     size = 0
@@ -592,7 +592,8 @@ class PostfixMailscannerTraffic(ServiceMonitor):
         )
     
     def commit(self):
-        self.append('monitor(users, delivers, reverse, maillogs)')
+        self.append('monitor(users, delivers, reverse, maillog)')
+        self.append('log_state.save()')
     
     def monitor(self, mailbox):
         context = self.get_context(mailbox)
@@ -14,6 +14,7 @@ from orchestra.contrib.tasks import task
 
 from .actions import last
 from .engine import send_pending
+from .forms import MessageForm
 from .models import Message, SMTPLog
 
 
@@ -52,6 +53,7 @@ class MessageAdmin(ExtendedModelAdmin):
     )
     date_hierarchy = 'created_at'
     change_view_actions = (last,)
+    form = MessageForm
     
     colored_state = admin_colored('state', colors=COLORS)
     created_at_delta = admin_date('created_at')
@@ -128,7 +130,7 @@ class MessageAdmin(ExtendedModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.annotate(Count('logs')).defer('content')
+        return qs.annotate(Count('logs'))
     
     def send_pending_view(self, request):
         task(send_pending).apply_async()
@@ -5,7 +5,7 @@ from django.core.mail.backends.base import BaseEmailBackend
 from orchestra.core.caches import get_request_cache
 
 from . import settings
-from .models import Message
+from .models import Message, MessageContent
 from .tasks import send_message
 
 
@@ -31,14 +31,15 @@ class EmailBackend(BaseEmailBackend):
         connection = None
         for message in email_messages:
             priority = message.extra_headers.get('X-Mail-Priority', default_priority)
-            content = message.message().as_string()
+            # Stored only once for all the recipients
+            body = MessageContent.objects.store(message.message().as_string())
             for to_email in message.recipients():
                 message = Message(
                     priority=priority,
                     to_address=to_email,
                     from_address=getattr(message, 'from_email', djsettings.DEFAULT_FROM_EMAIL),
                     subject=message.subject,
-                    content=content,
+                    body=body,
                 )
                 if priority == Message.CRITICAL:
                     # send immidiately
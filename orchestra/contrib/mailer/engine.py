@@ -1,16 +1,21 @@
+import itertools
+import queue
 import smtplib
+import threading
+import time
+import zlib
 from datetime import timedelta
 from socket import error as SocketError
 
 from django.core.mail import get_connection
-from django.db.models import Q
+from django.db.models import Case, F, Q, When
 from django.utils import timezone
 from django.utils.encoding import smart_str
 
 from orchestra.utils.sys import LockFile, OperationLocked
 
 from . import settings
-from .models import Message
+from .models import Message, SMTPLog
 
 
 def send_message(message, connection=None, bulk=settings.MAILER_BULK_MESSAGES):
@@ -44,33 +49,196 @@ def send_message(message, connection=None, bulk=settings.MAILER_BULK_MESSAGES):
     return connection
 
 
-def send_pending(bulk=settings.MAILER_BULK_MESSAGES):
+def get_retry_query(now=None):
+    """ deferred messages that have waited enough for being retried """
+    if now is None:
+        now = timezone.now()
+    qs = Q()
+    for retries, seconds in enumerate(settings.MAILER_DEFERE_SECONDS):
+        delta = timedelta(seconds=seconds)
+        qs = qs | Q(retries=retries, last_try__lte=now-delta)
+    return qs
+
+
+def has_pending():
+    deferred = Q(state=Message.DEFERRED) & get_retry_query()
+    return Message.objects.filter(Q(state=Message.QUEUED) | deferred).exists()
+
+
+def get_pending_messages():
+    """ queued messages first, then deferred messages ready to be retried """
+    # Contents shared by several messages are only fetched once
+    messages = Message.objects.prefetch_related('body')
+    queued = messages.filter(state=Message.QUEUED)
+    deferred = messages.filter(state=Message.DEFERRED).filter(get_retry_query())
+    return itertools.chain(
+        queued.order_by('priority', 'last_try', 'created_at'),
+        deferred.order_by('priority', 'last_try'),
+    )
+
+
+class SMTPWorker(threading.Thread):
+    """
+    Delivers messages over its own SMTP connection, without touching the database
+    
+    The connection is reused and only recycled every bulk messages or when the server
+    drops it. Results are reported as (message, error) for being saved in batch.
+    """
+    def __init__(self, results, bulk=settings.MAILER_BULK_MESSAGES):
+        super(SMTPWorker, self).__init__(name='mailer-worker')
+        self.messages = queue.Queue()
+        self.results = results
+        self.bulk = bulk
+        self.connection = get_connection(backend='django.core.mail.backends.smtp.EmailBackend')
+        self.sent = 0
+    
+    def send(self, message):
+        if self.sent >= self.bulk:
+            self.connection.close()
+            self.sent = 0
+        if self.connection.connection is None:
+            try:
+                self.connection.open()
+            except Exception as err:
+                return err
+        self.sent += 1
+        try:
+            self.connection.connection.sendmail(
+                message.from_address, [message.to_address], smart_str(message.content))
+        except smtplib.SMTPServerDisconnected as err:
+            self.connection.connection = None
+            return err
+        except (SocketError,
+                smtplib.SMTPSenderRefused,
+                smtplib.SMTPRecipientsRefused,
+                smtplib.SMTPAuthenticationError) as err:
+            return err
+        return None
+    
+    def run(self):
+        try:
+            while True:
+                message = self.messages.get()
+                if message is None:
+                    return
+                try:
+                    error = self.send(message)
+                except Exception as err:
+                    error = err
+                self.results.put((message, error))
+        finally:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+
+
+def save_tries(messages, now):
+    """
+    saves last_try and retries before the messages are handed to the workers, like send_message()
+    does, so a delivery interrupted before its result is saved is not retried right away
+    """
+    for message in messages:
+        message.last_try = now
+        if message.state != message.QUEUED:
+            message.retries += 1
+    Message.objects.filter(pk__in=[message.pk for message in messages]).update(
+        last_try=now,
+        retries=Case(
+            When(state=Message.QUEUED, then=F('retries')),
+            default=F('retries')+1,
+        ),
+    )
+
+
+def save_results(results, now):
+    """ state transitions with one update per resulting (state, retries) and logs in bulk """
+    updates = {}
+    logs = []
+    for message, error in results:
+        if error is None:
+            message.state = message.SENT
+            logs.append(SMTPLog(message=message, log_message=str(error), result=SMTPLog.SUCCESS))
+        else:
+            message.state = message.DEFERRED
+            # Max tries
+            if message.retries >= len(settings.MAILER_DEFERE_SECONDS):
+                message.state = message.FAILED
+            logs.append(SMTPLog(message=message, log_message=str(error), result=SMTPLog.FAILURE))
+        message.last_try = now
+        updates.setdefault((message.state, message.retries), []).append(message.pk)
+    for (state, retries), pks in updates.items():
+        Message.objects.filter(pk__in=pks).update(state=state, retries=retries, last_try=now)
+    SMTPLog.objects.bulk_create(logs)
+
+
+def save_results_periodically(results, total, size, seconds):
+    """
+    saves the results as they come, every size results or seconds at most,
+    keeping message states close to what has actually been delivered
+    """
+    pending = []
+    deadline = time.monotonic() + seconds
+    while total:
+        try:
+            pending.append(results.get(timeout=max(deadline-time.monotonic(), 0)))
+            total -= 1
+        except queue.Empty:
+            pass
+        if len(pending) >= size or time.monotonic() >= deadline:
+            if pending:
+                save_results(pending, timezone.now())
+                pending = []
+            deadline = time.monotonic() + seconds
+    if pending:
+        save_results(pending, timezone.now())
+
+
+def send_many(messages, bulk=settings.MAILER_BULK_MESSAGES, workers=None,
+              group_by_domain=None, save_size=None, save_seconds=None):
+    """
+    Sends messages concurrently on several SMTP connections,
+    messages to the same domain can be delivered by the same connection
+    """
+    if workers is None:
+        workers = settings.MAILER_WORKERS
+    if group_by_domain is None:
+        group_by_domain = settings.MAILER_GROUP_BY_DOMAIN
+    if save_size is None:
+        save_size = settings.MAILER_SAVE_RESULTS_MESSAGES
+    if save_seconds is None:
+        save_seconds = settings.MAILER_SAVE_RESULTS_SECONDS
+    results = queue.Queue()
+    threads = [SMTPWorker(results, bulk=bulk) for __ in range(max(workers, 1))]
+    for thread in threads:
+        thread.start()
+    total = 0
+    messages = iter(messages)
     try:
-        with LockFile('/dev/shm/mailer.send_pending.lock'):
-            connection = get_connection(backend='django.core.mail.backends.smtp.EmailBackend')
-            cur, total = 0, 0
-            for message in Message.objects.filter(state=Message.QUEUED).order_by('priority', 'last_try', 'created_at'):
-                if cur >= bulk:
-                    connection.close()
-                    cur = 0
-                send_message(message, connection, bulk)
-                cur += 1
-                total += 1
-            now = timezone.now()
-            qs = Q()
-            for retries, seconds in enumerate(settings.MAILER_DEFERE_SECONDS):
-                delta = timedelta(seconds=seconds)
-                qs = qs | Q(retries=retries, last_try__lte=now-delta)
-            for message in Message.objects.filter(state=Message.DEFERRED).filter(qs).order_by('priority', 'last_try'):
-                if cur >= bulk:
-                    connection.close()
-                    cur = 0
-                send_message(message, connection, bulk)
-                cur += 1
+        while True:
+            chunk = list(itertools.islice(messages, save_size))
+            if not chunk:
+                break
+            save_tries(chunk, timezone.now())
+            for message in chunk:
+                ix = total
+                if group_by_domain:
+                    domain = message.to_address.rpartition('@')[2].lower()
+                    ix = zlib.crc32(domain.encode())
+                threads[ix % len(threads)].messages.put(message)
                 total += 1
-        return total
+    finally:
+        for thread in threads:
+            thread.messages.put(None)
+    save_results_periodically(results, total, save_size, save_seconds)
+    for thread in threads:
+        thread.join()
+    return total
+
+
+def send_pending(bulk=settings.MAILER_BULK_MESSAGES, workers=None):
+    try:
+        with LockFile('/dev/shm/mailer.send_pending.lock'):
+            return send_many(get_pending_messages(), bulk=bulk, workers=workers)
     except OperationLocked:
         pass
-    finally:
-        if 'connection' in vars() and connection.connection is not None:
-            connection.close()
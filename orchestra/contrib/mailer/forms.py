@@ -0,0 +1,23 @@
+from django import forms
+from django.utils.translation import ugettext_lazy as _
+
+from .models import Message
+
+
+class MessageForm(forms.ModelForm):
+    """ content is stored deduplicated, editing it never modifies other messages """
+    content = forms.CharField(label=_("content"), widget=forms.Textarea)
+    
+    class Meta:
+        model = Message
+        fields = ('subject', 'from_address', 'to_address')
+    
+    def __init__(self, *args, **kwargs):
+        super(MessageForm, self).__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['content'].initial = self.instance.content
+    
+    def save(self, commit=True):
+        if 'content' in self.changed_data or not self.instance.pk:
+            self.instance.content = self.cleaned_data['content']
+        return super(MessageForm, self).save(commit=commit)
@@ -1,3 +1,5 @@
+import time
+
 from django.core.management.base import BaseCommand
 
 from orchestra.contrib.tasks.decorators import keep_state
@@ -6,7 +8,16 @@ from ...engine import send_pending
 
 
 class Command(BaseCommand):
-    help = 'Runs Orchestra method.'
+    help = 'Sends queued and deferred messages.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, dest='workers', default=None,
+            help='Number of concurrent SMTP connections, MAILER_WORKERS by default.')
     
     def handle(self, *args, **options):
-        keep_state(send_pending)()
+        start = time.time()
+        total = keep_state(send_pending)(workers=options.get('workers'))
+        if total and int(options.get('verbosity', 1)) > 1:
+            elapsed = time.time()-start
+            self.stdout.write('%i messages sent in %.2f seconds (%.1f messages/second)' % (
+                total, elapsed, total/elapsed if elapsed else total))
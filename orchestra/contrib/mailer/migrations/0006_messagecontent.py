@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import zlib
+
+from django.db import migrations, models
+
+
+def store_contents(apps, schema_editor):
+    Message = apps.get_model('mailer', 'Message')
+    MessageContent = apps.get_model('mailer', 'MessageContent')
+    contents = {}
+    for message in Message.objects.only('id', 'content').iterator():
+        data = message.content.encode('utf-8', 'surrogateescape')
+        digest = hashlib.sha256(data).hexdigest()
+        try:
+            body_id = contents[digest]
+        except KeyError:
+            body_id = MessageContent.objects.create(hash=digest, data=zlib.compress(data)).pk
+            contents[digest] = body_id
+        Message.objects.filter(pk=message.pk).update(body=body_id)
+
+
+def restore_contents(apps, schema_editor):
+    Message = apps.get_model('mailer', 'Message')
+    for message in Message.objects.select_related('body').iterator():
+        content = zlib.decompress(bytes(message.body.data)).decode('utf-8', 'surrogateescape')
+        Message.objects.filter(pk=message.pk).update(content=content)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailer', '0005_auto_20160219_1056'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageContent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64, unique=True, verbose_name='hash')),
+                ('data', models.BinaryField(verbose_name='data')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='body',
+            field=models.ForeignKey(editable=False, null=True, related_name='messages', to='mailer.MessageContent', verbose_name='content'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='content',
+            field=models.TextField(default='', verbose_name='content'),
+        ),
+        migrations.RunPython(store_contents, restore_contents),
+        migrations.RemoveField(
+            model_name='message',
+            name='content',
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='body',
+            field=models.ForeignKey(editable=False, related_name='messages', to='mailer.MessageContent', verbose_name='content'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailer', '0006_messagecontent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagecontent',
+            name='stored_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='stored at'),
+        ),
+    ]
@@ -1,9 +1,57 @@
+import hashlib
+import zlib
+from datetime import timedelta
+
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from . import settings
 
 
+class MessageContentQuerySet(models.QuerySet):
+    def store(self, content):
+        """ returns the stored content, only saved once regardless of the number of recipients """
+        data = content.encode('utf-8', 'surrogateescape')
+        digest = hashlib.sha256(data).hexdigest()
+        obj, created = self.get_or_create(hash=digest, defaults={
+            'data': zlib.compress(data),
+        })
+        now = timezone.now()
+        if not created and obj.stored_at < now-timedelta(hours=1):
+            # Reused contents are kept away from the orphan cleanup, see orphans()
+            self.filter(pk=obj.pk).update(stored_at=now)
+            obj.stored_at = now
+        return obj
+    
+    def orphans(self, epoch):
+        """
+        contents no longer referenced by any message, those stored after epoch are kept
+        because their messages may not have been saved yet
+        """
+        return self.filter(messages__isnull=True, stored_at__lt=epoch)
+
+
+class MessageContent(models.Model):
+    """ Compressed MIME content, shared between all the messages with the same content """
+    hash = models.CharField(_("hash"), max_length=64, unique=True)
+    data = models.BinaryField(_("data"))
+    stored_at = models.DateTimeField(_("stored at"), default=timezone.now, editable=False)
+    
+    objects = MessageContentQuerySet.as_manager()
+    
+    def __str__(self):
+        return self.hash
+    
+    def get_content(self):
+        # Prefetched contents are shared between messages, decompress only once
+        try:
+            return self._content
+        except AttributeError:
+            self._content = zlib.decompress(bytes(self.data)).decode('utf-8', 'surrogateescape')
+            return self._content
+
+
 class Message(models.Model):
     QUEUED = 'QUEUED'
     SENT = 'SENT'
@@ -34,7 +82,8 @@ class Message(models.Model):
     to_address = models.CharField(max_length=256)
     from_address = models.CharField(max_length=256)
     subject = models.TextField(_("subject"))
-    content = models.TextField(_("content"))
+    body = models.ForeignKey(MessageContent, verbose_name=_("content"), related_name='messages',
+        editable=False)
     created_at = models.DateTimeField(_("created at"), auto_now_add=True)
     retries = models.PositiveIntegerField(_("retries"), default=0, db_index=True)
     last_try = models.DateTimeField(_("last try"), null=True, db_index=True)
@@ -42,6 +91,24 @@ class Message(models.Model):
     def __str__(self):
         return '%s to %s' % (self.subject, self.to_address)
     
+    @property
+    def content(self):
+        try:
+            return self._content
+        except AttributeError:
+            return self.body.get_content()
+    
+    @content.setter
+    def content(self, content):
+        # Stored on save()
+        self._content = content
+    
+    def save(self, *args, **kwargs):
+        if hasattr(self, '_content'):
+            self.body = MessageContent.objects.store(self._content)
+            del self._content
+        super(Message, self).save(*args, **kwargs)
+    
     def defer(self):
         self.state = self.DEFERRED
         # Max tries
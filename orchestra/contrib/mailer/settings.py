@@ -22,3 +22,27 @@ MAILER_NON_QUEUED_PER_REQUEST_THRESHOLD = Setting('MAILER_NON_QUEUED_PER_REQUEST
 MAILER_BULK_MESSAGES = Setting('MAILER_BULK_MESSAGES',
     500,
 )
+
+
+MAILER_SAVE_RESULTS_MESSAGES = Setting('MAILER_SAVE_RESULTS_MESSAGES',
+    50,
+    help_text=_("Delivery results of queued messages are saved every this number of messages."),
+)
+
+
+MAILER_SAVE_RESULTS_SECONDS = Setting('MAILER_SAVE_RESULTS_SECONDS',
+    5,
+    help_text=_("Seconds between saves of the delivery results of queued messages."),
+)
+
+
+MAILER_WORKERS = Setting('MAILER_WORKERS',
+    4,
+    help_text=_("Number of concurrent SMTP connections used for sending queued messages."),
+)
+
+
+MAILER_GROUP_BY_DOMAIN = Setting('MAILER_GROUP_BY_DOMAIN',
+    False,
+    help_text=_("Deliver all the messages to the same destination domain on the same connection."),
+)
@@ -16,8 +16,10 @@ def send_message(message, connection=None):
 
 @periodic_task(run_every=crontab(hour=7, minute=30))
 def cleanup_messages():
-    from .models import Message
+    from .models import Message, MessageContent
     delta = timedelta(days=settings.MAILER_MESSAGES_CLEANUP_DAYS)
     now = timezone.now()
     epoch = (now-delta)
-    return Message.objects.filter(state=Message.SENT, created_at__lt=epoch).only('id').delete()
+    result = Message.objects.filter(state=Message.SENT, created_at__lt=epoch).only('id').delete()
+    MessageContent.objects.orphans(epoch).delete()
+    return result
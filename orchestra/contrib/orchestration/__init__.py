@@ -16,6 +16,8 @@ class Operation():
     EXCEEDED = 'exceeded'
     RECOVERY = 'recovery'
     
+    __slots__ = ('backend', 'instance', 'action', 'routes', 'key')
+    
     def __str__(self):
         return '%s.%s(%s)' % (self.backend, self.action, self.instance)
     
@@ -24,19 +26,49 @@ class Operation():
     
     def __hash__(self):
         """ set() """
-        return hash((self.backend, self.instance, self.action))
+        return hash(self.key)
     
     def __eq__(self, operation):
         """ set() """
-        return hash(self) == hash(operation)
+        return isinstance(operation, Operation) and self.key == operation.key
     
     def __init__(self, backend, instance, action, routes=None):
         self.backend = backend
         # instance should maintain any dynamic attribute until backend execution
-        # deep copy is prefered over copy otherwise objects will share same atributes (queryset cache)
-        self.instance = copy.deepcopy(instance)
+        self.instance = self.snapshot(instance)
         self.action = action
         self.routes = routes
+        self.key = self.get_key(backend, instance, action)
+    
+    @classmethod
+    def mock(cls, backend, instance, action):
+        """ operation without instance snapshot, only meant for set membership tests """
+        operation = cls.__new__(cls)
+        operation.key = cls.get_key(backend, instance, action)
+        return operation
+    
+    @staticmethod
+    def get_key(backend, instance, action):
+        """ unsaved instances have no identity but their own """
+        pk = instance.pk
+        if pk is None:
+            pk = (None, id(instance))
+        return (backend, instance._meta.concrete_model, pk, action)
+    
+    @staticmethod
+    def snapshot(instance):
+        """
+        Copy of the instance state (field values and dynamic attributes) at collection time
+        Related objects are shared and prefetched querysets are discarded, so they are lazily
+        reloaded by the backend. DELETE operations keep their pre-delete state on the snapshot
+        by means of preload_context().
+        """
+        cls = type(instance)
+        snapshot = cls.__new__(cls)
+        snapshot.__dict__ = instance.__dict__.copy()
+        snapshot._state = copy.copy(instance._state)
+        snapshot.__dict__.pop('_prefetched_objects_cache', None)
+        return snapshot
     
     @classmethod
     def execute(cls, operations, serialize=False, async=None):
@@ -91,8 +91,8 @@ def orchestrate(modeladmin, request, queryset):
         
         route_cache = {}
         for model in models:
-            for instance in model.objects.all():
-                manager.collect(instance, action, operations=operations, route_cache=route_cache)
+            manager.collect_many(model.objects.all(), action, operations=operations,
+                route_cache=route_cache)
             routes = []
         result = []
         for operation in operations:
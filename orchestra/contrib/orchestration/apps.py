@@ -9,6 +9,7 @@ class OrchestrationConfig(AppConfig):
     
     def ready(self):
         from .models import Server, Route, BackendLog
+        from . import signals
         administration.register(BackendLog, icon='scriptlog.png')
         administration.register(Server, parent=BackendLog, icon='vps.png')
         administration.register(Route, parent=BackendLog, icon='hal.png')
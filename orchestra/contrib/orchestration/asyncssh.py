@@ -0,0 +1,150 @@
+"""
+AsyncSSH execution method, requires Python >= 3.5 and asyncssh.
+Kept apart from methods so the other methods keep importing on Python 3.4,
+it is only imported when ORCHESTRATION_SSH_METHOD_BACKEND points to it.
+"""
+import asyncio
+import logging
+import os
+import queue
+import socket
+import sys
+import threading
+
+from celery.datastructures import ExceptionInfo
+
+from orchestra.settings import ORCHESTRA_SSH_DEFAULT_USER
+
+from . import settings
+from .methods import LogStream
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSSHLoop(object):
+    """
+    asyncio event loop running on its own thread, keeping one persistent connection per server
+    Backend executions, running on different threads, open concurrent channels on these connections
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loop = None
+        self.pid = None
+    
+    def get_loop(self):
+        with self.lock:
+            # Forked processes do not inherit the loop thread
+            if self.loop is None or self.pid != os.getpid():
+                self.loop = asyncio.new_event_loop()
+                self.connections = {}
+                self.connection_locks = {}
+                thread = threading.Thread(target=self.loop.run_forever,
+                    name='orchestration-asyncssh', daemon=True)
+                thread.start()
+                self.pid = os.getpid()
+            return self.loop
+    
+    async def connect(self, addr):
+        import asyncssh
+        lock = self.connection_locks.setdefault(addr, asyncio.Lock())
+        # Avoid concurrent handshakes against the same server
+        async with lock:
+            connection = self.connections.get(addr)
+            if connection is None:
+                key = settings.ORCHESTRATION_SSH_KEY_PATH
+                try:
+                    connection = await asyncssh.connect(addr, username=ORCHESTRA_SSH_DEFAULT_USER,
+                        client_keys=[key], known_hosts=None)
+                except asyncssh.Error as exc:
+                    raise ConnectionError(str(exc))
+                self.connections[addr] = connection
+        return connection
+    
+    async def run(self, addr, executable, script, output):
+        import asyncssh
+        connection = await self.connect(addr)
+        try:
+            process = await connection.create_process(executable)
+        except (OSError, asyncssh.Error):
+            # Stale connection, reconnect once
+            self.connections.pop(addr, None)
+            connection = await self.connect(addr)
+            process = await connection.create_process(executable)
+        process.stdin.write(script)
+        process.stdin.write_eof()
+        
+        async def pipe(stream, name):
+            while True:
+                data = await stream.read(4096)
+                if not data:
+                    break
+                output.put((name, data))
+        
+        await asyncio.gather(pipe(process.stdout, 'stdout'), pipe(process.stderr, 'stderr'))
+        result = await process.wait()
+        return result.exit_status
+    
+    def submit(self, addr, executable, script, output):
+        """ thread-safe, returns a concurrent.futures.Future with the exit code """
+        loop = self.get_loop()
+        coroutine = self.run(addr, executable, script, output)
+        return asyncio.run_coroutine_threadsafe(coroutine, loop)
+
+
+asyncssh_loop = AsyncSSHLoop()
+
+
+def AsyncSSH(backend, log, server, cmds, run_async=False):
+    """
+    Executes cmds to remote server using asyncssh, multiplexing channels on one connection per server
+    """
+    script = '\n'.join(cmds)
+    script = script.replace('\r', '')
+    log.state = log.STARTED
+    log.script = '\n'.join((log.script, script))
+    log.save(update_fields=('script', 'state', 'updated_at'))
+    if not cmds:
+        return
+    addr = server.get_address()
+    stream = LogStream(log)
+    try:
+        output = queue.Queue()
+        future = asyncssh_loop.submit(addr, backend.script_executable, script, output)
+        # Sentinel for when the remote process has finished
+        future.add_done_callback(lambda future: output.put((None, None)))
+        logger.debug('%s running on %s' % (backend, server))
+        while True:
+            try:
+                name, data = output.get(timeout=stream.interval)
+            except queue.Empty:
+                stream.flush_due()
+                continue
+            if name is None:
+                break
+            if run_async:
+                stream.write(name, data)
+            else:
+                stream.output[name].append(data)
+        stream.close()
+        try:
+            log.exit_code = future.result()
+        except socket.error as e:
+            logger.error('%s timed out on %s' % (backend, addr))
+            log.state = log.TIMEOUT
+            log.stderr += str(e)
+        else:
+            log.state = log.SUCCESS if log.exit_code == 0 else log.FAILURE
+        logger.debug('%s execution state on %s is %s' % (backend, server, log.state))
+        log.save()
+    except:
+        stream.close()
+        log.state = log.ERROR
+        log.traceback = ExceptionInfo(sys.exc_info()).traceback
+        logger.error('Exception while executing %s on %s' % (backend, server))
+        logger.debug(log.traceback)
+        log.save()
+    finally:
+        if log.state == log.STARTED:
+            log.state = log.ABORTED
+            log.save(update_fields=('state', 'updated_at'))
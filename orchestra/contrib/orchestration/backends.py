@@ -58,6 +58,8 @@ class ServiceBackend(plugins.Plugin, metaclass=ServiceMount):
         self.head = []
         self.content = []
         self.tail = []
+        # Operations of this script, known before prepare() is called
+        self.operations = []
     
     def __getattribute__(self, attr):
         """ Select head, content or tail section depending on the method name """
@@ -118,6 +120,25 @@ class ServiceBackend(plugins.Plugin, metaclass=ServiceMount):
                 return [related]
         return []
     
+    @classmethod
+    def get_model_index(cls):
+        """
+        {model label: [(backend, related path, None for the backend model), ...]}
+        backends are registered at import time, so the index is only built once
+        """
+        if '_model_index' not in cls.__dict__:
+            index = {}
+            for backend in cls.get_backends():
+                index.setdefault(backend.model, []).append((backend, None))
+                models = set([backend.model])
+                for rel_model, path in backend.related_models:
+                    # Only the first path of each model is considered, like get_related()
+                    if rel_model not in models:
+                        models.add(rel_model)
+                        index.setdefault(rel_model, []).append((backend, path))
+            cls._model_index = index
+        return cls._model_index
+    
     @classmethod
     def get_backends(cls, instance=None, action=None):
         backends = cls.get_plugins()
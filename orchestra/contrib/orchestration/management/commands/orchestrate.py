@@ -70,8 +70,7 @@ class Command(BaseCommand):
         operations = OrderedSet()
         route_cache = {}
         for queryset in querysets:
-            for instance in queryset:
-                manager.collect(instance, action, operations=operations, route_cache=route_cache)
+            manager.collect_many(queryset, action, operations=operations, route_cache=route_cache)
         if backends:
             result = []
             for operation in operations:
@@ -1,9 +1,9 @@
 import logging
-import threading
 import traceback
 from collections import OrderedDict
 
 from django.core.mail import mail_admins
+from django.db.models import prefetch_related_objects
 
 from orchestra.utils import db
 from orchestra.utils.python import import_class, OrderedSet
@@ -12,6 +12,7 @@ from . import settings, Operation
 from .backends import ServiceBackend
 from .helpers import send_report
 from .models import BackendLog
+from .pool import pool
 from .signals import pre_action, post_action, pre_commit, post_commit, pre_prepare, post_prepare
 
 
@@ -55,7 +56,8 @@ def generate(operations):
     scripts = OrderedDict()
     cache = {}
     serialize = False
-    # Generate scripts per route+backend
+    # Route all operations first, backends know their whole operation set on prepare()
+    routed = OrderedDict()
     for operation in operations:
         logger.debug("Queued %s" % operation)
         if operation.routes is None:
@@ -64,17 +66,19 @@ def generate(operations):
             # TODO key by action.async
             async_action = route.action_is_async(operation.action)
             key = (route, operation.backend, async_action)
-            if key not in scripts:
-                backend, operations = (operation.backend(), [operation])
-                scripts[key] = (backend, operations)
-                backend.set_head()
-                pre_prepare.send(sender=backend.__class__, backend=backend)
-                backend.prepare()
-                post_prepare.send(sender=backend.__class__, backend=backend)
-            else:
-                scripts[key][1].append(operation)
+            routed.setdefault(key, []).append(operation)
+    # Generate scripts per route+backend
+    for key, key_operations in routed.items():
+        route, backend_class, async_action = key
+        backend = backend_class()
+        backend.operations = key_operations
+        scripts[key] = (backend, key_operations)
+        backend.set_head()
+        pre_prepare.send(sender=backend.__class__, backend=backend)
+        backend.prepare()
+        post_prepare.send(sender=backend.__class__, backend=backend)
+        for operation in key_operations:
             # Get and call backend action method
-            backend = scripts[key][0]
             method = getattr(backend, operation.action)
             kwargs = {
                 'sender': backend.__class__,
@@ -86,8 +90,8 @@ def generate(operations):
             pre_action.send(**kwargs)
             method(operation.instance)
             post_action.send(**kwargs)
-            if backend.serialize:
-                serialize = True
+        if backend.serialize:
+            serialize = True
     for value in scripts.values():
         backend, operations = value
         backend.set_tail()
@@ -102,14 +106,15 @@ def execute(scripts, serialize=False, async=None):
     executes the operations on the servers
     
     serialize: execute one backend at a time
-    async: do not join threads (overrides route.async)
+    async: do not join executions (overrides route.async)
+    
+    scripts are queued on the execution pool, which bounds the global and per-host concurrency
     """
     if settings.ORCHESTRATION_DISABLE_EXECUTION:
         logger.info('Orchestration execution is dissabled by ORCHESTRATION_DISABLE_EXECUTION.')
         return []
     # Execute scripts on each server
-    executions = []
-    threads_to_join = []
+    executions_to_join = []
     logs = []
     for key, value in scripts.items():
         route, __, async_action = key
@@ -133,47 +138,55 @@ def execute(scripts, serialize=False, async=None):
             # Execute one backend at a time, no need for threads
             task(*args, **kwargs)
         else:
-            task = db.close_connection(task)
-            thread = threading.Thread(target=task, args=args, kwargs=kwargs)
-            thread.start()
+            execution = pool.submit(route.host, task, *args, **kwargs)
             if not is_async:
-                threads_to_join.append(thread)
+                executions_to_join.append(execution)
         logs.append(log)
-    [ thread.join() for thread in threads_to_join ]
+    [ execution.join() for execution in executions_to_join ]
     return logs
 
 
+def get_related(instance, path, **kwargs):
+    """ related objects of instance following path (accessor__attribute) """
+    related = instance
+    for attribute in path.split('__'):
+        related = getattr(related, attribute)
+    manager = type(related).__name__
+    if manager == 'ManyRelatedManager' and 'pk_set' in kwargs:
+        # m2m_changed signal
+        return kwargs['model'].objects.filter(pk__in=kwargs['pk_set'])
+    elif manager in ('RelatedManager', 'ManyRelatedManager'):
+        return related.all()
+    elif related is None:
+        return []
+    return [related]
+
+
 def collect(instance, action, **kwargs):
     """ collect operations """
     operations = kwargs.get('operations', OrderedSet())
     route_cache = kwargs.get('route_cache', {})
-    for backend_cls in ServiceBackend.get_backends():
+    opts = instance._meta
+    label = '%s.%s' % (opts.app_label, opts.object_name)
+    for backend_cls, path in ServiceBackend.get_model_index().get(label, ()):
         # Check if there exists a related instance to be executed for this backend and action
-        instances = []
-        if action in backend_cls.actions:
-            if backend_cls.is_main(instance):
-                instances = [(instance, action)]
-            else:
-                for candidate in backend_cls.get_related(instance):
-                    if candidate.__class__.__name__ == 'ManyRelatedManager':
-                        if 'pk_set' in kwargs:
-                            # m2m_changed signal
-                            candidates = kwargs['model'].objects.filter(pk__in=kwargs['pk_set'])
-                        else:
-                            candidates = candidate.all()
-                    else:
-                        candidates = [candidate]
-                    for candidate in candidates:
-                        # Check if a delete for candidate is in operations
-                        delete_mock = Operation(backend_cls, candidate, Operation.DELETE)
-                        if delete_mock not in operations:
-                            # related objects with backend.model trigger save()
-                            instances.append((candidate, Operation.SAVE))
+        if action not in backend_cls.actions:
+            continue
+        if path is None:
+            instances = [(instance, action)]
+        else:
+            instances = []
+            for candidate in get_related(instance, path, **kwargs):
+                # Check if a delete for candidate is in operations
+                delete_mock = Operation.mock(backend_cls, candidate, Operation.DELETE)
+                if delete_mock not in operations:
+                    # related objects with backend.model trigger save()
+                    instances.append((candidate, Operation.SAVE))
         for selected, iaction in instances:
             # Maintain consistent state of operations based on save/delete behaviour
             # Prevent creating a deleted selected by deleting existing saves
             if iaction == Operation.DELETE:
-                save_mock = Operation(backend_cls, selected, Operation.SAVE)
+                save_mock = Operation.mock(backend_cls, selected, Operation.SAVE)
                 try:
                     operations.remove(save_mock)
                 except KeyError:
@@ -207,3 +220,29 @@ def collect(instance, action, **kwargs):
                     operation.preload_context()
                 operations.add(operation)
     return operations
+
+
+def collect_many(instances, action, **kwargs):
+    """
+    collect operations of many instances of the same model
+    related objects are fetched with one query per related path instead of one per instance
+    """
+    operations = kwargs.setdefault('operations', OrderedSet())
+    instances = list(instances)
+    if not instances:
+        return operations
+    opts = instances[0]._meta
+    label = '%s.%s' % (opts.app_label, opts.object_name)
+    paths = set()
+    for backend_cls, path in ServiceBackend.get_model_index().get(label, ()):
+        if path is not None and action in backend_cls.actions:
+            paths.add(path)
+    for path in paths:
+        try:
+            prefetch_related_objects(instances, path)
+        except (AttributeError, ValueError):
+            # Not a prefetchable relation, resolved per instance
+            pass
+    for instance in instances:
+        collect(instance, action, **kwargs)
+    return operations
@@ -6,6 +6,7 @@ from django.db.models.signals import pre_delete, post_save, m2m_changed
 from django.dispatch import receiver
 from django.utils.decorators import ContextDecorator
 
+from orchestra.core.signals import post_save_many
 from orchestra.utils.python import OrderedSet
 
 from . import manager, Operation, helpers
@@ -20,6 +21,12 @@ def post_save_collector(sender, *args, **kwargs):
         orchestrate.collect(Operation.SAVE, **kwargs)
 
 
+@receiver(post_save_many, dispatch_uid='orchestration.post_save_many_manager_collector')
+def post_save_many_collector(sender, *args, **kwargs):
+    if sender not in (BackendLog, BackendOperation, LogEntry):
+        orchestrate.collect_many(Operation.SAVE, **kwargs)
+
+
 @receiver(pre_delete, dispatch_uid='orchestration.pre_delete_manager_collector')
 def pre_delete_collector(sender, *args, **kwargs):
     if sender not in (BackendLog, BackendOperation, LogEntry):
@@ -58,6 +65,16 @@ class orchestrate(ContextDecorator):
         instance = kwargs.pop('instance')
         manager.collect(instance, action, **kwargs)
     
+    @classmethod
+    def collect_many(cls, action, **kwargs):
+        """ Collects pending operations of post_save_many instances """
+        if cls.thread_locals.pending_operations is None:
+            return
+        kwargs['operations'] = cls.thread_locals.pending_operations
+        kwargs['route_cache'] = cls.thread_locals.route_cache
+        instances = kwargs.pop('instances')
+        manager.collect_many(instances, action, **kwargs)
+    
     def __enter__(self):
         cls = type(self)
         self.old_pending_operations = cls.thread_locals.pending_operations
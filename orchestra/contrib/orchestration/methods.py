@@ -4,8 +4,13 @@ import socket
 import sys
 import select
 import textwrap
+import time
+from functools import partial
 
 from celery.datastructures import ExceptionInfo
+from django.db import models
+from django.db.models.functions import Concat
+from django.utils import timezone
 
 from orchestra.settings import ORCHESTRA_SSH_DEFAULT_USER
 from orchestra.utils.sys import sshrun
@@ -17,6 +22,63 @@ from . import settings
 logger = logging.getLogger(__name__)
 
 
+class LogStream(object):
+    """
+    Buffers the stdout and stderr of a running backend and appends them to its log
+    at most every ORCHESTRATION_LOG_FLUSH_INTERVAL seconds or ORCHESTRATION_LOG_FLUSH_SIZE bytes.
+    Flushes only append the new output (UPDATE ... SET stdout = stdout || chunk),
+    close() syncs the log instance with the whole output, it is left to the caller to save it.
+    """
+    def __init__(self, log, interval=None, size=None):
+        self.log = log
+        self.interval = interval or settings.ORCHESTRATION_LOG_FLUSH_INTERVAL
+        self.size = size or settings.ORCHESTRATION_LOG_FLUSH_SIZE
+        self.output = {
+            'stdout': [log.stdout],
+            'stderr': [log.stderr],
+        }
+        self.pending = {
+            'stdout': [],
+            'stderr': [],
+        }
+        self.pending_size = 0
+        self.last_flush = time.time()
+    
+    def write(self, name, data):
+        if data:
+            self.output[name].append(data)
+            self.pending[name].append(data)
+            self.pending_size += len(data)
+        self.flush_due()
+    
+    def flush_due(self):
+        """ also called by readers when no output arrives for interval seconds """
+        if self.pending_size:
+            if self.pending_size >= self.size or time.time()-self.last_flush >= self.interval:
+                self.flush()
+    
+    def flush(self):
+        fields = {}
+        for name, pending in self.pending.items():
+            if pending:
+                fields[name] = Concat(name, models.Value(''.join(pending)),
+                    output_field=models.TextField())
+                self.pending[name] = []
+        if fields:
+            fields['updated_at'] = timezone.now()
+            type(self.log).objects.filter(pk=self.log.pk).update(**fields)
+        self.pending_size = 0
+        self.last_flush = time.time()
+    
+    def close(self):
+        for name, output in self.output.items():
+            if len(output) > 1:
+                self.output[name] = [''.join(output)]
+                setattr(self.log, name, self.output[name][0])
+            self.pending[name] = []
+        self.pending_size = 0
+
+
 def Paramiko(backend, log, server, cmds, async=False, paramiko_connections={}):
     """
     Executes cmds to remote server using Pramaiko
@@ -31,6 +93,7 @@ def Paramiko(backend, log, server, cmds, async=False, paramiko_connections={}):
         return
     channel = None
     ssh = None
+    stream = LogStream(log)
     try:
         addr = server.get_address()
         # ssh connection
@@ -59,22 +122,17 @@ def Paramiko(backend, log, server, cmds, async=False, paramiko_connections={}):
             second = False
             while True:
                 # Non-blocking is the secret ingridient in the async sauce
-                select.select([channel], [], [])
-                if channel.recv_ready():
-                    part = channel.recv(1024).decode('utf-8')
-                    while part:
-                        log.stdout += part
-                        part = channel.recv(1024).decode('utf-8')
-                if channel.recv_stderr_ready():
-                    part = channel.recv_stderr(1024).decode('utf-8')
-                    while part:
-                        log.stderr += part
-                        part = channel.recv_stderr(1024).decode('utf-8')
-                log.save(update_fields=('stdout', 'stderr', 'updated_at'))
+                select.select([channel], [], [], stream.interval)
+                stream.flush_due()
+                while channel.recv_ready():
+                    stream.write('stdout', channel.recv(32768).decode('utf-8'))
+                while channel.recv_stderr_ready():
+                    stream.write('stderr', channel.recv_stderr(32768).decode('utf-8'))
                 if channel.exit_status_ready():
                     if second:
                         break
                     second = True
+            stream.close()
         else:
             log.stdout += channel.makefile('rb', -1).read().decode('utf-8')
             log.stderr += channel.makefile_stderr('rb', -1).read().decode('utf-8')
@@ -84,6 +142,7 @@ def Paramiko(backend, log, server, cmds, async=False, paramiko_connections={}):
         logger.debug('%s execution state on %s is %s' % (backend, server, log.state))
         log.save()
     except:
+        stream.close()
         log.state = log.ERROR
         log.traceback = ExceptionInfo(sys.exc_info()).traceback
         logger.error('Exception while executing %s on %s' % (backend, server))
@@ -108,15 +167,17 @@ def OpenSSH(backend, log, server, cmds, async=False):
     log.save(update_fields=('script', 'state', 'updated_at'))
     if not cmds:
         return
+    stream = LogStream(log)
     try:
+        # Empty states are yielded when idle, so pending output is flushed on time
         ssh = sshrun(server.get_address(), script, executable=backend.script_executable,
-            persist=True, async=async, silent=True)
+            persist=True, async=async, silent=True, timeout=stream.interval if async else None)
         logger.debug('%s running on %s' % (backend, server))
         if async:
             for state in ssh:
-                log.stdout += state.stdout.decode('utf8')
-                log.stderr += state.stderr.decode('utf8')
-                log.save(update_fields=('stdout', 'stderr', 'updated_at'))
+                stream.write('stdout', state.stdout.decode('utf8'))
+                stream.write('stderr', state.stderr.decode('utf8'))
+            stream.close()
             exit_code = state.exit_code
         else:
             log.stdout += ssh.stdout.decode('utf8')
@@ -131,6 +192,7 @@ def OpenSSH(backend, log, server, cmds, async=False):
         logger.debug('%s execution state on %s is %s' % (backend, server, log.state))
         log.save()
     except:
+        stream.close()
         log.state = log.ERROR
         log.traceback = ExceptionInfo(sys.exc_info()).traceback
         logger.error('Exception while executing %s on %s' % (backend, server))
@@ -162,23 +224,25 @@ def Python(backend, log, server, cmds, async=False):
     log.script = '\n'.join((log.script, script))
     log.save(update_fields=('script', 'state', 'updated_at'))
     stdout = ''
+    stream = LogStream(log)
+    write = partial(stream.write, 'stdout') if async else stream.output['stdout'].append
     try:
         for cmd in cmds:
             with CaptureStdout() as stdout:
                 result = cmd(server)
             for line in stdout:
-                log.stdout += line + '\n'
+                write(line + '\n')
             if result:
-                log.stdout += '# Result: %s\n' % result
-            if async:
-                log.save(update_fields=('stdout', 'updated_at'))
+                write('# Result: %s\n' % result)
     except:
+        stream.close()
         log.exit_code = 1
         log.state = log.FAILURE
         log.stdout += '\n'.join(stdout)
         log.traceback += ExceptionInfo(sys.exc_info()).traceback
         logger.error('Exception while executing %s on %s' % (backend, server))
     else:
+        stream.close()
         if not log.exit_code:
             log.exit_code = 0
             log.state = log.SUCCESS
@@ -7,6 +7,7 @@ from django.db.models.signals import pre_delete, post_save, m2m_changed
 from django.dispatch import receiver
 from django.http.response import HttpResponseServerError
 
+from orchestra.core.signals import post_save_many
 from orchestra.utils.python import OrderedSet
 
 from . import manager, Operation
@@ -21,6 +22,12 @@ def post_save_collector(sender, *args, **kwargs):
         OperationsMiddleware.collect(Operation.SAVE, **kwargs)
 
 
+@receiver(post_save_many, dispatch_uid='orchestration.post_save_many_collector')
+def post_save_many_collector(sender, *args, **kwargs):
+    if sender not in (BackendLog, BackendOperation, LogEntry):
+        OperationsMiddleware.collect_many(Operation.SAVE, **kwargs)
+
+
 @receiver(pre_delete, dispatch_uid='orchestration.pre_delete_collector')
 def pre_delete_collector(sender, *args, **kwargs):
     if sender not in (BackendLog, BackendOperation, LogEntry):
@@ -76,6 +83,17 @@ class OperationsMiddleware(object):
         instance = kwargs.pop('instance')
         manager.collect(instance, action, **kwargs)
     
+    @classmethod
+    def collect_many(cls, action, **kwargs):
+        """ Collects pending operations of post_save_many instances """
+        request = getattr(cls.thread_locals, 'request', None)
+        if request is None:
+            return
+        kwargs['operations'] = cls.get_pending_operations()
+        kwargs['route_cache'] = cls.get_route_cache()
+        instances = kwargs.pop('instances')
+        manager.collect_many(instances, action, **kwargs)
+    
     def enter_transaction_management(self):
         type(self).thread_locals.transaction = transaction.atomic()
         type(self).thread_locals.transaction.__enter__()
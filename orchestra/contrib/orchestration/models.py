@@ -1,8 +1,12 @@
 import logging
 import socket
+import threading
+import time
+import uuid
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.encoding import force_text
@@ -163,22 +167,78 @@ class BackendOperation(models.Model):
 autodiscover_modules('backends')
 
 
+class RouteTable(object):
+    """
+    Process-wide index of active routes keyed by (backend, action)
+    
+    Invalidated when routes are saved or deleted. Other processes notice it through a
+    version kept on the default cache, checked each time the table is requested.
+    That requires a cache shared between processes (memcached, database, ...),
+    with a per process cache (locmem) other processes rebuild it after
+    ORCHESTRATION_ROUTE_TABLE_TIMEOUT seconds.
+    """
+    version_key = 'orchestration.route_table.version'
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.table = None
+        self.version = None
+        self.built_at = 0
+    
+    @staticmethod
+    def build(queryset):
+        table = {}
+        for route in queryset.filter(is_active=True).select_related('host'):
+            try:
+                backend_class = route.backend_class
+            except KeyError:
+                logger.warning("Backed '%s' not installed." % route.backend)
+            else:
+                try:
+                    route.get_compiled_match()
+                except SyntaxError as exc:
+                    # Kept on the table, matches() raises it for this backend operations only
+                    logger.error("Invalid match of route %s: %s" % (route, exc))
+                for action in backend_class.get_actions():
+                    key = (route.backend, action)
+                    try:
+                        table[key].append(route)
+                    except KeyError:
+                        table[key] = [route]
+        return table
+    
+    def get(self, queryset):
+        version = caches['default'].get(self.version_key)
+        with self.lock:
+            timeout = settings.ORCHESTRATION_ROUTE_TABLE_TIMEOUT
+            if (self.table is None or version != self.version or
+                    time.time()-self.built_at > timeout):
+                self.table = self.build(queryset)
+                self.version = version
+                self.built_at = time.time()
+            return self.table
+    
+    def invalidate(self):
+        self.table = None
+        caches['default'].set(self.version_key, uuid.uuid4().hex, None)
+
+
+route_table = RouteTable()
+
+
 class RouteQuerySet(models.QuerySet):
     def get_for_operation(self, operation, **kwargs):
-        cache = kwargs.get('cache', {})
+        cache = kwargs.get('cache')
         if not cache:
-            for route in self.filter(is_active=True).select_related('host'):
-                try:
-                    backend_class = route.backend_class
-                except KeyError:
-                    logger.warning("Backed '%s' not installed." % route.backend)
-                else:
-                    for action in backend_class.get_actions():
-                        key = (route.backend, action)
-                        try:
-                            cache[key].append(route)
-                        except KeyError:
-                            cache[key] = [route]
+            if self.query.has_filters():
+                # Filtered querysets can not use the process-wide table
+                table = RouteTable.build(self)
+            else:
+                table = route_table.get(self)
+            if cache is None:
+                cache = table
+            else:
+                cache.update(table)
         routes = []
         backend_cls = operation.backend
         key = (backend_cls.get_name(), operation.action)
@@ -248,13 +308,22 @@ class Route(models.Model):
     def action_is_async(self, action):
         return action in self.async_actions
     
+    def get_compiled_match(self):
+        """ match expression is compiled once, keeping track of changes on self.match """
+        match = self.match or 'True'
+        compiled = getattr(self, '_compiled_match', None)
+        if compiled is None or compiled[0] != match:
+            code = compile(match, '<route %s match>' % self.pk, 'eval')
+            self._compiled_match = compiled = (match, code)
+        return compiled[1]
+    
     def matches(self, instance):
         safe_locals = {
             'instance': instance,
             'obj': instance,
             instance._meta.model_name: instance,
         }
-        return eval(self.match, safe_locals)
+        return eval(self.get_compiled_match(), safe_locals)
     
     def enable(self):
         self.is_active = True
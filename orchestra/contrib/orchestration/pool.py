@@ -0,0 +1,112 @@
+import collections
+import logging
+import threading
+
+from django import db
+
+from . import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class Execution(object):
+    """ Handle of a queued backend execution, join() blocks until it has finished """
+    def __init__(self, host, task, args, kwargs):
+        self.host = host
+        self.task = task
+        self.args = args
+        self.kwargs = kwargs
+        self.finished = threading.Event()
+    
+    def __str__(self):
+        return '%s on %s' % (self.task, self.host)
+    
+    def run(self):
+        try:
+            self.task(*self.args, **self.kwargs)
+        finally:
+            self.finished.set()
+    
+    def join(self, timeout=None):
+        return self.finished.wait(timeout)
+
+
+class ExecutionPool(object):
+    """
+    Bounded pool of worker threads for executing backend scripts
+    
+    At most max_workers scripts run concurrently, and no more than max_per_host on the same
+    server. Remaining scripts are queued in submission order.
+    Workers are started on demand and stop when the queue is drained, so no idle threads
+    are kept around (forked WSGI workers and management commands are safe).
+    While there is work to do, workers reuse their database connection between scripts.
+    """
+    def __init__(self, max_workers=None, max_per_host=None):
+        self.max_workers = max_workers or settings.ORCHESTRATION_MAX_WORKERS
+        self.max_per_host = max_per_host or settings.ORCHESTRATION_MAX_WORKERS_PER_HOST
+        self.pending = collections.deque()
+        self.running = collections.Counter()
+        self.workers = set()
+        self.condition = threading.Condition()
+    
+    def is_worker(self):
+        return threading.current_thread() in self.workers
+    
+    def submit(self, host, task, *args, **kwargs):
+        execution = Execution(host, task, args, kwargs)
+        if self.is_worker():
+            # Nested executions run inline, otherwise joining them can deadlock the pool
+            execution.run()
+            return execution
+        with self.condition:
+            self.pending.append(execution)
+            if len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self.work, name='orchestration-worker')
+                self.workers.add(worker)
+                worker.start()
+            else:
+                self.condition.notify()
+        return execution
+    
+    def get_next(self):
+        """ first pending execution whose host has not reached max_per_host """
+        for execution in self.pending:
+            if self.running[execution.host] < self.max_per_host:
+                self.pending.remove(execution)
+                self.running[execution.host] += 1
+                return execution
+    
+    def work(self):
+        worker = threading.current_thread()
+        try:
+            while True:
+                with self.condition:
+                    execution = self.get_next()
+                    while execution is None:
+                        if not self.pending:
+                            # Leave while holding the lock, submit() will start a new worker
+                            self.workers.discard(worker)
+                            return
+                        # All pending executions target busy hosts
+                        self.condition.wait()
+                        execution = self.get_next()
+                try:
+                    execution.run()
+                except:
+                    logger.exception("Unhandled exception executing %s" % execution)
+                    # The connection may be broken, get a fresh one for the next script
+                    db.connection.close()
+                finally:
+                    with self.condition:
+                        self.running[execution.host] -= 1
+                        if not self.running[execution.host]:
+                            del self.running[execution.host]
+                        self.condition.notify_all()
+        finally:
+            with self.condition:
+                self.workers.discard(worker)
+            db.connection.close()
+
+
+pool = ExecutionPool()
@@ -41,11 +41,49 @@ ORCHESTRATION_BACKEND_CLEANUP_DAYS = Setting('ORCHESTRATION_BACKEND_CLEANUP_DAYS
 )
 
 
+ORCHESTRATION_ROUTE_TABLE_TIMEOUT = Setting('ORCHESTRATION_ROUTE_TABLE_TIMEOUT',
+    30,
+    help_text=_("Seconds the routes are cached by each process.<br>"
+                "Route changes are applied immediately on all processes only when the <tt>default</tt> "
+                "cache backend is shared between them (memcached, database, ...). With a per process "
+                "cache, like the default <tt>locmem</tt>, other processes keep using the former routes "
+                "for up to this number of seconds.")
+)
+
+
+ORCHESTRATION_MAX_WORKERS = Setting('ORCHESTRATION_MAX_WORKERS',
+    16,
+    help_text=_("Maximum number of backend scripts executed concurrently by each process.")
+)
+
+
+ORCHESTRATION_MAX_WORKERS_PER_HOST = Setting('ORCHESTRATION_MAX_WORKERS_PER_HOST',
+    4,
+    help_text=_("Maximum number of backend scripts executed concurrently on the same server.")
+)
+
+
+ORCHESTRATION_LOG_FLUSH_INTERVAL = Setting('ORCHESTRATION_LOG_FLUSH_INTERVAL',
+    1,
+    help_text=_("Seconds between database writes of the output of asynchronous backend executions.")
+)
+
+
+ORCHESTRATION_LOG_FLUSH_SIZE = Setting('ORCHESTRATION_LOG_FLUSH_SIZE',
+    64*1024,
+    help_text=_("Buffered output size (in characters) that triggers a database write "
+                "before <tt>ORCHESTRATION_LOG_FLUSH_INTERVAL</tt> has elapsed.")
+)
+
+
 ORCHESTRATION_SSH_METHOD_BACKEND = Setting('ORCHESTRATION_SSH_METHOD_BACKEND',
     'orchestra.contrib.orchestration.methods.OpenSSH',
-    help_text=_("Two methods are provided:<br>"
+    help_text=_("Three methods are provided:<br>"
                 "1) <tt>orchestra.contrib.orchestration.methods.OpenSSH</tt> with ControlPersist.<br>"
                 "2) <tt>orchestra.contrib.orchestration.methods.Paramiko</tt> with connection pool.<br>"
-                "Both perform similarly, but OpenSSH has the advantage that the connections are shared between workers. "
-                "Paramiko, in contrast, has a per worker connection pool.")
+                "3) <tt>orchestra.contrib.orchestration.asyncssh.AsyncSSH</tt> with one multiplexed connection per server.<br>"
+                "Both OpenSSH and Paramiko perform similarly, but OpenSSH has the advantage that the connections are shared between workers. "
+                "Paramiko, in contrast, has a per worker connection pool. "
+                "AsyncSSH (requires <tt>asyncssh</tt> and Python &gt;= 3.5) runs all the executions of a process on an event loop, "
+                "without spawning an <tt>ssh</tt> process per backend.")
 )
@@ -1,4 +1,6 @@
 import django.dispatch
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 
 pre_action = django.dispatch.Signal(providing_args=['backend', 'instance', 'action'])
@@ -12,3 +14,13 @@ post_prepare = django.dispatch.Signal(providing_args=['backend'])
 pre_commit = django.dispatch.Signal(providing_args=['backend'])
 
 post_commit = django.dispatch.Signal(providing_args=['backend'])
+
+
+@receiver(post_save, sender='orchestration.Route', dispatch_uid='orchestration.route_save_table')
+@receiver(post_delete, sender='orchestration.Route', dispatch_uid='orchestration.route_delete_table')
+@receiver(post_save, sender='orchestration.Server', dispatch_uid='orchestration.server_save_table')
+@receiver(post_delete, sender='orchestration.Server', dispatch_uid='orchestration.server_delete_table')
+def invalidate_route_table(sender, **kwargs):
+    """ routes are cached along with their hosts """
+    from .models import route_table
+    route_table.invalidate()
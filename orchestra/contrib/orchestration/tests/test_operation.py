@@ -0,0 +1,20 @@
+from orchestra.utils.python import OrderedSet
+from orchestra.utils.tests import BaseTestCase
+
+from .. import Operation
+from ..models import Server
+
+
+class OperationTests(BaseTestCase):
+    def test_unsaved_instances(self):
+        first, second = Server(name='web1.example.com'), Server(name='web2.example.com')
+        operations = OrderedSet([
+            Operation(None, first, Operation.SAVE),
+            Operation(None, second, Operation.SAVE),
+            Operation(None, first, Operation.SAVE),
+        ])
+        self.assertEqual(2, len(operations))
+        self.assertIn(Operation.mock(None, second, Operation.SAVE), operations)
+        saved = Server.objects.create(name='web.example.com')
+        copy = Server.objects.get(pk=saved.pk)
+        self.assertEqual(Operation(None, saved, Operation.SAVE), Operation(None, copy, Operation.SAVE))
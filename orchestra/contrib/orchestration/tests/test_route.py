@@ -1,7 +1,9 @@
+from django.core.cache import caches
+
 from orchestra.utils.tests import BaseTestCase
 
 from .. import backends, Operation
-from ..models import Route, Server
+from ..models import Route, RouteTable, Server
 
 
 class RouterTests(BaseTestCase):
@@ -39,3 +41,45 @@ class RouterTests(BaseTestCase):
         route = Route.objects.create(backend=backend, host=self.host2,
                 match='route.backend == "something else"')
         self.assertEqual(2, len(Route.objects.get_for_operation(operation)))
+        
+        route.match = 'True'
+        route.save()
+        self.assertEqual(3, len(Route.objects.get_for_operation(operation)))
+        
+        route.delete()
+        self.assertEqual(2, len(Route.objects.get_for_operation(operation)))
+    
+    def test_route_table_version(self):
+        route_table = RouteTable()
+        table = route_table.get(Route.objects.all())
+        self.assertIs(table, route_table.get(Route.objects.all()))
+        # Routes changed by another process
+        caches['default'].set(RouteTable.version_key, 'changed')
+        self.assertIsNot(table, route_table.get(Route.objects.all()))
+        table = route_table.get(Route.objects.all())
+        self.assertIs(table, route_table.get(Route.objects.all()))
+        route_table.invalidate()
+        self.assertIsNot(table, route_table.get(Route.objects.all()))
+    
+    def test_invalid_match(self):
+        
+        class ValidBackend(backends.ServiceController):
+            verbose_name = 'Valid route'
+            models = ['routes.Route']
+            
+            def save(self, instance):
+                pass
+        
+        class InvalidBackend(ValidBackend):
+            verbose_name = 'Invalid route'
+        
+        choices = backends.ServiceBackend.get_choices()
+        Route._meta.get_field('backend')._choices = choices
+        route = Route.objects.create(backend=ValidBackend.get_name(), host=self.host)
+        Route.objects.create(backend=InvalidBackend.get_name(), host=self.host, match='route.(')
+        # Only operations of the invalid route backend fail
+        operation = Operation(backend=ValidBackend, instance=route, action='save')
+        self.assertEqual(1, len(Route.objects.get_for_operation(operation)))
+        operation = Operation(backend=InvalidBackend, instance=route, action='save')
+        with self.assertRaises(SyntaxError):
+            Route.objects.get_for_operation(operation)
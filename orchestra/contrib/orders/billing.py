@@ -1,69 +1,112 @@
+import datetime
+
+from django.db import connection
 from django.utils.translation import ugettext_lazy as _
 
-from orchestra.contrib.bills.models import Invoice, Fee, ProForma
+from orchestra.contrib.bills.models import Bill, Invoice, Fee, ProForma, BillLine, BillSubline
 
 
 class BillsBackend(object):
     def create_bills(self, account, lines, **options):
-        bill = None
-        ant_bill = None
-        bills = []
+        return self.bulk_create_bills([(account, lines)], **options)
+    
+    def bulk_create_bills(self, account_lines, **options):
+        """
+        account_lines: [(account, lines), ...]
+        bills, lines and sublines of all the accounts are inserted with one query per table
+        """
         create_new = options.get('new_open', False)
         proforma = options.get('proforma', False)
-        for line in lines:
-            quantity = line.metric*line.size
-            if quantity == 0:
-                continue
-            service = line.order.service
-            # Create bill if needed
-            if proforma:
-                if ant_bill is None:
-                    if create_new:
-                        bill = ProForma.objects.create(account=account)
-                    else:
-                        bill = ProForma.objects.filter(account=account, is_open=True).last()
-                        if bill:
-                            bill.updated()
+        open_bills = {}
+        if not create_new:
+            accounts = [account for account, lines in account_lines]
+            open_bills = self.get_open_bills(accounts, ProForma if proforma else Invoice)
+        bills = []
+        new_bills = []
+        updated_bills = []
+        bill_lines = []
+        for account, lines in account_lines:
+            bill = None
+            ant_bill = None
+            for line in lines:
+                quantity = line.metric*line.size
+                if quantity == 0:
+                    continue
+                service = line.order.service
+                # Create bill if needed
+                if proforma or not service.is_fee:
+                    if ant_bill is None:
+                        bill_class = ProForma if proforma else Invoice
+                        if create_new:
+                            bill = bill_class(account=account)
+                            new_bills.append(bill)
                         else:
-                            bill = ProForma.objects.create(account=account, is_open=True)
-                    bills.append(bill)
-                else:
-                    bill = ant_bill
-                ant_bill = bill
-            elif service.is_fee:
-                bill = Fee.objects.create(account=account)
-                bills.append(bill)
-            else:
-                if ant_bill is None:
-                    if create_new:
-                        bill = Invoice.objects.create(account=account)
+                            bill = open_bills.get(account.pk)
+                            if bill:
+                                updated_bills.append(bill)
+                            else:
+                                bill = bill_class(account=account, is_open=True)
+                                new_bills.append(bill)
+                        bills.append(bill)
                     else:
-                        bill = Invoice.objects.filter(account=account, is_open=True).last()
-                        if bill:
-                            bill.updated()
-                        else:
-                            bill = Invoice.objects.create(account=account, is_open=True)
-                    bills.append(bill)
+                        bill = ant_bill
+                    ant_bill = bill
                 else:
-                    bill = ant_bill
-                ant_bill = bill
-            # Create bill line
-            billine = bill.lines.create(
-                rate=service.nominal_price,
-                quantity=line.metric*line.size,
-                verbose_quantity=self.get_verbose_quantity(line),
-                subtotal=line.subtotal,
-                tax=service.tax,
-                description=self.get_line_description(line),
-                start_on=line.ini,
-                end_on=line.end if service.billing_period != service.NEVER else None,
-                order=line.order,
-                order_billed_on=line.order.old_billed_on,
-                order_billed_until=line.order.old_billed_until
-            )
-            self.create_sublines(billine, line.discounts)
+                    bill = Fee(account=account)
+                    new_bills.append(bill)
+                    bills.append(bill)
+                # Create bill line
+                billine = BillLine(
+                    rate=service.nominal_price,
+                    quantity=quantity,
+                    verbose_quantity=self.get_verbose_quantity(line),
+                    subtotal=line.subtotal,
+                    tax=service.tax,
+                    description=self.get_line_description(line),
+                    start_on=line.ini,
+                    end_on=line.end if service.billing_period != service.NEVER else None,
+                    order=line.order,
+                    order_billed_on=line.order.old_billed_on,
+                    order_billed_until=line.order.old_billed_until
+                )
+                bill_lines.append((bill, billine, line.discounts))
+        if updated_bills:
+            Bill.objects.filter(pk__in=[bill.pk for bill in updated_bills]).update(
+                updated_on=datetime.date.today())
+        self.bulk_save(Bill, new_bills)
+        for bill, billine, discounts in bill_lines:
+            billine.bill_id = bill.pk
+        self.bulk_save(BillLine, [billine for bill, billine, discounts in bill_lines])
+        sublines = []
+        for bill, billine, discounts in bill_lines:
+            sublines.extend(self.get_sublines(billine, discounts))
+        BillSubline.objects.bulk_create(sublines)
+        # Totals have been stored by the bulk line inserts
+        totals = Bill.objects.filter(pk__in=set(bill.pk for bill in bills)).values_list(
+            'pk', 'base', 'tax', 'total')
+        totals = {
+            bill_id: bill_totals for bill_id, *bill_totals in totals
+        }
+        for bill in bills:
+            bill.set_totals(*totals[bill.pk])
         return bills
     
+    def get_open_bills(self, accounts, bill_class):
+        """ {account.pk: last open bill} """
+        account_ids = [account.pk for account in accounts]
+        bills = bill_class.objects.filter(account__in=account_ids, is_open=True).order_by('id')
+        return {
+            bill.account_id: bill for bill in bills
+        }
+    
+    def bulk_save(self, model, objs):
+        if connection.features.can_return_ids_from_bulk_insert:
+            model.objects.bulk_create(objs)
+        else:
+            # Primary keys are needed for the related objects
+            for obj in objs:
+                obj.save()
+    
 #    def format_period(self, ini, end):
 #        ini = ini.strftime("%b, %Y")
 #        end = (end-datetime.timedelta(seconds=1)).strftime("%b, %Y")
@@ -87,10 +130,13 @@ class BillsBackend(object):
             return metric
         return "%s&times;%s" % (metric, size)
     
-    def create_sublines(self, line, discounts):
+    def get_sublines(self, line, discounts):
+        sublines = []
         for discount in discounts:
-            line.sublines.create(
+            sublines.append(BillSubline(
+                line_id=line.pk,
                 description=_("Discount per %s") % discount.type.lower(),
                 total=discount.total,
                 type=discount.type,
-            )
+            ))
+        return sublines
@@ -1,4 +1,9 @@
+import bisect
+import datetime
+
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
 
 from orchestra.core import services
 
@@ -37,3 +42,84 @@ def get_related_object(origin, max_depth=2):
                 new_models = list(models)
                 new_models.append(related)
                 queue.append(new_models)
+
+
+class MetricTimeline(object):
+    """
+    In-memory metric history of an order, answers Order.get_metric() lookups
+    with bisection instead of one query per billing period
+    """
+    def __init__(self, metrics):
+        self.metrics = sorted(metrics, key=lambda m: m.id)
+        self.created = [metric.created_on for metric in self.metrics]
+        # created_on is editable, bisection is only used when it follows the id order
+        self.created_sorted = self.created == sorted(self.created)
+        self.updated = sorted(self.metrics, key=lambda m: (m.updated_on, m.id))
+        self.updated_created = [metric.created_on for metric in self.updated]
+        self.updated_created_sorted = self.updated_created == sorted(self.updated_created)
+    
+    def __bool__(self):
+        return bool(self.metrics)
+    
+    @staticmethod
+    def as_date(value):
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        return value
+    
+    @staticmethod
+    def as_datetime(value):
+        if not isinstance(value, datetime.datetime):
+            value = datetime.datetime(value.year, value.month, value.day)
+        if settings.USE_TZ and timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.get_default_timezone())
+        return value
+    
+    def created_before(self, end):
+        """ metrics with created_on < end in id order """
+        end = self.as_date(end)
+        if self.created_sorted:
+            return self.metrics[:bisect.bisect_left(self.created, end)]
+        return [metric for metric in self.metrics if metric.created_on < end]
+    
+    def latest(self, end, ini=None):
+        """ metric with greatest updated_on among created_on < end and updated_on >= ini """
+        end = self.as_date(end)
+        if self.updated_created_sorted:
+            ix = bisect.bisect_left(self.updated_created, end)
+            metric = self.updated[ix-1] if ix else None
+        else:
+            metric = None
+            for candidate in reversed(self.updated):
+                if candidate.created_on < end:
+                    metric = candidate
+                    break
+        if metric is None or (ini is not None and metric.updated_on < self.as_datetime(ini)):
+            return None
+        return metric
+    
+    def get_changes(self, ini, end):
+        """ [(ini, end, value), ...] of the values in effect during ini-end """
+        metrics = self.created_before(end)
+        if not metrics:
+            raise ValueError("No metric storage information.")
+        ini_date = self.as_date(ini)
+        start = 0
+        if self.created_sorted:
+            start = bisect.bisect_right(self.created, ini_date, hi=len(metrics))
+        result = []
+        prev = metrics[start-1] if start else None
+        for metric in metrics[start:]:
+            created = metric.created_on
+            if created > ini_date:
+                if prev is None:
+                    raise ValueError("Inconsistent metric storage information.")
+                cini = prev.created_on
+                if not result:
+                    cini = ini
+                result.append((cini, created, prev.value))
+            prev = metric
+        created = prev.created_on
+        if created < self.as_date(end):
+            result.append((created, end, prev.value))
+        return result
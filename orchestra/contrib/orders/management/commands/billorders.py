@@ -0,0 +1,48 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...models import Order
+
+
+def date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError("'%s' is not a valid YYYY-MM-DD date." % value)
+
+
+class Command(BaseCommand):
+    help = 'Bills pending orders, splitting the accounts between forked worker processes.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('accounts', nargs='*',
+            help='Usernames of the accounts to bill, all by default.')
+        parser.add_argument('--workers', type=int, dest='workers', default=None,
+            help='Number of worker processes, ORDERS_BILLING_WORKERS by default.')
+        parser.add_argument('--billing-point', type=date, dest='billing_point', default=None,
+            help='Date until services are billed (YYYY-MM-DD), today by default.')
+        parser.add_argument('--fixed-point', action='store_true', dest='fixed_point', default=False,
+            help='Bill until the billing point without taking into account the billing period.')
+        parser.add_argument('--proforma', action='store_true', dest='proforma', default=False,
+            help='Creates a pro forma instead of an invoice.')
+        parser.add_argument('--new-open', action='store_true', dest='new_open', default=False,
+            help='Deletes the current open bills and creates new ones.')
+    
+    def handle(self, *args, **options):
+        start = time.time()
+        orders = Order.objects.filter(ignore=False)
+        if options.get('accounts'):
+            orders = orders.filter(account__username__in=options['accounts'])
+        bills = orders.bill_concurrently(
+            workers=options.get('workers'),
+            billing_point=options.get('billing_point') or timezone.now().date(),
+            fixed_point=options.get('fixed_point'),
+            proforma=options.get('proforma'),
+            new_open=options.get('new_open'),
+        )
+        if int(options.get('verbosity', 1)) > 1:
+            elapsed = time.time()-start
+            self.stdout.write('%i bills created or updated in %.2f seconds' % (len(bills), elapsed))
@@ -1,9 +1,12 @@
 import datetime
 import decimal
 import logging
+import multiprocessing
 
-from django.db import models
+from django import db
+from django.db import models, transaction
 from django.db.models import F, Q, Sum
+from django.db.transaction import TransactionManagementError
 from django.apps import apps
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
@@ -14,21 +17,79 @@ from django.utils.translation import ugettext_lazy as _
 from orchestra.models import queryset
 from orchestra.utils.python import import_class
 
-from . import settings
+from . import helpers, settings
 
 
 logger = logging.getLogger(__name__)
 
 
+def bill_orders(args):
+    """ bill_concurrently() worker, returns the pks of the created or updated bills """
+    pks, options = args
+    try:
+        options['commit'] = True
+        bills = Order.objects.filter(pk__in=pks).bill(**options)
+        return [bill.pk for bill in bills]
+    finally:
+        db.connections.close_all()
+
+
 class OrderQuerySet(models.QuerySet):
     group_by = queryset.group_by
     
     def bill(self, **options):
-        bills = []
         bill_backend = Order.get_bill_backend()
-        qs = self.select_related('account', 'service')
+        # Metric history is loaded once for all the orders, see get_metric_timeline()
+        qs = self.select_related('account', 'service').prefetch_related('metrics')
         commit = options.get('commit', True)
-        for account, services in qs.group_by('account', 'service').items():
+        if commit and not options.get('proforma', False):
+            # Orders are updated all at once after the bills have been created
+            options['deferred_saves'] = []
+        accounts = list(qs.group_by('account', 'service').items())
+        account_lines = self.generate_bill_lines(accounts, **options)
+        # TODO make this consistent always returning the same fucking types
+        if not commit:
+            return account_lines
+        with transaction.atomic():
+            bills = bill_backend.bulk_create_bills(account_lines, **options)
+            self.update_billing(options.get('deferred_saves', []))
+        return list(set(bills))
+    
+    def bill_concurrently(self, workers=None, **options):
+        """
+        Accounts are split between forked worker processes, each one billing its share
+        on its own connection and transaction, bill numbers are kept consistent by
+        BillNumber row locks.
+        A failing worker only rolls back its own accounts.
+        """
+        if transaction.get_connection().in_atomic_block:
+            raise TransactionManagementError(
+                "Concurrent billing can not run inside an atomic block, use bill() instead.")
+        workers = workers or settings.ORDERS_BILLING_WORKERS
+        chunks = {}
+        for pk, account_id in self.values_list('pk', 'account_id'):
+            chunks.setdefault(account_id, []).append(pk)
+        account_ids = sorted(chunks)
+        chunks = [
+            [pk for account_id in account_ids[ix::workers] for pk in chunks[account_id]]
+            for ix in range(workers)
+        ]
+        chunks = [(chunk, options) for chunk in chunks if chunk]
+        if len(chunks) < 2:
+            return self.bill(**options)
+        # Children must not inherit the parent's database connections
+        db.connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(len(chunks)) as pool:
+            results = pool.map(bill_orders, chunks)
+        bill_pks = [pk for result in results for pk in result]
+        from orchestra.contrib.bills.models import Bill
+        return list(Bill.objects.filter(pk__in=bill_pks))
+    
+    def generate_bill_lines(self, accounts, **options):
+        """ accounts: [(account, {service: orders})] """
+        account_lines = []
+        for account, services in accounts:
             bill_lines = []
             for service, orders in services.items():
                 for order in orders:
@@ -37,15 +98,18 @@ class OrderQuerySet(models.QuerySet):
                     order.old_billed_until = order.billed_until
                 lines = service.handler.generate_bill_lines(orders, account, **options)
                 bill_lines.extend(lines)
-            # TODO make this consistent always returning the same fucking types
-            if commit:
-                bills += bill_backend.create_bills(account, bill_lines, **options)
-            else:
-                bills += [(account, bill_lines)]
-        # TODO remove if commit and always return unique elemenets (set()) when the other todo is fixed
-        if commit:
-            return list(set(bills))
-        return bills
+            account_lines.append((account, bill_lines))
+        return account_lines
+    
+    def update_billing(self, orders):
+        """ saves billing fields with one query per distinct set of values """
+        updates = {}
+        for order in orders:
+            values = (order.billed_on, order.billed_until, order.billed_metric)
+            updates.setdefault(values, set()).add(order.pk)
+        for (billed_on, billed_until, billed_metric), pks in updates.items():
+            Order.objects.filter(pk__in=pks).update(
+                billed_on=billed_on, billed_until=billed_until, billed_metric=billed_metric)
     
     def givers(self, ini, end):
         return self.cancelled_and_billed().filter(billed_until__gt=ini, registered_on__lt=end)
@@ -105,7 +169,12 @@ class OrderQuerySet(models.QuerySet):
         """ return inactive orders """
         return self.filter(cancelled_on__lte=timezone.now(), **kwargs)
     
-    def update_by_instance(self, instance, service=None, commit=True):
+    def update_by_instance(self, instance, service=None, commit=True, matches=None,
+                           service_orders=None):
+        """
+        matches: precomputed service.handler.matches(instance), only when service is provided
+        service_orders: precomputed active orders of instance, only when service is provided
+        """
         updates = []
         if service is None:
             Service = apps.get_model(settings.ORDERS_SERVICE_MODEL)
@@ -113,9 +182,14 @@ class OrderQuerySet(models.QuerySet):
         else:
             services = [service]
         for service in services:
-            orders = Order.objects.by_object(instance, service=service)
-            orders = orders.select_related('service').active()
-            if service.handler.matches(instance):
+            orders = service_orders
+            if orders is None:
+                orders = Order.objects.by_object(instance, service=service)
+                orders = orders.select_related('service').active()
+            service_matches = matches
+            if service_matches is None:
+                service_matches = service.handler.matches(instance)
+            if service_matches:
                 if not orders:
                     account_id = getattr(instance, 'account_id', instance.pk)
                     if account_id is None:
@@ -147,6 +221,31 @@ class OrderQuerySet(models.QuerySet):
                 logger.info("CANCELLED order id: {id}".format(id=order.id))
                 updates.append((order, 'cancelled'))
         return updates
+    
+    def update_by_instances(self, instances, commit=True):
+        """ update_by_instance() of many instances of the same model, orders are fetched at once """
+        instances = list(instances)
+        if not instances:
+            return []
+        Service = apps.get_model(settings.ORDERS_SERVICE_MODEL)
+        services = Service.objects.filter_by_instance(instances[0])
+        if not services:
+            return []
+        ct = ContentType.objects.get_for_model(instances[0])
+        orders = Order.objects.filter(content_type=ct, object_id__in=[obj.pk for obj in instances])
+        instance_orders = {}
+        for order in orders.select_related('service').active():
+            instance_orders.setdefault((order.object_id, order.service_id), []).append(order)
+        updates = []
+        for service in services:
+            for instance, matches in service.handler.matches_many(instances):
+                orders = instance_orders.get((instance.pk, service.pk), [])
+                for order in orders:
+                    # Saves order.update() from fetching the content object again
+                    order.content_object = instance
+                updates += self.update_by_instance(instance, service=service, commit=commit,
+                    matches=matches, service_orders=orders)
+        return updates
 
 
 class Order(models.Model):
@@ -199,6 +298,9 @@ class Order(models.Model):
             metric = handler.get_metric(instance)
             if metric is not None:
                 MetricStorage.objects.store(self, metric)
+                # Loaded metric history is outdated
+                self.__dict__.pop('_metric_timeline', None)
+                getattr(self, '_prefetched_objects_cache', {}).pop('metrics', None)
             metric = ', metric:{}'.format(metric)
         description = handler.get_order_description(instance)
         logger.info("UPDATED order id:{id}, description:{description}{metric}".format(
@@ -230,44 +332,46 @@ class Order(models.Model):
         self.ignore = False
         self.save(update_fields=['ignore'])
     
+    def get_metric_timeline(self):
+        """ metric history loaded once, uses prefetch_related('metrics') when available """
+        try:
+            return self._metric_timeline
+        except AttributeError:
+            self._metric_timeline = helpers.MetricTimeline(self.metrics.all())
+            return self._metric_timeline
+    
     def get_metric(self, *args, **kwargs):
+        timeline = self.get_metric_timeline()
         if kwargs.pop('changes', False):
             ini, end = args
-            result = []
-            prev = None
-            for metric in self.metrics.filter(created_on__lt=end).order_by('id'):
-                created = metric.created_on
-                if created > ini:
-                    if prev is None:
-                        raise ValueError("Metric storage information for order %i is inconsistent." % self.id)
-                    cini = prev.created_on
-                    if not result:
-                        cini = ini
-                    result.append((cini, created, prev.value))
-                prev = metric
-            if created < end:
-                result.append((created, end, metric.value))
-            return result
+            if not timeline.created_before(end):
+                raise ValueError("No metric storage information for order %i." % self.id)
+            try:
+                return timeline.get_changes(ini, end)
+            except ValueError:
+                raise ValueError("Metric storage information for order %i is inconsistent." % self.id)
         if kwargs:
             raise AttributeError
         if len(args) == 2:
             # Slot
             ini, end = args
-            metrics = self.metrics.filter(created_on__lt=end, updated_on__gte=ini)
+            metric = timeline.latest(end, ini=ini)
         elif len(args) == 1:
             # On effect on date
             date = args[0]
             date = datetime.date(year=date.year, month=date.month, day=date.day)
             date += datetime.timedelta(days=1)
-            metrics = self.metrics.filter(created_on__lte=date)
+            # created_on <= date
+            metric = timeline.latest(date + datetime.timedelta(days=1))
         elif not args:
-            return self.metrics.latest('updated_on').value
+            if not timeline:
+                raise MetricStorage.DoesNotExist
+            return timeline.updated[-1].value
         else:
             raise AttributeError
-        try:
-            return metrics.latest('updated_on').value
-        except MetricStorage.DoesNotExist:
+        if metric is None:
             return decimal.Decimal(0)
+        return metric.value
 
 
 class MetricStorageQuerySet(models.QuerySet):
@@ -44,3 +44,10 @@ ORDERS_BILLED_METRIC_CLEANUP_DAYS = Setting('ORDERS_BILLED_METRIC_CLEANUP_DAYS',
     40,
     help_text=("Number of days after a billed stored metric is deleted."),
 )
+
+
+ORDERS_BILLING_WORKERS = Setting('ORDERS_BILLING_WORKERS',
+    4,
+    help_text=("Number of forked processes that bill different accounts concurrently on "
+               "<tt>billorders</tt>, each one on its own transaction."),
+)
@@ -1,7 +1,10 @@
+from collections import OrderedDict
+
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from orchestra.core import services
+from orchestra.core.signals import post_save_many
 
 from . import helpers, settings
 from .models import Order
@@ -37,3 +40,21 @@ def update_orders(sender, **kwargs):
             related = helpers.get_related_object(instance)
             if related and related != instance:
                 Order.objects.update_by_instance(related)
+
+
+@receiver(post_save_many, dispatch_uid="orders.update_orders_many")
+def update_orders_many(sender, **kwargs):
+    if sender._meta.app_label not in settings.ORDERS_EXCLUDED_APPS:
+        instances = kwargs['instances']
+        if sender in services:
+            Order.objects.update_by_instances(instances)
+        else:
+            # Related objects of the same type have their orders updated at once
+            related_instances = OrderedDict()
+            for instance in instances:
+                if not hasattr(instance, 'account'):
+                    related = helpers.get_related_object(instance)
+                    if related and related != instance:
+                        related_instances.setdefault(type(related), OrderedDict())[related.pk] = related
+            for related in related_instances.values():
+                Order.objects.update_by_instances(related.values())
@@ -0,0 +1,169 @@
+import datetime
+import decimal
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.transaction import TransactionManagementError
+from django.utils import timezone
+
+from orchestra.contrib.accounts.models import Account
+from orchestra.contrib.services.models import Service
+from orchestra.utils.tests import BaseTestCase
+
+from ..models import MetricStorage, Order
+
+
+def get_metric(order, *args, **kwargs):
+    """ Former implementation of Order.get_metric(), one query per call """
+    if kwargs.pop('changes', False):
+        ini, end = args
+        result = []
+        prev = None
+        for metric in order.metrics.filter(created_on__lt=end).order_by('id'):
+            created = metric.created_on
+            if created > ini:
+                if prev is None:
+                    raise ValueError("Metric storage information for order %i is inconsistent." % order.id)
+                cini = prev.created_on
+                if not result:
+                    cini = ini
+                result.append((cini, created, prev.value))
+            prev = metric
+        if created < end:
+            result.append((created, end, metric.value))
+        return result
+    if len(args) == 2:
+        ini, end = args
+        metrics = order.metrics.filter(created_on__lt=end, updated_on__gte=ini)
+    elif len(args) == 1:
+        date = args[0]
+        date = datetime.date(year=date.year, month=date.month, day=date.day)
+        date += datetime.timedelta(days=1)
+        metrics = order.metrics.filter(created_on__lte=date)
+    else:
+        return order.metrics.latest('updated_on').value
+    try:
+        return metrics.latest('updated_on').value
+    except MetricStorage.DoesNotExist:
+        return decimal.Decimal(0)
+
+
+class GetMetricTests(BaseTestCase):
+    DEPENDENCIES = (
+        'orchestra.contrib.orders',
+        'orchestra.contrib.services',
+    )
+    
+    def setUp(self):
+        self.account = self.create_account()
+        self.service = Service.objects.create(
+            description="Metric",
+            content_type=ContentType.objects.get_for_model(Account),
+            match='False',
+            billing_period=Service.MONTHLY,
+            billing_point=Service.FIXED_DATE,
+            is_fee=False,
+            metric='len(account.username)',
+            pricing_period=Service.BILLING_PERIOD,
+            rate_algorithm='orchestra.contrib.plans.ratings.step_price',
+            on_cancel=Service.NOTHING,
+            payment_style=Service.POSTPAY,
+            tax=0,
+            nominal_price=10,
+        )
+    
+    def create_order(self, history):
+        """ history: [(created_on, updated_on, value), ...] in id order """
+        order = Order.objects.create(account=self.account, service=self.service,
+            content_object=self.account)
+        for created_on, updated_on, value in history:
+            updated_on = timezone.make_aware(updated_on, timezone.get_default_timezone())
+            metric = MetricStorage.objects.create(order=order, value=value, updated_on=updated_on)
+            # created_on is auto_now_add
+            MetricStorage.objects.filter(pk=metric.pk).update(created_on=created_on)
+        return order
+    
+    def get_calls(self):
+        """ all call forms over monthly slots around the history """
+        dates = [datetime.date(2015, 12, 1)]
+        for __ in range(8):
+            date = dates[-1]
+            dates.append(datetime.date(date.year + date.month//12, date.month % 12 + 1, 1))
+        dates += [datetime.date(2016, 2, 1), datetime.date(2016, 3, 4), datetime.date(2016, 3, 5)]
+        dates.sort()
+        calls = [((date,), {}) for date in dates]
+        for ini in dates:
+            for end in dates:
+                if ini < end:
+                    calls.append(((ini, end), {}))
+                    calls.append(((ini, end), {'changes': True}))
+        return calls
+    
+    def assertSameMetrics(self, order):
+        prefetched = Order.objects.prefetch_related('metrics').get(pk=order.pk)
+        for args, kwargs in self.get_calls():
+            try:
+                expected = get_metric(order, *args, **kwargs)
+            except (ValueError, UnboundLocalError):
+                # No or inconsistent metric storage information
+                for current in (order, prefetched):
+                    with self.assertRaises(ValueError):
+                        current.get_metric(*args, **dict(kwargs))
+            else:
+                for current in (order, prefetched):
+                    self.assertEqual(expected, current.get_metric(*args, **dict(kwargs)),
+                        "get_metric(*%s, **%s)" % (args, kwargs))
+        self.assertEqual(get_metric(order), order.get_metric())
+        self.assertEqual(get_metric(order), prefetched.get_metric())
+    
+    def test_history(self):
+        order = self.create_order([
+            (datetime.date(2016, 1, 1), datetime.datetime(2016, 1, 20), 10),
+            (datetime.date(2016, 2, 1), datetime.datetime(2016, 2, 25), 20),
+            (datetime.date(2016, 3, 5), datetime.datetime(2016, 4, 10), 5),
+            (datetime.date(2016, 5, 1), datetime.datetime(2016, 5, 2), 0),
+        ])
+        self.assertSameMetrics(order)
+    
+    def test_unordered_history(self):
+        # created_on does not follow the id order
+        order = self.create_order([
+            (datetime.date(2016, 3, 1), datetime.datetime(2016, 3, 20), 10),
+            (datetime.date(2016, 1, 1), datetime.datetime(2016, 6, 25), 20),
+            (datetime.date(2016, 2, 1), datetime.datetime(2016, 2, 10), 5),
+            (datetime.date(2016, 5, 1), datetime.datetime(2016, 1, 2), 7),
+        ])
+        self.assertSameMetrics(order)
+    
+    def test_empty_history(self):
+        order = self.create_order([])
+        with self.assertRaises(MetricStorage.DoesNotExist):
+            order.get_metric()
+        with self.assertRaisesRegex(ValueError, "No metric storage information"):
+            order.get_metric(datetime.date(2016, 1, 1), datetime.date(2016, 2, 1), changes=True)
+        self.assertEqual(0, order.get_metric(datetime.date(2016, 1, 1)))
+        self.assertEqual(0, order.get_metric(datetime.date(2016, 1, 1), datetime.date(2016, 2, 1)))
+    
+    def test_update(self):
+        order = self.create_order([])
+        MetricStorage.objects.store(order, 3)
+        # History loaded before the order is updated
+        self.assertEqual(3, order.get_metric())
+        prefetched = Order.objects.prefetch_related('metrics').get(pk=order.pk)
+        self.assertEqual(3, prefetched.get_metric())
+        for current in (order, prefetched):
+            current.update()
+            # Stored on the same day, value replaced
+            self.assertEqual(len(self.account.username), current.get_metric())
+            self.assertEqual(get_metric(order), current.get_metric())
+        self.assertEqual(1, order.metrics.count())
+
+
+class BillConcurrentlyTests(BaseTestCase):
+    DEPENDENCIES = (
+        'orchestra.contrib.orders',
+    )
+    
+    def test_atomic_block(self):
+        # Test cases run inside a transaction, same as admin requests
+        with self.assertRaises(TransactionManagementError):
+            Order.objects.all().bill_concurrently(workers=2)
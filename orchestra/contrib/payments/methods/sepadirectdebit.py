@@ -1,7 +1,8 @@
 import datetime
+import itertools
 import logging
 import os
-from io import StringIO
+from functools import lru_cache
 
 from django import forms
 from django.utils import timezone
@@ -82,105 +83,111 @@ class SEPADirectDebit(PaymentMethod):
     
     @classmethod
     def process_credits(cls, transactions):
-        import lxml.builder
         from lxml.builder import E
         from ..models import TransactionProcess
         process = TransactionProcess.objects.create()
+        transactions = cls.prefetch(transactions)
         context = cls.get_context(transactions)
         # http://businessbanking.bankofireland.com/fs/doc/wysiwyg/b22440-mss130725-pain001-xml-file-structure-dec13.pdf
-        sepa = lxml.builder.ElementMaker(
-             nsmap = {
-                 'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-                 None: 'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03',
-             }
-        )
-        sepa = sepa.Document(
-            E.CstmrCdtTrfInitn(
-                cls.get_header(context, process),
-                E.PmtInf(                                   # Payment Info
-                    E.PmtInfId(str(process.id)),            # Payment Id
-                    E.PmtMtd("TRF"),                        # Payment Method
-                    E.NbOfTxs(context['num_transactions']), # Number of Transactions
-                    E.CtrlSum(context['total']),            # Control Sum
-                    E.ReqdExctnDt(                          # Requested Execution Date
-                        (context['now']+datetime.timedelta(days=10)).strftime("%Y-%m-%d")
-                    ),
-                    E.Dbtr(                                 # Debtor
-                        E.Nm(context['name'])
-                    ),
-                    E.DbtrAcct(                             # Debtor Account
-                        E.Id(
-                            E.IBAN(context['iban'])
-                        )
-                    ),
-                    E.DbtrAgt(                              # Debtor Agent
-                        E.FinInstnId(                       # Financial Institution Id
-                            E.BIC(context['bic'])
-                        )
-                    ),
-                *list(cls.get_credit_transactions(transactions, process))   # Transactions
+        payment_info = (                            # Payment Info
+            E.PmtInfId(str(process.id)),            # Payment Id
+            E.PmtMtd("TRF"),                        # Payment Method
+            E.NbOfTxs(context['num_transactions']), # Number of Transactions
+            E.CtrlSum(context['total']),            # Control Sum
+            E.ReqdExctnDt(                          # Requested Execution Date
+                (context['now']+datetime.timedelta(days=10)).strftime("%Y-%m-%d")
+            ),
+            E.Dbtr(                                 # Debtor
+                E.Nm(context['name'])
+            ),
+            E.DbtrAcct(                             # Debtor Account
+                E.Id(
+                    E.IBAN(context['iban'])
                 )
-            )
+            ),
+            E.DbtrAgt(                              # Debtor Agent
+                E.FinInstnId(                       # Financial Institution Id
+                    E.BIC(context['bic'])
+                )
+            ),
         )
         file_name = 'credit-transfer-%i.xml' % process.id
-        cls.process_xml(sepa, 'pain.001.001.03.xsd', file_name, process)
+        cls.process_xml(
+            'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03', 'CstmrCdtTrfInitn',
+            cls.get_header(context, process), payment_info,
+            cls.get_credit_transactions(transactions, process),   # Transactions
+            'pain.001.001.03.xsd', file_name, process
+        )
+        cls.mark_as_processed(transactions, process)
         return process
     
     @classmethod
     def process_debts(cls, transactions):
-        import lxml.builder
         from lxml.builder import E
         from ..models import TransactionProcess
         process = TransactionProcess.objects.create()
+        transactions = cls.prefetch(transactions)
         context = cls.get_context(transactions)
         # http://businessbanking.bankofireland.com/fs/doc/wysiwyg/sepa-direct-debit-pain-008-001-02-xml-file-structure-july-2013.pdf
-        sepa = lxml.builder.ElementMaker(
-             nsmap = {
-                 'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-                 None: 'urn:iso:std:iso:20022:tech:xsd:pain.008.001.02',
-             }
-        )
-        sepa = sepa.Document(
-            E.CstmrDrctDbtInitn(
-                cls.get_header(context, process),
-                E.PmtInf(                                   # Payment Info
-                    E.PmtInfId(str(process.id)),            # Payment Id
-                    E.PmtMtd("DD"),                         # Payment Method
-                    E.NbOfTxs(context['num_transactions']), # Number of Transactions
-                    E.CtrlSum(context['total']),            # Control Sum
-                    E.PmtTpInf(                             # Payment Type Info
-                        E.SvcLvl(                           # Service Level
-                            E.Cd("SEPA")                    # Code
-                        ),
-                        E.LclInstrm(                        # Local Instrument
-                            E.Cd("CORE")                    # Code
-                        ),
-                        E.SeqTp("RCUR")                     # Sequence Type
-                    ),
-                    E.ReqdColltnDt(                         # Requested Collection Date
-                        context['now'].strftime("%Y-%m-%d")
-                    ),
-                    E.Cdtr(                                 # Creditor
-                        E.Nm(context['name'])
-                    ),
-                    E.CdtrAcct(                             # Creditor Account
-                        E.Id(
-                            E.IBAN(context['iban'])
-                        )
-                    ),
-                    E.CdtrAgt(                              # Creditor Agent
-                        E.FinInstnId(                       # Financial Institution Id
-                            E.BIC(context['bic'])
-                        )
-                    ),
-                *list(cls.get_debt_transactions(transactions, process))   # Transactions
+        payment_info = (                            # Payment Info
+            E.PmtInfId(str(process.id)),            # Payment Id
+            E.PmtMtd("DD"),                         # Payment Method
+            E.NbOfTxs(context['num_transactions']), # Number of Transactions
+            E.CtrlSum(context['total']),            # Control Sum
+            E.PmtTpInf(                             # Payment Type Info
+                E.SvcLvl(                           # Service Level
+                    E.Cd("SEPA")                    # Code
+                ),
+                E.LclInstrm(                        # Local Instrument
+                    E.Cd("CORE")                    # Code
+                ),
+                E.SeqTp("RCUR")                     # Sequence Type
+            ),
+            E.ReqdColltnDt(                         # Requested Collection Date
+                context['now'].strftime("%Y-%m-%d")
+            ),
+            E.Cdtr(                                 # Creditor
+                E.Nm(context['name'])
+            ),
+            E.CdtrAcct(                             # Creditor Account
+                E.Id(
+                    E.IBAN(context['iban'])
                 )
-            )
+            ),
+            E.CdtrAgt(                              # Creditor Agent
+                E.FinInstnId(                       # Financial Institution Id
+                    E.BIC(context['bic'])
+                )
+            ),
         )
         file_name = 'direct-debit-%i.xml' % process.id
-        cls.process_xml(sepa, 'pain.008.001.02.xsd', file_name, process)
+        cls.process_xml(
+            'urn:iso:std:iso:20022:tech:xsd:pain.008.001.02', 'CstmrDrctDbtInitn',
+            cls.get_header(context, process), payment_info,
+            cls.get_debt_transactions(transactions, process),   # Transactions
+            'pain.008.001.02.xsd', file_name, process
+        )
+        cls.mark_as_processed(transactions, process)
         return process
     
+    @classmethod
+    def prefetch(cls, transactions):
+        """ same transactions with their bill, account, contact and source fetched in one query """
+        from ..models import Transaction
+        related = Transaction.objects.select_related('bill__account__billcontact', 'source')
+        related = related.in_bulk([transaction.pk for transaction in transactions])
+        return [related[transaction.pk] for transaction in transactions]
+    
+    @classmethod
+    def mark_as_processed(cls, transactions, process):
+        from ..models import Transaction
+        state = Transaction.WAITTING_EXECUTION
+        Transaction.objects.filter(pk__in=[transaction.pk for transaction in transactions]).update(
+            state=state, process=process, modified_at=timezone.now())
+        for transaction in transactions:
+            transaction.process = process
+            transaction.state = state
+    
     @classmethod
     def get_context(cls, transactions):
         return {
@@ -195,12 +202,8 @@ class SEPADirectDebit(PaymentMethod):
     
     @classmethod
     def get_debt_transactions(cls, transactions, process):
-        import lxml.builder
         from lxml.builder import E
         for transaction in transactions:
-            transaction.process = process
-            transaction.state = transaction.WAITTING_EXECUTION
-            transaction.save(update_fields=('state', 'process', 'modified_at'))
             account = transaction.account
             data = transaction.source.data
             yield E.DrctDbtTxInf(                           # Direct Debit Transaction Info
@@ -240,12 +243,8 @@ class SEPADirectDebit(PaymentMethod):
     
     @classmethod
     def get_credit_transactions(cls, transactions, process):
-        import lxml.builder
         from lxml.builder import E
         for transaction in transactions:
-            transaction.process = process
-            transaction.state = transaction.WAITTING_EXECUTION
-            transaction.save(update_fields=('state', 'process', 'modified_at'))
             account = transaction.account
             data = transaction.source.data
             yield E.CdtTrfTxInf(                            # Credit Transfer Transaction Info
@@ -277,7 +276,6 @@ class SEPADirectDebit(PaymentMethod):
     
     @classmethod
     def get_header(cls, context, process):
-        import lxml.builder
         from lxml.builder import E
         return E.GrpHdr(                            # Group Header
             E.MsgId(str(process.id)),           # Message Id
@@ -299,19 +297,72 @@ class SEPADirectDebit(PaymentMethod):
         )
     
     @classmethod
-    def process_xml(cls, sepa, xsd, file_name, process):
+    def write_element(cls, xf, element, level):
+        """ writes element as pretty_print does at the given nesting level """
+        indent(element, level)
+        xf.write('\n' + '  '*level)
+        xf.write(element)
+    
+    @classmethod
+    def process_xml(cls, namespace, root, header, payment_info, transactions, xsd, file_name, process):
+        """
+        Streams the document into the process file consuming one transaction at a time
+        Elements are unqualified, they take the default namespace when parsed back
+        """
         from lxml import etree
-        # http://www.iso20022.org/documents/messages/1_0_version/pain/schemas/pain.008.001.02.zip
-        path = os.path.dirname(os.path.realpath(__file__))
-        xsd_path = os.path.join(path, xsd)
-        schema_doc = etree.parse(xsd_path)
-        schema = etree.XMLSchema(schema_doc)
-        sepa = StringIO(etree.tostring(sepa).decode('utf8'))
-        sepa = etree.parse(sepa)
-        schema.assertValid(sepa)
         process.file = file_name
+        path = process.file.path
+        nsmap = {
+            'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+            None: namespace,
+        }
+        with open(path, 'wb') as handler:
+            with etree.xmlfile(handler, encoding='UTF-8') as xf:
+                xf.write_declaration()
+                with xf.element('Document', nsmap=nsmap):
+                    xf.write('\n  ')
+                    with xf.element(root):
+                        cls.write_element(xf, header, 2)
+                        xf.write('\n    ')
+                        with xf.element('PmtInf'):
+                            for element in itertools.chain(payment_info, transactions):
+                                cls.write_element(xf, element, 3)
+                            xf.write('\n    ')
+                        xf.write('\n  ')
+                    xf.write('\n')
+            handler.write(b'\n')
+        try:
+            validate_xml(path, xsd)
+        except:
+            os.remove(path)
+            raise
         process.save(update_fields=['file'])
-        sepa.write(process.file.path,
-                   pretty_print=True,
-                   xml_declaration=True,
-                   encoding='UTF-8')
+
+
+def indent(element, level=0):
+    """ whitespace of lxml pretty_print, elements have no mixed content """
+    if len(element):
+        element.text = '\n' + '  '*(level+1)
+        for child in element:
+            indent(child, level+1)
+            child.tail = '\n' + '  '*(level+1)
+        child.tail = '\n' + '  '*level
+
+
+@lru_cache()
+def get_schema(xsd):
+    """ XSD schemas are parsed once per process """
+    from lxml import etree
+    # http://www.iso20022.org/documents/messages/1_0_version/pain/schemas/pain.008.001.02.zip
+    path = os.path.dirname(os.path.realpath(__file__))
+    xsd_path = os.path.join(path, xsd)
+    return etree.XMLSchema(etree.parse(xsd_path))
+
+
+def validate_xml(path, xsd):
+    """ incremental validation, raises XMLSyntaxError without keeping the tree in memory """
+    from lxml import etree
+    for __, element in etree.iterparse(path, schema=get_schema(xsd)):
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
@@ -63,14 +63,18 @@ class TransactionQuerySet(models.QuerySet):
     group_by = group_by
     
     def create(self, **kwargs):
-        source = kwargs.get('source')
+        kwargs['state'] = self.get_initial_state(
+            kwargs.get('source'), kwargs.get('amount'), kwargs.get('state'))
+        return super(TransactionQuerySet, self).create(**kwargs)
+    
+    def get_initial_state(self, source, amount, state=None):
+        """ also used by bulk creations, that bypass create() """
         if source is None or not hasattr(source.method_class, 'process'):
             # Manual payments don't need processing
-            kwargs['state'] = self.model.WAITTING_EXECUTION
-        amount = kwargs.get('amount')
+            state = self.model.WAITTING_EXECUTION
         if amount == 0:
-            kwargs['state'] = self.model.SECURED
-        return super(TransactionQuerySet, self).create(**kwargs)
+            state = self.model.SECURED
+        return state or self.model.WAITTING_PROCESSING
     
     def secured(self):
         return self.filter(state=Transaction.SECURED)
@@ -134,7 +138,7 @@ class Transaction(models.Model):
     def clean(self):
         if not self.pk:
             amount = self.bill.transactions.exclude(state=self.REJECTED).amount()
-            if amount >= self.bill.total:
+            if amount >= self.bill.compute_total():
                 raise ValidationError(
                     _("Bill %(number)s already has valid transactions that cover bill total amount (%(amount)s).") % {
                         'number': self.bill.number,
@@ -2,6 +2,7 @@ import datetime
 import decimal
 import itertools
 
+from django.db.models import Sum
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
@@ -22,6 +23,10 @@ class Aggregation(plugins.Plugin, metaclass=plugins.PluginMount):
         """ given a dataset computes its usage according to the method (avg, sum, ...) """
         raise NotImplementedError
     
+    def compute_usages(self, dataset):
+        """ given an unfiltered dataset computes the usage of each object, {object_id: usage} """
+        raise NotImplementedError
+    
     def aggregate_history(self, dataset):
         raise NotImplementedError
 
@@ -32,7 +37,7 @@ class Last(Aggregation):
     verbose_name = _("Last value")
     
     def filter(self, dataset, date=None):
-        dataset = dataset.order_by('object_id', '-id').distinct('monitor')
+        dataset = dataset.order_by('object_id', '-id').distinct('object_id')
         if date is not None:
             dataset = dataset.filter(created_at__lte=date)
         return dataset
@@ -43,6 +48,10 @@ class Last(Aggregation):
             return sum(values)
         return None
     
+    def compute_usages(self, dataset):
+        dataset = dataset.order_by('object_id', '-id').distinct('object_id')
+        return dict(dataset.values_list('object_id', 'value'))
+    
     def aggregate_history(self, dataset):
         prev_object_id = None
         prev_object_repr = None
@@ -74,6 +83,10 @@ class MonthlySum(Last):
             created_at__month=date.month,
         )
     
+    def compute_usages(self, dataset):
+        dataset = self.filter(dataset).order_by().values_list('object_id')
+        return dict(dataset.annotate(Sum('value')))
+    
     def aggregate_history(self, dataset):
         prev = None
         prev_object_id = None
@@ -122,30 +135,41 @@ class MonthlyAvg(MonthlySum):
             day=1,
         )
     
+    def get_object_usage(self, dataset):
+        """ time weighted average of the data of one object, ordered by created_at """
+        last = dataset[-1]
+        epoch = self.get_epoch(date=last.created_at)
+        if not isinstance(epoch, datetime.datetime):
+            epoch = datetime.datetime.combine(epoch, datetime.time(tzinfo=last.created_at.tzinfo))
+        total = (last.created_at-epoch).total_seconds()
+        ini = epoch
+        current = 0
+        for mdata in dataset:
+            slot = (mdata.created_at-ini).total_seconds()
+            current += mdata.value * decimal.Decimal(str(slot/total))
+            ini = mdata.created_at
+        return current
+    
     def compute_usage(self, dataset):
         result = 0
         has_result = False
-        aggregate = []
         for object_id, dataset in dataset.order_by('created_at').group_by('object_id').items():
-            try:
-                last = dataset[-1]
-            except IndexError:
-                continue
-            epoch = self.get_epoch(date=last.created_at)
-            total = (last.created_at-epoch).total_seconds()
-            ini = epoch
-            current = 0
-            for mdata in dataset:
+            if dataset:
                 has_result = True
-                slot = (mdata.created_at-ini).total_seconds()
-                current += mdata.value * decimal.Decimal(str(slot/total))
-                ini = mdata.created_at
-            else:
-                result += current
+                result += self.get_object_usage(dataset)
         if has_result:
             return result
         return None
     
+    def compute_usages(self, dataset):
+        # Single ordered scan of all the objects
+        dataset = self.filter(dataset).order_by('object_id', 'created_at')
+        dataset = dataset.only('object_id', 'created_at', 'value').iterator()
+        return {
+            object_id: self.get_object_usage(list(datas))
+            for object_id, datas in itertools.groupby(dataset, lambda mdata: mdata.object_id)
+        }
+    
     def aggregate_history(self, dataset):
         yield from super(MonthlySum, self).aggregate_history(dataset)
 
@@ -1,12 +1,111 @@
 import datetime
+import os
+import textwrap
 
+from django.db.models import Max
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 
 from orchestra.contrib.orchestration import ServiceBackend
 
-from . import helpers
+from . import helpers, settings
+
+
+# Embedded by log parsing monitors, see ServiceMonitor.append_log_reader()
+LOG_READER = textwrap.dedent("""\
+    import json
+    import os
+    import sys
+    
+    class LogState(object):
+        \""" [inode, offset, date] of each log, as left by the last execution \"""
+        def __init__(self, path):
+            self.path = path
+            try:
+                with open(path, 'r') as handler:
+                    self.logs = json.load(handler)
+            except (IOError, ValueError):
+                self.logs = {}
+        
+        def save(self):
+            try:
+                dirname = os.path.dirname(self.path)
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                with open(self.path+'.tmp', 'w') as handler:
+                    json.dump(self.logs, handler)
+                os.rename(self.path+'.tmp', self.path)
+            except (IOError, OSError) as e:
+                sys.stderr.write(str(e)+'\\n')
+    
+    class LogReader(object):
+        \"""
+        Iterates over the lines of log_path.1 and log_path written since the last execution.
+        All of them are read when there is no state, the log has been rotated more than once
+        or ini_date is older than the date of the last execution.
+        Call hold() on the first line dated after end_date, it will be read again next time.
+        A last line without newline is still being written, it is left for the next time.
+        \"""
+        def __init__(self, state, log_path, ini_date, end_date):
+            self.state = state
+            self.log_path = log_path
+            self.ini_date = ini_date
+            self.end_date = end_date
+            self.held = None
+        
+        def get_logs(self):
+            \""" [(path, inode, offset), ...] pending to be read \"""
+            logs = []
+            for path in (self.log_path+'.1', self.log_path):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                logs.append((path, stat.st_ino, stat.st_size))
+            try:
+                inode, offset, date = self.state.logs[self.log_path]
+            except (KeyError, ValueError):
+                pass
+            else:
+                if date <= self.ini_date:
+                    for ix, (path, log_inode, size) in enumerate(logs):
+                        if log_inode == inode and offset <= size:
+                            pending = [(path, inode, offset)]
+                            return pending + [(path, log_inode, 0) for path, log_inode, __ in logs[ix+1:]]
+            return [(path, log_inode, 0) for path, log_inode, __ in logs]
+        
+        def hold(self):
+            if self.held is None:
+                self.held = [self.inode, self.offset]
+        
+        def __iter__(self):
+            position = None
+            logs = self.get_logs()
+            for ix, (path, inode, offset) in enumerate(logs, 1):
+                try:
+                    # Binary mode, offsets are byte positions
+                    with open(path, 'rb') as handler:
+                        handler.seek(offset)
+                        self.inode = inode
+                        for line in handler:
+                            if ix == len(logs) and not line.endswith(b'\n'):
+                                break
+                            self.offset = offset
+                            offset += len(line)
+                            if not isinstance(line, str):
+                                line = line.decode('utf-8', 'replace')
+                            yield line
+                except IOError as e:
+                    sys.stderr.write(str(e)+'\\n')
+                    return
+                position = [inode, offset]
+            position = self.held or position
+            if position:
+                self.state.logs[self.log_path] = position + [self.end_date]
+    
+    log_state = LogState(%(state_path)r)
+    """)
 
 
 class ServiceMonitor(ServiceBackend):
@@ -49,12 +148,39 @@ class ServiceMonitor(ServiceBackend):
                 monitor=self.get_name(), object_id=object_id).latest()
         except MonitorData.DoesNotExist:
             return None
-        
+    
+    @cached_property
+    def last_dates(self):
+        """ {object_id: date of the last data}, for all the monitored objects in one query """
+        from .models import MonitorData
+        ids = [operation.instance.pk for operation in self.operations]
+        last_dates = dict.fromkeys(ids)
+        if ids:
+            dataset = MonitorData.objects.filter(content_type=self.content_type,
+                monitor=self.get_name(), object_id__in=ids)
+            last_dates.update(dataset.values_list('object_id').annotate(Max('created_at')))
+        return last_dates
+    
     def get_last_date(self, object_id):
-        data = self.get_last_data(object_id)
-        if data is None:
+        try:
+            last_date = self.last_dates[object_id]
+        except KeyError:
+            # Not part of this execution
+            data = self.get_last_data(object_id)
+            last_date = data.created_at if data else None
+        if last_date is None:
             return self.current_date - datetime.timedelta(days=1)
-        return data.created_at
+        return last_date
+    
+    def append_log_reader(self):
+        """
+        Embeds LogReader on the script, the state of each log is kept on the server
+        and has to be written by calling log_state.save() at the end of the script
+        """
+        state_path = os.path.join(settings.RESOURCES_MONITOR_STATE_DIR, self.get_name())
+        self.append(LOG_READER % {
+            'state_path': state_path,
+        })
     
     def process(self, line):
         """ line -> object_id, value, state"""
@@ -67,12 +193,10 @@ class ServiceMonitor(ServiceBackend):
         return result
     
     def store(self, log):
-        """ stores monitored values from stdout """
-        from django.contrib.contenttypes.models import ContentType
+        """ stores monitored values from stdout, with one query for all the objects """
         from .models import MonitorData
         name = self.get_name()
-        app_label, model_name = self.model.split('.')
-        ct = ContentType.objects.get_by_natural_key(app_label, model_name.lower())
+        results = []
         for line in log.stdout.splitlines():
             line = line.strip()
             object_id, value, state = self.process(line)
@@ -80,11 +204,21 @@ class ServiceMonitor(ServiceBackend):
                 value = value.decode('ascii')
             if isinstance(state, bytes):
                 state = state.decode('ascii')
-            content_object = ct.get_object_for_this_type(pk=object_id)
-            MonitorData.objects.create(
-                monitor=name, object_id=object_id, content_type=ct, value=value, state=state,
-                created_at=self.current_date, content_object_repr=str(content_object),
-            )
+            results.append((int(object_id), value, state))
+        model = self.content_type.model_class()
+        objects = model._base_manager.in_bulk([object_id for object_id, __, __ in results])
+        monitor_data = []
+        for object_id, value, state in results:
+            try:
+                content_object = objects[object_id]
+            except KeyError:
+                # Deleted during the execution
+                continue
+            monitor_data.append(MonitorData(
+                monitor=name, object_id=object_id, content_type=self.content_type, value=value,
+                state=state, created_at=self.current_date, content_object_repr=str(content_object),
+            ))
+        MonitorData.objects.bulk_create(monitor_data)
     
     def execute(self, *args, **kwargs):
         log = super(ServiceMonitor, self).execute(*args, **kwargs)
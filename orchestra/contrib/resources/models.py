@@ -2,12 +2,14 @@ from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelatio
 from django.contrib.contenttypes.models import ContentType
 from django.apps import apps
 from django.db import models
+from django.db.models import Case, When, Value
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 from djcelery.models import PeriodicTask
 
 from orchestra.core import validators
+from orchestra.core.signals import post_save_many
 from orchestra.models import queryset, fields
 from orchestra.models.utils import get_model_field_path
 
@@ -153,6 +155,44 @@ class Resource(models.Model):
     def get_verbose_name(self):
         return self.verbose_name or self.name
     
+    def compute_usages(self, ids=None):
+        """
+        {object_id: used} of all the objects with monitored data, or only of ids,
+        with one aggregation per monitor instead of one per object
+        """
+        aggregation = self.aggregation_instance
+        totals = {}
+        for monitor in self.monitors:
+            path = self.get_model_path(monitor)
+            monitor_model = ServiceMonitor.get_backend(monitor).model_class()
+            ct = ContentType.objects.get_for_model(monitor_model)
+            dataset = MonitorData.objects.filter(monitor=monitor, content_type=ct)
+            if path == []:
+                if ids:
+                    dataset = dataset.filter(object_id__in=ids)
+                usages = aggregation.compute_usages(dataset)
+            else:
+                fields = '__'.join(path)
+                objects = monitor_model.objects.all()
+                if ids:
+                    objects = objects.filter(**{'%s__in' % fields: ids})
+                    dataset = dataset.filter(object_id__in=objects.values('id'))
+                owners = dict(objects.values_list('id', fields))
+                usages = {}
+                for object_id, usage in aggregation.compute_usages(dataset).items():
+                    try:
+                        owner_id = owners[object_id]
+                    except KeyError:
+                        # Monitored object no longer exists
+                        continue
+                    usages[owner_id] = usages.get(owner_id, 0) + usage
+            for object_id, usage in usages.items():
+                totals[object_id] = totals.get(object_id, 0) + usage
+        scale = self.get_scale()
+        return {
+            object_id: float(total)/scale for object_id, total in totals.items()
+        }
+    
     def monitor(self, async=True):
         if async:
             return tasks.monitor.apply_async(self.pk)
@@ -160,6 +200,51 @@ class Resource(models.Model):
 
 
 class ResourceDataQuerySet(models.QuerySet):
+    def update_used(self, resource, objects, usages, batch_size=500):
+        """
+        Stores the usages, {object_id: used}, of the resource objects, creating the missing
+        resource data, with one query per batch_size objects instead of one per object
+        """
+        ct = resource.content_type
+        ids = [obj.pk for obj in objects]
+        existing = self.filter(resource=resource, content_type=ct, object_id__in=ids)
+        existing = {data.object_id: data for data in existing}
+        updated_at = timezone.now()
+        created = []
+        updated = []
+        dataset = []
+        for obj in objects:
+            try:
+                data = existing[obj.pk]
+            except KeyError:
+                data = self.model(content_type=ct, object_id=obj.pk, resource=resource,
+                    allocated=resource.default_allocation)
+                created.append(data)
+            else:
+                updated.append(data)
+            # Related objects are cached for the receivers of post_save_many
+            data.resource = resource
+            data.content_object = obj
+            data.used = usages.get(obj.pk) or 0
+            data.updated_at = updated_at
+            data.content_object_repr = str(obj)
+            dataset.append(data)
+        self.bulk_create(created, batch_size=batch_size)
+        for ix in range(0, len(updated), batch_size):
+            batch = updated[ix:ix+batch_size]
+            self.filter(pk__in=[data.pk for data in batch]).update(
+                used=Case(*(When(pk=data.pk, then=Value(data.used)) for data in batch),
+                    output_field=self.model._meta.get_field('used')),
+                content_object_repr=Case(
+                    *(When(pk=data.pk, then=Value(data.content_object_repr)) for data in batch),
+                    output_field=self.model._meta.get_field('content_object_repr')),
+                updated_at=updated_at,
+            )
+        # Per row saves used to notify related services (e.g. metric based orders)
+        post_save_many.send(sender=self.model, instances=dataset,
+            update_fields=('used', 'updated_at', 'content_object_repr'))
+        return dataset
+    
     def get_or_create(self, obj, resource):
         ct = ContentType.objects.get_for_model(type(obj))
         try:
@@ -4,3 +4,10 @@ from orchestra.contrib.settings import Setting
 RESOURCES_OLD_MONITOR_DATA_DAYS = Setting('RESOURCES_OLD_MONITOR_DATA_DAYS',
     40,
 )
+
+
+RESOURCES_MONITOR_STATE_DIR = Setting('RESOURCES_MONITOR_STATE_DIR',
+    '/var/lib/orchestra/monitors',
+    help_text="Directory where log parsing monitors keep, on each server, the position "
+              "of the last line read so the next execution only scans new lines."
+)
@@ -42,9 +42,10 @@ def monitor(resource_id, ids=None):
         # Update used resources and trigger resource exceeded and revovery
         triggers = []
         model = resource.content_type.model_class()
-        for obj in model.objects.filter(**kwargs):
-            data, __ = ResourceData.objects.get_or_create(obj, resource)
-            data.update()
+        objects = list(model.objects.filter(**kwargs))
+        usages = resource.compute_usages(ids=ids)
+        for data in ResourceData.objects.update_used(resource, objects, usages):
+            obj = data.content_object
             if not resource.disable_trigger:
                 a = data.used
                 b = data.allocated
@@ -0,0 +1,178 @@
+import datetime
+import decimal
+import os
+import shutil
+import tempfile
+
+from django.contrib.contenttypes.models import ContentType
+
+from orchestra.contrib.orchestration import Operation
+from orchestra.contrib.systemusers.backends import UNIXUserDisk
+from orchestra.contrib.systemusers.models import SystemUser
+from orchestra.utils.python import AttrDict
+from orchestra.utils.tests import BaseTestCase
+
+from ..backends import LOG_READER
+from ..models import MonitorData
+
+
+def store(monitor, log):
+    """ Former implementation, one query per monitored object """
+    ct = ContentType.objects.get_for_model(SystemUser)
+    for line in log.stdout.splitlines():
+        object_id, value, state = monitor.process(line.strip())
+        content_object = ct.get_object_for_this_type(pk=object_id)
+        MonitorData.objects.create(
+            monitor=monitor.get_name(), object_id=object_id, content_type=ct, value=value,
+            state=state, created_at=monitor.current_date, content_object_repr=str(content_object),
+        )
+
+
+class LogReaderTests(BaseTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp, 'access.log')
+        self.state_path = os.path.join(self.tmp, 'state', 'monitor')
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+    
+    def write(self, lines, path=None, mode='a'):
+        with open(path or self.log_path, mode, encoding='utf-8') as handler:
+            handler.write(''.join(line + '\n' for line in lines))
+    
+    def read(self, ini_date, end_date, hold=None):
+        """ executes LOG_READER as monitor scripts do, on a new process state """
+        context = {}
+        exec(LOG_READER % {'state_path': self.state_path}, context)
+        log_state = context['log_state']
+        reader = context['LogReader'](log_state, self.log_path, ini_date, end_date)
+        lines = []
+        for line in reader:
+            if hold and line.startswith(hold):
+                reader.hold()
+            lines.append(line.rstrip('\n'))
+        log_state.save()
+        return lines
+    
+    def test_full_scan(self):
+        self.write(['a', 'b'], path=self.log_path+'.1')
+        self.write(['c', 'd'])
+        self.assertEqual(['a', 'b', 'c', 'd'], self.read(1, 2))
+        # Older ini_date than the last execution
+        self.assertEqual(['a', 'b', 'c', 'd'], self.read(1, 3))
+        # Unknown state
+        os.remove(self.state_path)
+        self.assertEqual(['a', 'b', 'c', 'd'], self.read(3, 4))
+    
+    def test_new_lines(self):
+        self.write(['a', 'ñandú', 'b'])
+        self.assertEqual(['a', 'ñandú', 'b'], self.read(1, 2))
+        self.assertEqual([], self.read(2, 3))
+        self.write(['ç', 'c'])
+        self.assertEqual(['ç', 'c'], self.read(3, 4))
+        self.write(['d'])
+        self.assertEqual(['d'], self.read(4, 5))
+    
+    def test_partial_line(self):
+        self.write(['a'])
+        with open(self.log_path, 'a', encoding='utf-8') as handler:
+            handler.write('pár')
+        self.assertEqual(['a'], self.read(1, 2))
+        self.write(['tial'])
+        self.assertEqual(['pártial'], self.read(2, 3))
+        # Lines of the rotated log are not written anymore
+        with open(self.log_path, 'a', encoding='utf-8') as handler:
+            handler.write('b')
+        os.rename(self.log_path, self.log_path+'.1')
+        self.write(['c'])
+        self.assertEqual(['b', 'c'], self.read(3, 4))
+    
+    def test_rotation(self):
+        self.write(['a', 'b'])
+        self.assertEqual(['a', 'b'], self.read(1, 2))
+        self.write(['c'])
+        os.rename(self.log_path, self.log_path+'.1')
+        self.write(['d', 'e'])
+        self.assertEqual(['c', 'd', 'e'], self.read(2, 3))
+        self.write(['f'])
+        self.assertEqual(['f'], self.read(3, 4))
+        # Rotated twice since the last execution
+        os.rename(self.log_path, self.log_path+'.1')
+        self.write(['g'])
+        os.rename(self.log_path, self.log_path+'.1')
+        self.write(['h'])
+        self.assertEqual(['g', 'h'], self.read(4, 5))
+    
+    def test_hold(self):
+        self.write(['1 a', '1 b', '2 c', '2 d'])
+        self.assertEqual(['1 a', '1 b', '2 c', '2 d'], self.read(1, 2, hold='2'))
+        self.write(['3 e'])
+        self.assertEqual(['2 c', '2 d', '3 e'], self.read(2, 3, hold='3'))
+        self.assertEqual(['3 e'], self.read(3, 4))
+        # Held line on a rotated log
+        self.write(['4 f'])
+        os.rename(self.log_path, self.log_path+'.1')
+        self.write(['5 g'])
+        self.assertEqual(['4 f', '5 g'], self.read(4, 5, hold='5'))
+        self.assertEqual(['5 g'], self.read(5, 6))
+
+
+class ServiceMonitorTests(BaseTestCase):
+    DEPENDENCIES = (
+        'orchestra.contrib.systemusers',
+    )
+    
+    def setUp(self):
+        self.users = [self.create_account().main_systemuser for __ in range(3)]
+        self.monitor = UNIXUserDisk()
+        self.content_type = ContentType.objects.get_for_model(SystemUser)
+    
+    def get_data(self, monitor):
+        dataset = MonitorData.objects.filter(created_at=monitor.current_date)
+        return list(dataset.order_by('object_id').values_list(
+            'monitor', 'content_type', 'object_id', 'value', 'state', 'content_object_repr'))
+    
+    def create_data(self, user, days):
+        return MonitorData.objects.create(monitor=self.monitor.get_name(),
+            content_type=self.content_type, object_id=user.pk, value=0,
+            created_at=self.monitor.current_date-datetime.timedelta(days=days))
+    
+    def test_store(self):
+        log = AttrDict(stdout=''.join('%i %i\n' % (user.pk, 10*user.pk) for user in self.users))
+        former = UNIXUserDisk()
+        store(former, log)
+        # content_type is cached by ContentType's manager
+        self.monitor.content_type
+        with self.assertNumQueries(2):
+            self.monitor.store(log)
+        self.assertEqual(self.get_data(former), self.get_data(self.monitor))
+        data = self.get_data(self.monitor)
+        self.assertEqual([user.pk for user in self.users], [row[2] for row in data])
+        self.assertEqual(decimal.Decimal(10*self.users[0].pk), data[0][3])
+        self.assertEqual(str(self.users[0]), data[0][5])
+    
+    def test_store_deleted(self):
+        deleted = SystemUser.objects.order_by('-pk')[0].pk + 1
+        lines = ['%i 10' % self.users[0].pk, '%i 20' % deleted, '%i 30' % self.users[1].pk]
+        self.monitor.store(AttrDict(stdout='\n'.join(lines)))
+        data = self.get_data(self.monitor)
+        self.assertEqual([self.users[0].pk, self.users[1].pk], [row[2] for row in data])
+    
+    def test_last_dates(self):
+        first, second, other = self.users
+        self.monitor.operations = [
+            Operation(UNIXUserDisk, user, Operation.MONITOR) for user in (first, second)
+        ]
+        self.create_data(first, days=3)
+        last = self.create_data(first, days=2)
+        other_last = self.create_data(other, days=5)
+        with self.assertNumQueries(1):
+            self.assertEqual({first.pk: last.created_at, second.pk: None}, self.monitor.last_dates)
+        with self.assertNumQueries(0):
+            self.assertEqual(last.created_at, self.monitor.get_last_date(first.pk))
+            self.assertEqual(self.monitor.current_date-datetime.timedelta(days=1),
+                self.monitor.get_last_date(second.pk))
+        # Not part of the execution
+        with self.assertNumQueries(1):
+            self.assertEqual(other_last.created_at, self.monitor.get_last_date(other.pk))
@@ -0,0 +1,70 @@
+import datetime
+import decimal
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from orchestra.contrib.accounts.models import Account
+from orchestra.contrib.systemusers.backends import UNIXUserDisk
+from orchestra.contrib.systemusers.models import SystemUser
+from orchestra.utils.tests import BaseTestCase
+
+from ..models import MonitorData, Resource, ResourceData
+
+
+class ComputeUsagesTests(BaseTestCase):
+    DEPENDENCIES = (
+        'orchestra.contrib.systemusers',
+    )
+    
+    def setUp(self):
+        self.monitor = UNIXUserDisk.get_name()
+        self.accounts = [self.create_account(), self.create_account()]
+        # Second day of the current month, monthly aggregations must include it
+        ini = timezone.localtime(timezone.now()).replace(
+            day=2, hour=0, minute=0, second=0, microsecond=0)
+        content_type = ContentType.objects.get_for_model(SystemUser)
+        for ix, account in enumerate(self.accounts):
+            SystemUser.objects.create_user('%s_ftp' % account.username, account=account)
+            for jx, user in enumerate(account.systemusers.order_by('id')):
+                for hour in (1, 2, 3):
+                    MonitorData.objects.create(
+                        monitor=self.monitor,
+                        content_type=content_type,
+                        object_id=user.pk,
+                        created_at=ini + datetime.timedelta(hours=hour*(jx+1)),
+                        value=decimal.Decimal(10**6*(ix+1)*(jx+hour)),
+                    )
+    
+    def create_resource(self, model, aggregation):
+        return Resource.objects.create(
+            name='disk-%s' % aggregation,
+            verbose_name='Disk %s' % aggregation,
+            content_type=ContentType.objects.get_for_model(model),
+            aggregation=aggregation,
+            unit='MB',
+            scale='10**6',
+            monitors=[self.monitor],
+        )
+    
+    def assertUsages(self, model, objects, path):
+        for aggregation in ('last', 'monthly-sum', 'monthly-avg'):
+            resource = self.create_resource(model, aggregation)
+            self.assertEqual(path, resource.get_model_path(self.monitor))
+            usages = resource.compute_usages()
+            for obj in objects:
+                data = ResourceData(resource=resource, content_type=resource.content_type,
+                    object_id=obj.pk)
+                used = data.get_used()
+                self.assertIsNotNone(used)
+                self.assertEqual(used, usages[obj.pk])
+            ids = [objects[0].pk]
+            self.assertEqual({ids[0]: usages[ids[0]]}, resource.compute_usages(ids=ids))
+    
+    def test_direct_monitor(self):
+        users = list(SystemUser.objects.order_by('id'))
+        self.assertEqual(4, len(users))
+        self.assertUsages(SystemUser, users, [])
+    
+    def test_related_monitor(self):
+        self.assertUsages(Account, self.accounts, ['account'])
@@ -26,11 +26,12 @@ class ApacheTrafficByHost(ServiceMonitor):
     def prepare(self):
         access_log = self.log_path
         context = {
-            'access_logs': str((access_log, access_log+'.1')),
+            'access_log': repr(access_log),
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
             'ignore_hosts': str(settings.SAAS_TRAFFIC_IGNORE_HOSTS),
             'include_received_bytes': str(self.include_received_bytes),
         }
+        self.append_log_reader()
         self.append(textwrap.dedent("""\
             import sys
             from datetime import datetime
@@ -45,7 +46,7 @@ class ApacheTrafficByHost(ServiceMonitor):
             # Use local timezone
             end_date = to_local_timezone('{current_date}')
             end_date = int(end_date.strftime('%Y%m%d%H%M%S'))
-            access_logs = {access_logs}
+            access_log = {access_log}
             sites = {{}}
             months = {{
                 'Jan': '01',
@@ -68,33 +69,32 @@ class ApacheTrafficByHost(ServiceMonitor):
                 ini_date = int(ini_date.strftime('%Y%m%d%H%M%S'))
                 sites[site_domain] = [ini_date, object_id, 0]
             
-            def monitor(sites, end_date, months, access_logs):
+            def monitor(sites, end_date, months, access_log):
                 include_received = {include_received_bytes}
-                for access_log in access_logs:
+                ini_date = min(opts[0] for opts in sites.values())
+                reader = LogReader(log_state, access_log, ini_date, end_date)
+                for line in reader:
+                    line = line.split()
+                    host, __, __, date = line[:4]
+                    if host in {ignore_hosts}:
+                        continue
+                    size, hostname = line[-2:]
+                    size = int(size)
+                    if include_received:
+                        size += int(line[-3])
                     try:
-                        with open(access_log, 'r') as handler:
-                            for line in handler.readlines():
-                                line = line.split()
-                                host, __, __, date = line[:4]
-                                if host in {ignore_hosts}:
-                                    continue
-                                size, hostname = line[-2:]
-                                size = int(size)
-                                if include_received:
-                                    size += int(line[-3])
-                                try:
-                                    site = sites[hostname]
-                                except KeyError:
-                                    continue
-                                else:
-                                    # [16/Sep/2015:11:40:38
-                                    day, month, date = date[1:].split('/')
-                                    year, hour, min, sec = date.split(':')
-                                    date = year + months[month] + day + hour + min + sec
-                                    if site[0] < int(date) < end_date:
-                                        site[2] += size
-                    except IOError as e:
-                        sys.stderr.write(str(e)+'\\n')
+                        site = sites[hostname]
+                    except KeyError:
+                        continue
+                    else:
+                        # [16/Sep/2015:11:40:38
+                        day, month, date = date[1:].split('/')
+                        year, hour, minute, sec = date.split(':')
+                        date = int(year + months[month] + day + hour + minute + sec)
+                        if site[0] < date < end_date:
+                            site[2] += size
+                        elif date >= end_date:
+                            reader.hold()
                 for opts in sites.values():
                     ini_date, object_id, size = opts
                     sys.stdout.write('%s %s\\n' % (object_id, size))
@@ -106,7 +106,8 @@ class ApacheTrafficByHost(ServiceMonitor):
         self.append("prepare(%(object_id)s, '%(site_domain)s', '%(last_date)s')" % context)
     
     def commit(self):
-        self.append('monitor(sites, end_date, months, access_logs)')
+        self.append('monitor(sites, end_date, months, access_log)')
+        self.append('log_state.save()')
     
     def get_context(self, saas):
         return {
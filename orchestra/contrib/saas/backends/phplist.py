@@ -143,8 +143,9 @@ class PhpListTraffic(ServiceMonitor):
         mail_log = settings.SAAS_PHPLIST_MAIL_LOG_PATH
         context = {
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'mail_logs': str((mail_log, mail_log+'.1')),
+            'mail_log': repr(mail_log),
         }
+        self.append_log_reader()
         self.append(textwrap.dedent("""\
             import sys
             from datetime import datetime
@@ -156,7 +157,7 @@ class PhpListTraffic(ServiceMonitor):
                 ini_date = int(ini_date.strftime('%Y%m%d%H%M%S'))
                 lists[list_domain] = [ini_date, object_id, 0]
             
-            def inside_period(month, day, time, ini_date):
+            def inside_period(month, day, time, ini_date, reader):
                 global months
                 global end_datetime
                 # Mar  9 17:13:22
@@ -167,8 +168,10 @@ class PhpListTraffic(ServiceMonitor):
                 if len(day) == 1:
                     day = '0' + day
                 date = str(year) + month + day
-                date += time.replace(':', '')
-                return ini_date < int(date) < end_date
+                date = int(date + time.replace(':', ''))
+                if date >= end_date:
+                    reader.hold()
+                return ini_date < date < end_date
             
             def to_local_timezone(date, tzlocal=tz.tzlocal()):
                 # Converts orchestra's UTC dates to local timezone
@@ -177,7 +180,7 @@ class PhpListTraffic(ServiceMonitor):
                 date = date.astimezone(tzlocal)
                 return date
             
-            maillogs = {mail_logs}
+            maillog = {mail_log}
             end_datetime = to_local_timezone('{current_date}')
             end_date = int(end_datetime.strftime('%Y%m%d%H%M%S'))
             months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
@@ -186,45 +189,43 @@ class PhpListTraffic(ServiceMonitor):
             lists = {{}}
             id_to_domain = {{}}
             
-            def monitor(lists, id_to_domain, maillogs):
-                for maillog in maillogs:
-                    try:
-                        with open(maillog, 'r') as maillog:
-                            for line in maillog.readlines():
-                                if ': message-id=<' in line:
-                                    # Sep 15 09:36:51 web postfix/cleanup[8138]: C20FF244283: message-id=<fe94cc3afd20a9dc634cc9d9ed03fee0@u-romani.lists.pangea.org>
-                                    month, day, time, __, __, id, message_id = line.split()[:7]
-                                    list_domain = message_id.split('@')[1][:-1]
-                                    try:
-                                        opts = lists[list_domain]
-                                    except KeyError:
-                                        pass
-                                    else:
-                                        ini_date = opts[0]
-                                        if inside_period(month, day, time, ini_date):
-                                            id = id[:-1]
-                                            id_to_domain[id] = list_domain
-                                elif '>, size=' in line:
-                                    # Sep 15 09:36:51 web postfix/qmgr[2296]: C20FF244283: from=<u-romani@pangea.org>, size=12252, nrcpt=1 (queue active)
-                                    month, day, time, __, __, id, __, size = line.split()[:8]
-                                    id = id[:-1]
-                                    try:
-                                        list_domain = id_to_domain[id]
-                                    except KeyError:
-                                        pass
-                                    else:
-                                        opts = lists[list_domain]
-                                        size = int(size[5:-1])
-                                        opts[2] += size
-                    except IOError as e:
-                        sys.stderr.write(str(e)+'\\n')
+            def monitor(lists, id_to_domain, maillog):
+                ini_date = min(opts[0] for opts in lists.values())
+                reader = LogReader(log_state, maillog, ini_date, end_date)
+                for line in reader:
+                    if ': message-id=<' in line:
+                        # Sep 15 09:36:51 web postfix/cleanup[8138]: C20FF244283: message-id=<fe94cc3afd20a9dc634cc9d9ed03fee0@u-romani.lists.pangea.org>
+                        month, day, time, __, __, id, message_id = line.split()[:7]
+                        list_domain = message_id.split('@')[1][:-1]
+                        try:
+                            opts = lists[list_domain]
+                        except KeyError:
+                            pass
+                        else:
+                            ini_date = opts[0]
+                            if inside_period(month, day, time, ini_date, reader):
+                                id = id[:-1]
+                                id_to_domain[id] = list_domain
+                    elif '>, size=' in line:
+                        # Sep 15 09:36:51 web postfix/qmgr[2296]: C20FF244283: from=<u-romani@pangea.org>, size=12252, nrcpt=1 (queue active)
+                        month, day, time, __, __, id, __, size = line.split()[:8]
+                        id = id[:-1]
+                        try:
+                            list_domain = id_to_domain[id]
+                        except KeyError:
+                            pass
+                        else:
+                            opts = lists[list_domain]
+                            size = int(size[5:-1])
+                            opts[2] += size
                 for opts in lists.values():
                     print opts[1], opts[2]
             """).format(**context)
         )
 
     def commit(self):
-        self.append('monitor(lists, id_to_domain, maillogs)')
+        self.append('monitor(lists, id_to_domain, maillog)')
+        self.append('log_state.save()')
     
     def monitor(self, saas):
         context = self.get_context(saas)
@@ -2,7 +2,7 @@ import calendar
 import datetime
 import decimal
 import math
-from functools import cmp_to_key
+from functools import cmp_to_key, lru_cache
 
 from dateutil import relativedelta
 from django.contrib.contenttypes.models import ContentType
@@ -17,6 +17,27 @@ from orchestra.utils.python import AttrDict, format_exception
 from . import settings, helpers
 
 
+def logsteps(n, size=1):
+    step = size*10**int(math.log10(max(n, 1)))
+    return round(n/(decimal.Decimal(step)))*step
+
+
+# Shared by all the expression contexts, never modified
+EXPRESSION_GLOBALS = {
+    'ugettext': ugettext,
+    'math': math,
+    'logsteps': logsteps,
+    'log10': math.log10,
+    'Decimal': decimal.Decimal,
+}
+
+
+@lru_cache(maxsize=512)
+def compile_expression(expression):
+    """ expressions are compiled once, a changed expression is a different cache key """
+    return compile(expression, '<expression>', 'eval')
+
+
 class ServiceHandler(plugins.Plugin, metaclass=plugins.PluginMount):
     """
     Separates all the logic of billing handling from the model allowing to better
@@ -72,26 +93,41 @@ class ServiceHandler(plugins.Plugin, metaclass=plugins.PluginMount):
         return ContentType.objects.get_by_natural_key(app_label, model.lower())
     
     def get_expression_context(self, instance):
-        return {
+        context = dict(EXPRESSION_GLOBALS)
+        context.update({
             'instance': instance,
             'obj': instance,
-            'ugettext': ugettext,
             'handler': self,
             'service': self.service,
             instance._meta.model_name: instance,
-            'math': math,
-            'logsteps': lambda n, size=1: \
-                round(n/(decimal.Decimal(size*10**int(math.log10(max(n, 1))))))*size*10**int(math.log10(max(n, 1))),
-            'log10': math.log10,
-            'Decimal': decimal.Decimal,
-        }
+        })
+        return context
     
     def matches(self, instance):
         if not self.match:
             # Blank expressions always evaluate True
             return True
         safe_locals = self.get_expression_context(instance)
-        return eval(self.match, safe_locals)
+        return eval(compile_expression(self.match), safe_locals)
+    
+    def matches_many(self, instances):
+        """
+        Yields (instance, matches) pairs evaluating match over instances in one pass,
+        the compiled expression and its context are reused between instances
+        """
+        if not self.match:
+            for instance in instances:
+                yield instance, True
+            return
+        code = compile_expression(self.match)
+        safe_locals = None
+        for instance in instances:
+            if safe_locals is None:
+                safe_locals = self.get_expression_context(instance)
+                model_name = instance._meta.model_name
+            else:
+                safe_locals['instance'] = safe_locals['obj'] = safe_locals[model_name] = instance
+            yield instance, eval(code, safe_locals)
     
     def get_ignore_delta(self):
         if self.ignore_period == self.NEVER:
@@ -125,7 +161,7 @@ class ServiceHandler(plugins.Plugin, metaclass=plugins.PluginMount):
         if self.metric:
             safe_locals = self.get_expression_context(instance)
             try:
-                return eval(self.metric, safe_locals)
+                return eval(compile_expression(self.metric), safe_locals)
             except Exception as exc:
                 raise type(exc)("'%s' evaluating metric for '%s' service" % (exc, self.service))
     
@@ -135,7 +171,7 @@ class ServiceHandler(plugins.Plugin, metaclass=plugins.PluginMount):
         with translation.override(account.language):
             if not self.order_description:
                 return '%s: %s' % (ugettext(self.description), instance)
-            return eval(self.order_description, safe_locals)
+            return eval(compile_expression(self.order_description), safe_locals)
     
     def get_billing_point(self, order, bp=None, **options):
         cachable = bool(self.billing_point == self.FIXED_DATE and not options.get('fixed_point'))
@@ -309,6 +345,7 @@ class ServiceHandler(plugins.Plugin, metaclass=plugins.PluginMount):
                     comp.order.new_billed_until = min(comp.order.billed_until, comp.ini,
                             getattr(comp.order, 'new_billed_until', datetime.date.max))
         if options.get('commit', True):
+            # Saved right away, pricing_orders() reads them back from the database
             for order in givers:
                 if hasattr(order, 'new_billed_until'):
                     order.billed_until = order.new_billed_until
@@ -642,11 +679,16 @@ class ServiceHandler(plugins.Plugin, metaclass=plugins.PluginMount):
         else:
             lines = self.bill_with_metric(orders, account, **options)
         if options.get('commit', True):
+            # Bulk billing collects the orders and updates them all at once
+            deferred_saves = options.get('deferred_saves')
             now = timezone.now().date()
             for line in lines:
                 order = line.order
                 order.billed_on = now
                 order.billed_metric = getattr(order, 'new_billed_metric', order.billed_metric)
                 order.billed_until = getattr(order, 'new_billed_until', order.billed_until)
-                order.save(update_fields=('billed_on', 'billed_until', 'billed_metric'))
+                if deferred_saves is not None:
+                    deferred_saves.append(order)
+                else:
+                    order.save(update_fields=('billed_on', 'billed_until', 'billed_metric'))
         return lines
@@ -1,23 +1,72 @@
-def get_chunks(porders, ini, end, ix=0):
-    if ix >= len(porders):
-        return [[ini, end, []]]
-    order = porders[ix]
-    ix += 1
-    bu = getattr(order, 'new_billed_until', order.billed_until)
-    if not bu or bu <= ini or order.registered_on >= end:
-        return get_chunks(porders, ini, end, ix=ix)
+import bisect
+
+
+def get_chunks(porders, ini, end):
+    """
+    Splits ini-end into chunks with the same concurrent orders: [[ini, end, orders], ...]
+    Sweeps over the sorted registration and billing dates and returns the chunks
+    in the same order as the former recursive implementation
+    """
+    spans = []
+    for ix, order in enumerate(porders):
+        bu = getattr(order, 'new_billed_until', order.billed_until)
+        if not bu or bu <= ini or order.registered_on >= end:
+            continue
+        if bu <= order.registered_on:
+            # Empty or negative periods produce overlapping chunks
+            return split_chunks(porders, ini, end)
+        spans.append((order.registered_on, bu, ix, order))
+    points = set()
+    for ro, bu, __, __ in spans:
+        if ini < ro < end:
+            points.add(ro)
+        if ini < bu < end:
+            points.add(bu)
+    points = [ini] + sorted(points) + [end]
+    pending = sorted(spans, key=lambda span: span[0])
+    next_span = 0
+    active = {}
+    chunks = []
+    for cini, cend in zip(points, points[1:]):
+        while next_span < len(pending) and pending[next_span][0] <= cini:
+            ro, bu, ix, order = pending[next_span]
+            active[ix] = (bu, order)
+            next_span += 1
+        for ix, (bu, order) in list(active.items()):
+            if bu <= cini:
+                active.pop(ix)
+        orders = [active[ix][1] for ix in sorted(active)]
+        # Before the order, after the order or during the order
+        key = tuple(0 if cend <= ro else 1 if cini >= bu else 2 for ro, bu, __, __ in spans)
+        chunks.append((key, [cini, cend, orders]))
+    return [chunk for key, chunk in sorted(chunks, key=lambda chunk: chunk[0])]
+
+
+def split_chunks(porders, ini, end):
+    """ get_chunks() for orders with billed_until <= registered_on, using an explicit stack """
     result = []
-    if order.registered_on < end and order.registered_on > ini:
-        ro = order.registered_on
-        result = get_chunks(porders, ini, ro, ix=ix)
-        ini = ro
-    if bu < end:
-        result += get_chunks(porders, bu, end, ix=ix)
-        end = bu
-    chunks = get_chunks(porders, ini, end, ix=ix)
-    for chunk in chunks:
-        chunk[2].insert(0, order)
-        result.append(chunk)
+    stack = [(ini, end, 0, [])]
+    while stack:
+        ini, end, ix, orders = stack.pop()
+        while ix < len(porders):
+            order = porders[ix]
+            bu = getattr(order, 'new_billed_until', order.billed_until)
+            if bu and bu > ini and order.registered_on < end:
+                break
+            ix += 1
+        if ix >= len(porders):
+            result.append([ini, end, orders])
+            continue
+        parts = []
+        if order.registered_on < end and order.registered_on > ini:
+            ro = order.registered_on
+            parts.append((ini, ro, ix+1, orders))
+            ini = ro
+        if bu < end:
+            parts.append((bu, end, ix+1, orders))
+            end = bu
+        parts.append((ini, end, ix+1, orders + [order]))
+        stack.extend(reversed(parts))
     return result
 
 
@@ -107,12 +156,28 @@ def apply_compensation(order, compensation):
     return applied_compensation, remaining_order, remaining_compensation
 
 
-def update_intersections(not_compensated, compensations):
-    # TODO can be optimized
-    compensation_intervals = []
-    for __, compensation in compensations:
-        compensation_intervals.append(compensation)
-    return get_intersections(not_compensated, compensation_intervals)
+def update_intersections(ordered_intersections, compensation, remaining_interval):
+    """
+    Only the intersections of compensations overlapping the applied one can shrink,
+    they are moved to their new position as if the whole list was sorted again
+    """
+    unchanged = []
+    changed = []
+    for length, interval in ordered_intersections:
+        if length and interval.ini < compensation.end and interval.end > compensation.ini:
+            new_length = 0
+            for intersection in interval.intersect_set(remaining_interval):
+                new_length += len(intersection)
+            if new_length != length:
+                changed.append((new_length, interval))
+                continue
+        unchanged.append((length, interval))
+    lengths = [length for length, __ in unchanged]
+    for length, interval in sorted(changed, key=lambda i: i[0]):
+        ix = bisect.bisect_right(lengths, length)
+        lengths.insert(ix, length)
+        unchanged.insert(ix, (length, interval))
+    return unchanged
 
 
 def compensate(order, compensations):
@@ -126,7 +191,8 @@ def compensate(order, compensations):
         (applied_compensation, remaining_interval, remaining_compensation) = apply_compensation(remaining_interval, compensation)
         remaining_compensations += remaining_compensation
         applied_compensations += applied_compensation
-        ordered_intersections = update_intersections(remaining_interval, ordered_intersections)
+        ordered_intersections = update_intersections(
+            ordered_intersections, compensation, remaining_interval)
     for __, compensation in ordered_intersections:
         remaining_compensations.append(compensation)
     return remaining_compensations, applied_compensations
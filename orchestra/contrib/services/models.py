@@ -259,6 +259,7 @@ class Service(models.Model):
         queryset = related_model.objects.all()
         if related_model._meta.model_name != 'account':
             queryset = queryset.select_related('account').all()
-        for instance in queryset:
-            updates += manager.update_by_instance(instance, service=self, commit=commit)
+        for instance, matches in self.handler.matches_many(queryset):
+            updates += manager.update_by_instance(instance, service=self, commit=commit,
+                matches=matches)
         return updates
@@ -5,6 +5,7 @@ from dateutil.relativedelta import relativedelta
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 
+from orchestra.contrib.plans.models import Plan
 from orchestra.contrib.systemusers.models import SystemUser
 from orchestra.utils.tests import random_ascii, BaseTestCase
 
@@ -100,3 +101,46 @@ class FTPBillingTest(BaseTestCase):
         order = account.orders.order_by('-id').first()
         self.assertEqual(first_bp, order.billed_until)
         self.assertEqual(decimal.Decimal(0), bills[0].get_total())
+    
+    def test_ftp_account_with_compensation_and_rates(self):
+        service = self.create_ftp_service()
+        plan = Plan.objects.create(name='SUPER', allow_multiple=False, is_combinable=True)
+        service.rates.create(plan=plan, quantity=1, price=10)
+        service.rates.create(plan=plan, quantity=2, price=5)
+        service.rates.create(plan=plan, quantity=3, price=1)
+        first_bp = timezone.now().date() + relativedelta(years=2)
+        bp = timezone.now().date() + relativedelta(years=1)
+        cent = decimal.Decimal('0.01')
+        results = []
+        for bulk in (True, False):
+            account = self.create_account()
+            account.plans.create(plan=plan)
+            self.create_ftp(account=account)
+            user = self.create_ftp(account=account)
+            account.orders.bill(billing_point=first_bp, fixed_point=True)
+            user.delete()
+            self.create_ftp(account=account)
+            if bulk:
+                bills = account.orders.bill(billing_point=bp, fixed_point=True, new_open=True)
+                lines = [
+                    (line.start_on, line.end_on, line.subtotal.quantize(cent),
+                     [subline.total.quantize(cent) for subline in line.sublines.order_by('id')])
+                    for line in bills[0].lines.order_by('id')
+                ]
+            else:
+                # Former behaviour, every order is saved as soon as it has been billed
+                orders = list(account.orders.select_related('service'))
+                lines = [
+                    (line.ini, line.end, line.subtotal.quantize(cent),
+                     [discount.total.quantize(cent) for discount in line.discounts])
+                    for line in service.handler.generate_bill_lines(orders, account,
+                        billing_point=bp, fixed_point=True)
+                ]
+            billed = account.orders.order_by('id').values_list('billed_until', 'cancelled_on')
+            results.append((lines, list(billed)))
+        self.assertEqual(results[1], results[0])
+        lines, billed = results[0]
+        self.assertEqual(1, len(lines))
+        # The cancelled order has given its compensation and does not count for pricing
+        __, (billed_until, cancelled_on), __ = billed
+        self.assertEqual(cancelled_on, billed_until)
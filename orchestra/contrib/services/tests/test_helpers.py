@@ -0,0 +1,122 @@
+import datetime
+import random
+
+from orchestra.utils.tests import BaseTestCase
+
+from .. import helpers
+from .test_handler import Order
+
+
+def recursive_get_chunks(porders, ini, end, ix=0):
+    """ Former implementation of helpers.get_chunks() """
+    if ix >= len(porders):
+        return [[ini, end, []]]
+    order = porders[ix]
+    ix += 1
+    bu = getattr(order, 'new_billed_until', order.billed_until)
+    if not bu or bu <= ini or order.registered_on >= end:
+        return recursive_get_chunks(porders, ini, end, ix=ix)
+    result = []
+    if order.registered_on < end and order.registered_on > ini:
+        ro = order.registered_on
+        result = recursive_get_chunks(porders, ini, ro, ix=ix)
+        ini = ro
+    if bu < end:
+        result += recursive_get_chunks(porders, bu, end, ix=ix)
+        end = bu
+    chunks = recursive_get_chunks(porders, ini, end, ix=ix)
+    for chunk in chunks:
+        chunk[2].insert(0, order)
+        result.append(chunk)
+    return result
+
+
+def sorting_compensate(order, compensations):
+    """ Former implementation of helpers.compensate(), sorts all the intersections on each step """
+    remaining_interval = [order]
+    ordered_intersections = helpers.get_intersections(remaining_interval, compensations)
+    applied_compensations = []
+    remaining_compensations = []
+    while ordered_intersections and ordered_intersections[-1][0] > 0:
+        __, compensation = ordered_intersections.pop()
+        applied, remaining_interval, remaining = helpers.apply_compensation(
+            remaining_interval, compensation)
+        remaining_compensations += remaining
+        applied_compensations += applied
+        ordered_intersections = helpers.get_intersections(
+            remaining_interval, [comp for __, comp in ordered_intersections])
+    for __, compensation in ordered_intersections:
+        remaining_compensations.append(compensation)
+    return remaining_compensations, applied_compensations
+
+
+class HelperTests(BaseTestCase):
+    def setUp(self):
+        self.random = random.Random(2016)
+        self.today = datetime.date.today()
+    
+    def get_date(self, days):
+        return self.today + datetime.timedelta(days=days)
+    
+    def get_random_orders(self, count):
+        orders = []
+        for __ in range(count):
+            registered_on = self.random.randint(-20, 60)
+            billed_until = self.random.choice((
+                None,
+                registered_on + self.random.randint(1, 50),
+                # Empty and negative periods are also supported
+                registered_on + self.random.randint(-5, 40),
+            ))
+            order = Order(
+                registered_on=self.get_date(registered_on),
+                billed_until=self.get_date(billed_until) if billed_until is not None else None,
+            )
+            if self.random.random() < 0.3:
+                order.new_billed_until = self.get_date(registered_on + self.random.randint(-3, 60))
+            orders.append(order)
+        return orders
+    
+    def get_random_intervals(self, count, order=False):
+        intervals = []
+        for ix in range(count):
+            ini = self.random.randint(0, 60)
+            end = ini + self.random.randint(-2, 30)
+            intervals.append(helpers.Interval(self.get_date(ini), self.get_date(end), ix if order else None))
+        return intervals
+    
+    def serialize(self, intervals):
+        return [(interval.ini, interval.end, interval.order) for interval in intervals]
+    
+    def test_get_chunks_equivalence(self):
+        for __ in range(1000):
+            porders = self.get_random_orders(self.random.randint(0, 12))
+            ini = self.random.randint(-10, 30)
+            end = ini + self.random.randint(-3, 50)
+            ini, end = self.get_date(ini), self.get_date(end)
+            expected = recursive_get_chunks(porders, ini, end)
+            self.assertEqual(expected, helpers.get_chunks(porders, ini, end))
+            self.assertEqual(expected, helpers.split_chunks(porders, ini, end))
+    
+    def test_get_chunks_many_orders(self):
+        porders = []
+        for __ in range(2000):
+            order = Order(registered_on=self.get_date(self.random.randint(0, 300)))
+            order.new_billed_until = order.registered_on + datetime.timedelta(days=90)
+            porders.append(order)
+        chunks = helpers.get_chunks(porders, self.today, self.get_date(365))
+        self.assertEqual(self.today, chunks[0][0])
+        for ini, end, orders in chunks:
+            for order in orders:
+                self.assertTrue(order.registered_on <= ini and order.new_billed_until >= end)
+    
+    def test_compensate_equivalence(self):
+        for __ in range(500):
+            compensations = self.get_random_intervals(self.random.randint(0, 15), order=True)
+            expected_compensations = list(compensations)
+            for receiver in self.get_random_intervals(self.random.randint(1, 6)):
+                expected_compensations, expected_used = sorting_compensate(
+                    receiver, expected_compensations)
+                compensations, used = helpers.compensate(receiver, compensations)
+                self.assertEqual(self.serialize(expected_used), self.serialize(used))
+                self.assertEqual(self.serialize(expected_compensations), self.serialize(compensations))
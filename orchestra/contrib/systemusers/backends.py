@@ -295,8 +295,9 @@ class Exim4Traffic(ServiceMonitor):
         mainlog = settings.SYSTEMUSERS_MAIL_LOG_PATH
         context = {
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'mainlogs': str((mainlog, mainlog+'.1')),
+            'mainlog': repr(mainlog),
         }
+        self.append_log_reader()
         self.append(textwrap.dedent("""\
             import re
             import sys
@@ -309,7 +310,7 @@ class Exim4Traffic(ServiceMonitor):
                 date = date.astimezone(tzlocal)
                 return date
             
-            mainlogs = {mainlogs}
+            mainlog = {mainlog}
             # Use local timezone
             end_date = to_local_timezone('{current_date}')
             end_date = int(end_date.strftime('%Y%m%d%H%M%S'))
@@ -321,26 +322,25 @@ class Exim4Traffic(ServiceMonitor):
                 ini_date = int(ini_date.strftime('%Y%m%d%H%M%S'))
                 users[username] = [ini_date, object_id, 0]
             
-            def monitor(users, end_date, mainlogs):
+            def monitor(users, end_date, mainlog):
                 user_regex = re.compile(r' U=([^ ]+) ')
-                for mainlog in mainlogs:
-                    try:
-                        with open(mainlog, 'r') as mainlog:
-                            for line in mainlog.readlines():
-                                if ' <= ' in line and 'P=local' in line:
-                                    username = user_regex.search(line).groups()[0]
-                                    try:
-                                        sender = users[username]
-                                    except KeyError:
-                                        continue
-                                    else:
-                                        date, time, id, __, __, user, protocol, size = line.split()[:8]
-                                        date = date.replace('-', '')
-                                        date += time.replace(':', '')
-                                        if sender[0] < int(date) < end_date:
-                                            sender[2] += int(size[2:])
-                    except IOError as e:
-                        sys.stderr.write(str(e))
+                ini_date = min(sender[0] for sender in users.values())
+                reader = LogReader(log_state, mainlog, ini_date, end_date)
+                for line in reader:
+                    if ' <= ' in line and 'P=local' in line:
+                        username = user_regex.search(line).groups()[0]
+                        try:
+                            sender = users[username]
+                        except KeyError:
+                            continue
+                        else:
+                            date, time, id, __, __, user, protocol, size = line.split()[:8]
+                            date = date.replace('-', '')
+                            date = int(date + time.replace(':', ''))
+                            if sender[0] < date < end_date:
+                                sender[2] += int(size[2:])
+                            elif date >= end_date:
+                                reader.hold()
                 
                 for username, opts in users.iteritems():
                     __, object_id, size = opts
@@ -349,7 +349,8 @@ class Exim4Traffic(ServiceMonitor):
         )
     
     def commit(self):
-        self.append('monitor(users, end_date, mainlogs)')
+        self.append('monitor(users, end_date, mainlog)')
+        self.append('log_state.save()')
     
     def monitor(self, user):
         context = self.get_context(user)
@@ -381,8 +382,9 @@ class VsFTPdTraffic(ServiceMonitor):
         vsftplog = settings.SYSTEMUSERS_FTP_LOG_PATH
         context = {
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'vsftplogs': str((vsftplog, vsftplog+'.1')),
+            'vsftplog': repr(vsftplog),
         }
+        self.append_log_reader()
         self.append(textwrap.dedent("""\
             import re
             import sys
@@ -395,7 +397,7 @@ class VsFTPdTraffic(ServiceMonitor):
                 date = date.astimezone(tzlocal)
                 return date
             
-            vsftplogs = {vsftplogs}
+            vsftplog = {vsftplog}
             # Use local timezone
             end_date = to_local_timezone('{current_date}')
             end_date = int(end_date.strftime('%Y%m%d%H%M%S'))
@@ -409,27 +411,26 @@ class VsFTPdTraffic(ServiceMonitor):
                 ini_date = int(ini_date.strftime('%Y%m%d%H%M%S'))
                 users[username] = [ini_date, object_id, 0]
             
-            def monitor(users, end_date, months, vsftplogs):
+            def monitor(users, end_date, months, vsftplog):
                 user_regex = re.compile(r'\] \[([^ ]+)\] (OK|FAIL) ')
                 bytes_regex = re.compile(r', ([0-9]+) bytes, ')
-                for vsftplog in vsftplogs:
-                    try:
-                        with open(vsftplog, 'r') as vsftplog:
-                            for line in vsftplog.readlines():
-                                if ' bytes, ' in line:
-                                    username = user_regex.search(line).groups()[0]
-                                    try:
-                                        user = users[username]
-                                    except KeyError:
-                                        continue
-                                    else:
-                                        __, month, day, time, year = line.split()[:5]
-                                        date = year + months[month] + day + time.replace(':', '')
-                                        if user[0] < int(date) < end_date:
-                                            bytes = bytes_regex.search(line).groups()[0]
-                                            user[2] += int(bytes)
-                    except IOError as e:
-                        sys.stderr.write(str(e))
+                ini_date = min(user[0] for user in users.values())
+                reader = LogReader(log_state, vsftplog, ini_date, end_date)
+                for line in reader:
+                    if ' bytes, ' in line:
+                        username = user_regex.search(line).groups()[0]
+                        try:
+                            user = users[username]
+                        except KeyError:
+                            continue
+                        else:
+                            __, month, day, time, year = line.split()[:5]
+                            date = int(year + months[month] + day + time.replace(':', ''))
+                            if user[0] < date < end_date:
+                                bytes = bytes_regex.search(line).groups()[0]
+                                user[2] += int(bytes)
+                            elif date >= end_date:
+                                reader.hold()
                 
                 for username, opts in users.items():
                     __, object_id, size = opts
@@ -442,7 +443,8 @@ class VsFTPdTraffic(ServiceMonitor):
         self.append("prepare(%(object_id)s, '%(username)s', '%(last_date)s')" % context)
     
     def commit(self):
-        self.append('monitor(users, end_date, months, vsftplogs)')
+        self.append('monitor(users, end_date, months, vsftplog)')
+        self.append('log_state.save()')
     
     def get_context(self, user):
         context = {
@@ -14,3 +14,4 @@ class TasksConfig(AppConfig):
         administration.register(PeriodicTask, parent=TaskState, icon='Appointment.png')
         administration.register(WorkerState, parent=TaskState, dashboard=False)
         autodiscover_modules('tasks')
+        from . import signals
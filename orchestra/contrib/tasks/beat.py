@@ -1,26 +1,42 @@
+import datetime
+import heapq
 import json
+import threading
+from functools import lru_cache
 
 from celery import current_app
 from celery.schedules import crontab_parser as CrontabParser
+from django.db.models import F
 from django.utils import timezone
-from djcelery.models import PeriodicTask
+from djcelery.models import PeriodicTask, PeriodicTasks
 
-from .decorators import apply_async
+from .decorators import apply_async, keep_state
+
+
+@lru_cache(maxsize=1024)
+def compile_crontab(minute, hour, day_of_week, day_of_month, month_of_year):
+    """ expands each crontab field only once, periodic tasks share most of the expressions """
+    return (
+        frozenset(CrontabParser(60).parse(minute)),
+        frozenset(CrontabParser(24).parse(hour)),
+        frozenset(CrontabParser(7).parse(day_of_week)),
+        frozenset(CrontabParser(31, 1).parse(day_of_month)),
+        frozenset(CrontabParser(12, 1).parse(month_of_year)),
+    )
+
+
+def compile_task(task):
+    crontab = task.crontab
+    return compile_crontab(crontab.minute, crontab.hour, crontab.day_of_week,
+        crontab.day_of_month, crontab.month_of_year)
 
 
 def is_due(task, time=None):
     if time is None:
         time = timezone.now()
-    crontab = task.crontab
+    schedule = compile_task(task)
     parts = map(int, time.strftime("%M %H %w %d %m").split())
-    n_minute, n_hour, n_day_of_week, n_day_of_month, n_month_of_year = parts
-    return bool(
-        n_minute in CrontabParser(60).parse(crontab.minute) and
-        n_hour in CrontabParser(24).parse(crontab.hour) and
-        n_day_of_week in CrontabParser(7).parse(crontab.day_of_week) and
-        n_day_of_month in CrontabParser(31, 1).parse(crontab.day_of_month) and
-        n_month_of_year in CrontabParser(12, 1).parse(crontab.month_of_year)
-    )
+    return all(part in values for part, values in zip(parts, schedule))
 
 
 def run_task(task, thread=True, process=False, async=False):
@@ -33,11 +49,100 @@ def run_task(task, thread=True, process=False, async=False):
     return task_fn(*args, **kwargs)
 
 
+def run_periodic_task(task_id):
+    """ runs a periodic task synchronously, but logging TaskState """
+    ptask = PeriodicTask.objects.get(pk=task_id)
+    task = current_app.tasks[ptask.task]
+    args = json.loads(ptask.args)
+    kwargs = json.loads(ptask.kwargs)
+    # update() does not touch PeriodicTasks.last_change, the schedule is not rebuilt
+    PeriodicTask.objects.filter(pk=task_id).update(
+        last_run_at=timezone.now(), total_run_count=F('total_run_count')+1)
+    return keep_state(task)(*args, **kwargs)
+
+
+def get_next_fire(schedule, after):
+    """ first minute >= after matching the compiled crontab, None if it never matches """
+    minutes, hours, days_of_week, days_of_month, months = schedule
+    minute = after.replace(second=0, microsecond=0)
+    if minute < after:
+        minute += datetime.timedelta(minutes=1)
+    day = minute.replace(hour=0, minute=0)
+    first = True
+    # Leap years included, Feb 29th on a given weekday can take decades
+    for __ in range(366*28):
+        if (day.month in months and day.day in days_of_month and
+                (day.weekday()+1) % 7 in days_of_week):
+            for hour in sorted(hours):
+                if first and hour < minute.hour:
+                    continue
+                for cminute in sorted(minutes):
+                    if first and hour == minute.hour and cminute < minute.minute:
+                        continue
+                    return day.replace(hour=hour, minute=cminute)
+        first = False
+        day += datetime.timedelta(days=1)
+    return None
+
+
+class Schedule(object):
+    """
+    Heap of enabled periodic tasks keyed by their next fire time
+    
+    Only due tasks are looked at on each tick. The heap is rebuilt when periodic tasks
+    change, locally via signals and on other processes via djcelery's PeriodicTasks.
+    """
+    def __init__(self):
+        self.heap = None
+        self.last_change = None
+        self.lock = threading.Lock()
+    
+    def invalidate(self):
+        self.heap = None
+    
+    def build(self, now):
+        heap = []
+        for task in PeriodicTask.objects.enabled().select_related('crontab'):
+            if task.crontab is None:
+                continue
+            schedule = compile_task(task)
+            fire = get_next_fire(schedule, now.replace(second=0, microsecond=0))
+            if fire is not None:
+                heap.append((fire, task.pk, task, schedule))
+        heapq.heapify(heap)
+        return heap
+    
+    def get_due_tasks(self, now):
+        with self.lock:
+            last_change = PeriodicTasks.last_change()
+            if self.heap is None or last_change != self.last_change:
+                self.heap = self.build(now)
+                self.last_change = last_change
+            due = []
+            # Missed minutes are not caught up, each task fires at most once per tick
+            next_minute = now.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+            while self.heap and self.heap[0][0] <= now:
+                fire, pk, task, schedule = heapq.heappop(self.heap)
+                due.append(task)
+                fire = get_next_fire(schedule, next_minute)
+                if fire is not None:
+                    heapq.heappush(self.heap, (fire, pk, task, schedule))
+            return due
+
+
+schedule = Schedule()
+
+
+def get_due_tasks(now=None):
+    if now is None:
+        now = timezone.now()
+    return schedule.get_due_tasks(now)
+
+
 def run():
     now = timezone.now()
     procs = []
-    for task in PeriodicTask.objects.enabled().select_related('crontab'):
-        if is_due(task, now):
-            proc = run_task(task, process=True, async=True)
-            procs.append(proc)
+    for task in get_due_tasks(now):
+        proc = run_task(task, process=True, async=True)
+        procs.append(proc)
     [proc.join() for proc in procs]
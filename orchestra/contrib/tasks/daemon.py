@@ -0,0 +1,100 @@
+import logging
+import multiprocessing
+import signal
+import time
+
+from django import db
+from django.apps import apps
+from django.utils import timezone
+
+from . import beat, settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class BeatDaemon(object):
+    """
+    Long-running alternative to orchestra-beat cron execution
+    
+    Django is loaded once and a pool of workers is forked from the scheduler process,
+    sharing its memory copy-on-write. Every minute due periodic tasks and pending
+    mail deliveries are dispatched to the workers through a local queue, avoiding
+    the startup cost of a new manage.py process per task.
+    """
+    SEND_PENDING_MESSAGES = 'sendpendingmessages'
+    
+    def __init__(self, workers=None):
+        self.num_workers = workers or settings.TASKS_BEAT_WORKERS
+        self.context = multiprocessing.get_context('fork')
+        self.queue = self.context.Queue()
+        self.workers = []
+        self.running = False
+    
+    def start_worker(self):
+        # Children must not inherit the scheduler's database connections
+        db.connections.close_all()
+        worker = self.context.Process(target=self.work, name='beat-worker')
+        worker.start()
+        return worker
+    
+    def work(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            try:
+                self.execute(job)
+            except Exception:
+                logger.exception("Beat worker failed executing %s" % (job,))
+            finally:
+                db.close_old_connections()
+    
+    def execute(self, job):
+        if job == self.SEND_PENDING_MESSAGES:
+            from orchestra.contrib.mailer.engine import send_pending
+            from .decorators import keep_state
+            keep_state(send_pending)()
+        else:
+            beat.run_periodic_task(job)
+    
+    def get_jobs(self, now):
+        jobs = [task.pk for task in beat.get_due_tasks(now)]
+        if apps.is_installed('orchestra.contrib.mailer'):
+            from orchestra.contrib.mailer.engine import has_pending
+            if has_pending():
+                jobs.append(self.SEND_PENDING_MESSAGES)
+        return jobs
+    
+    def tick(self, now):
+        # Replace workers that died unexpectedly
+        self.workers = [worker for worker in self.workers if worker.is_alive()]
+        while len(self.workers) < self.num_workers:
+            self.workers.append(self.start_worker())
+        try:
+            for job in self.get_jobs(now):
+                self.queue.put(job)
+        finally:
+            db.connections.close_all()
+    
+    def stop(self, *args):
+        self.running = False
+    
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.running = True
+        next_minute = int(time.time()) // 60 * 60
+        try:
+            while self.running:
+                self.tick(timezone.now())
+                next_minute += 60
+                while self.running and time.time() < next_minute:
+                    time.sleep(min(1, max(next_minute-time.time(), 0)))
+        finally:
+            for worker in self.workers:
+                self.queue.put(None)
+            for worker in self.workers:
+                worker.join()
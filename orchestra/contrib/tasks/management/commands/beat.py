@@ -6,5 +6,15 @@ from ... import beat
 class Command(BaseCommand):
     help = 'Runs periodic tasks.'
     
+    def add_arguments(self, parser):
+        parser.add_argument('--daemon', action='store_true', dest='daemon', default=False,
+            help='Keeps running and dispatches due tasks to a pool of forked workers every minute.')
+        parser.add_argument('--workers', type=int, dest='workers', default=None,
+            help='Number of worker processes in daemon mode.')
+    
     def handle(self, *args, **options):
-        beat.run()
+        if options.get('daemon'):
+            from ...daemon import BeatDaemon
+            BeatDaemon(workers=options.get('workers')).run()
+        else:
+            beat.run()
@@ -1,10 +1,7 @@
-import json
-
 from celery import current_app
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from djcelery.models import PeriodicTask
 
+from ... import beat
 from ...decorators import keep_state
 
 
@@ -21,13 +18,7 @@ class Command(BaseCommand):
         task = options.get('task')
         if task.isdigit():
             # periodic task
-            ptask = PeriodicTask.objects.get(pk=int(task))
-            task = current_app.tasks[ptask.task]
-            args = json.loads(ptask.args)
-            kwargs = json.loads(ptask.kwargs)
-            ptask.last_run_at = timezone.now()
-            ptask.total_run_count += 1
-            ptask.save()
+            beat.run_periodic_task(int(task))
         else:
             # task name
             task = current_app.tasks[task]
@@ -44,5 +35,5 @@ class Command(BaseCommand):
                         arg = int(arg)
                     arguments.append(arg)
             args = arguments
-        # Run task synchronously, but logging TaskState
-        keep_state(task)(*args, **kwargs)
+            # Run task synchronously, but logging TaskState
+            keep_state(task)(*args, **kwargs)
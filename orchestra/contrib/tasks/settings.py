@@ -21,3 +21,9 @@ TASKS_ENABLE_UWSGI_CRON_BEAT = Setting('TASKS_ENABLE_UWSGI_CRON_BEAT',
 TASKS_BACKEND_CLEANUP_DAYS = Setting('TASKS_BACKEND_CLEANUP_DAYS',
     10,
 )
+
+
+TASKS_BEAT_WORKERS = Setting('TASKS_BEAT_WORKERS',
+    4,
+    help_text="Number of forked worker processes used by <tt>beat --daemon</tt>.",
+)
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender='djcelery.PeriodicTask', dispatch_uid='tasks.periodictask_save_schedule')
+@receiver(post_delete, sender='djcelery.PeriodicTask', dispatch_uid='tasks.periodictask_delete_schedule')
+@receiver(post_save, sender='djcelery.CrontabSchedule', dispatch_uid='tasks.crontab_save_schedule')
+@receiver(post_delete, sender='djcelery.CrontabSchedule', dispatch_uid='tasks.crontab_delete_schedule')
+def invalidate_schedule(sender, **kwargs):
+    """ other processes notice PeriodicTask changes through djcelery's PeriodicTasks """
+    from .beat import schedule
+    schedule.invalidate()
@@ -0,0 +1,57 @@
+import datetime
+
+from django.utils import timezone
+from djcelery.models import CrontabSchedule, PeriodicTask, PeriodicTasks
+
+from orchestra.utils.tests import BaseTestCase
+
+from .. import beat
+from ..tasks import backend_logs_cleanup
+
+
+class ScheduleTests(BaseTestCase):
+    def setUp(self):
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        self.crontab = CrontabSchedule.objects.create(minute='*', hour='*',
+            day_of_week='*', day_of_month='*', month_of_year='*')
+        self.task = PeriodicTask.objects.create(name='cleanup', crontab=self.crontab,
+            task='.'.join((backend_logs_cleanup.__module__, backend_logs_cleanup.__name__)))
+        self.schedule = beat.Schedule()
+    
+    def test_get_due_tasks(self):
+        self.assertEqual([self.task.pk], [task.pk for task in self.schedule.get_due_tasks(self.now)])
+        self.assertEqual([], self.schedule.get_due_tasks(self.now+datetime.timedelta(seconds=30)))
+        now = self.now + datetime.timedelta(minutes=1)
+        self.assertEqual([self.task.pk], [task.pk for task in self.schedule.get_due_tasks(now)])
+    
+    def test_missed_minutes(self):
+        self.schedule.get_due_tasks(self.now)
+        now = self.now + datetime.timedelta(minutes=5, seconds=10)
+        self.assertEqual([self.task.pk], [task.pk for task in self.schedule.get_due_tasks(now)])
+        self.assertEqual([], self.schedule.get_due_tasks(now+datetime.timedelta(seconds=20)))
+        now = self.now + datetime.timedelta(minutes=6)
+        self.assertEqual([self.task.pk], [task.pk for task in self.schedule.get_due_tasks(now)])
+    
+    def test_rebuild_on_change(self):
+        self.schedule.get_due_tasks(self.now)
+        heap = self.schedule.heap
+        self.task.enabled = False
+        self.task.save()
+        # Other processes only notice the change through PeriodicTasks
+        PeriodicTasks.changed(self.task)
+        now = self.now + datetime.timedelta(minutes=1)
+        self.assertEqual([], self.schedule.get_due_tasks(now))
+        self.assertIsNot(heap, self.schedule.heap)
+    
+    def test_run_periodic_task(self):
+        last_change = PeriodicTasks.last_change()
+        self.schedule.get_due_tasks(self.now)
+        heap = self.schedule.heap
+        beat.run_periodic_task(self.task.pk)
+        beat.run_periodic_task(self.task.pk)
+        task = PeriodicTask.objects.get(pk=self.task.pk)
+        self.assertEqual(2, task.total_run_count)
+        self.assertIsNotNone(task.last_run_at)
+        self.assertEqual(last_change, PeriodicTasks.last_change())
+        self.schedule.get_due_tasks(self.now+datetime.timedelta(minutes=1))
+        self.assertIs(heap, self.schedule.heap)
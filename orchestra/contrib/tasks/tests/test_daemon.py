@@ -0,0 +1,101 @@
+import queue
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+from djcelery.models import CrontabSchedule, PeriodicTask
+
+from orchestra.contrib.mailer.models import Message
+from orchestra.utils.tests import BaseTestCase
+
+from .. import beat
+from ..daemon import BeatDaemon
+from ..tasks import backend_logs_cleanup
+
+
+class Worker(object):
+    """ stands for a forked worker process """
+    def __init__(self):
+        self.alive = True
+    
+    def is_alive(self):
+        return self.alive
+
+
+class DaemonTestMixin(object):
+    def create_task(self):
+        crontab = CrontabSchedule.objects.create(minute='*', hour='*',
+            day_of_week='*', day_of_month='*', month_of_year='*')
+        return PeriodicTask.objects.create(name='cleanup', crontab=crontab,
+            task='.'.join((backend_logs_cleanup.__module__, backend_logs_cleanup.__name__)))
+    
+    def create_message(self):
+        message = Message(to_address='to@example.com', from_address='from@example.com',
+            subject='Subject')
+        message.content = 'Content'
+        message.save()
+        return message
+
+
+class BeatDaemonTests(DaemonTestMixin, BaseTestCase):
+    def setUp(self):
+        # The schedule is shared with orchestra-beat, built from other tests' tasks
+        beat.schedule.invalidate()
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        self.task = self.create_task()
+        self.daemon = BeatDaemon(workers=1)
+    
+    def test_get_jobs(self):
+        self.assertEqual([self.task.pk], self.daemon.get_jobs(self.now))
+        self.assertEqual([], self.daemon.get_jobs(self.now))
+    
+    def test_get_jobs_pending_messages(self):
+        message = self.create_message()
+        jobs = [self.task.pk, BeatDaemon.SEND_PENDING_MESSAGES]
+        self.assertEqual(jobs, self.daemon.get_jobs(self.now))
+        self.assertEqual(jobs[1:], self.daemon.get_jobs(self.now))
+        message.sent()
+        self.assertEqual([], self.daemon.get_jobs(self.now))
+    
+    def test_execute(self):
+        self.daemon.execute(self.task.pk)
+        task = PeriodicTask.objects.get(pk=self.task.pk)
+        self.assertEqual(1, task.total_run_count)
+        self.assertIsNotNone(task.last_run_at)
+
+
+class TickTests(DaemonTestMixin, TransactionTestCase):
+    """ tick() closes the database connections, not allowed inside TestCase transactions """
+    def setUp(self):
+        beat.schedule.invalidate()
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        self.task = self.create_task()
+        self.daemon = BeatDaemon(workers=2)
+        self.daemon.queue = queue.Queue()
+        self.started = []
+        def start_worker():
+            worker = Worker()
+            self.started.append(worker)
+            return worker
+        self.daemon.start_worker = start_worker
+    
+    def get_queued(self):
+        jobs = []
+        while not self.daemon.queue.empty():
+            jobs.append(self.daemon.queue.get_nowait())
+        return jobs
+    
+    def test_tick(self):
+        self.create_message()
+        self.daemon.tick(self.now)
+        self.assertEqual(2, len(self.daemon.workers))
+        self.assertEqual([self.task.pk, BeatDaemon.SEND_PENDING_MESSAGES], self.get_queued())
+    
+    def test_replace_dead_workers(self):
+        self.daemon.tick(self.now)
+        self.assertEqual([self.task.pk], self.get_queued())
+        dead, alive = self.started
+        dead.alive = False
+        self.daemon.tick(self.now)
+        self.assertEqual([], self.get_queued())
+        self.assertEqual(3, len(self.started))
+        self.assertEqual([alive, self.started[2]], self.daemon.workers)
@@ -2,10 +2,10 @@ import os
 import textwrap
 from collections import OrderedDict
 
-from django.template import Template, Context
 from django.utils.translation import ugettext_lazy as _
 
 from orchestra.contrib.orchestration import ServiceController
+from orchestra.utils.templates import render_template
 
 from . import WebAppServiceMixin
 from .. import settings, utils
@@ -203,7 +203,7 @@ class PHPController(WebAppServiceMixin, ServiceController):
             'request_terminate_timeout': options.get('timeout', False),
         })
         context['fpm_listen'] = webapp.type_instance.FPM_LISTEN % context
-        fpm_config = Template(textwrap.dedent("""\
+        return render_template("""\
             ;; {{ banner }}
             [{{ user }}]
             user = {{ user }}
@@ -220,9 +220,7 @@ class PHPController(WebAppServiceMixin, ServiceController):
             request_terminate_timeout = {{ request_terminate_timeout }}{% endif %}
             {% for name, value in init_vars.items %}
             php_admin_value[{{ name | safe }}] = {{ value | safe }}{% endfor %}
-            """
-        ))
-        return fpm_config.render(Context(context))
+            """, context)
     
     def get_fcgid_wrapper(self, webapp, context):
         opt = webapp.type_instance
@@ -0,0 +1,88 @@
+import textwrap
+from collections import OrderedDict
+
+from django.template import Template, Context
+
+from orchestra.utils.python import AttrDict
+from orchestra.utils.tests import BaseTestCase
+
+from .. import settings
+from ..backends.php import PHPController
+
+
+def get_fpm_config(controller, webapp, context):
+    """ Former implementation, compiling the template on every call """
+    options = webapp.type_instance.get_options()
+    context.update({
+        'init_vars': webapp.type_instance.get_php_init_vars(merge=controller.MERGE),
+        'max_children': options.get('processes', settings.WEBAPPS_FPM_DEFAULT_MAX_CHILDREN),
+        'request_terminate_timeout': options.get('timeout', False),
+    })
+    context['fpm_listen'] = webapp.type_instance.FPM_LISTEN % context
+    fpm_config = Template(textwrap.dedent("""\
+            ;; {{ banner }}
+            [{{ user }}]
+            user = {{ user }}
+            group = {{ group }}
+            
+            listen = {{ fpm_listen | safe }}
+            listen.owner = {{ user }}
+            listen.group = {{ group }}
+            
+            pm = ondemand
+            pm.max_requests = {{ max_requests }}
+            pm.max_children = {{ max_children }}
+            {% if request_terminate_timeout %}
+            request_terminate_timeout = {{ request_terminate_timeout }}{% endif %}
+            {% for name, value in init_vars.items %}
+            php_admin_value[{{ name | safe }}] = {{ value | safe }}{% endfor %}
+            """
+    ))
+    return fpm_config.render(Context(context))
+
+
+class PHPType(object):
+    """ Fake webapp type """
+    FPM_LISTEN = '/run/%(user)s-%(app_name)s.sock'
+    
+    def __init__(self, options, init_vars):
+        self.options = options
+        self.init_vars = init_vars
+    
+    def get_options(self):
+        return self.options
+    
+    def get_php_init_vars(self, merge=False):
+        return self.init_vars
+
+
+class PHPControllerTests(BaseTestCase):
+    def get_context(self, user):
+        return {
+            'banner': 'Managed by Orchestra',
+            'user': user,
+            'group': user,
+            'app_name': 'blog',
+            'max_requests': 200,
+        }
+    
+    def test_fpm_config(self):
+        controller = PHPController()
+        webapps = [
+            PHPType({}, OrderedDict()),
+            PHPType({'processes': 8, 'timeout': 60}, OrderedDict([
+                ('memory_limit', '256M'),
+                ('open_basedir', '/home/user/webapps/blog:/tmp'),
+                ('sendmail_path', '"/usr/sbin/sendmail -t -i -f <user@example.com>"'),
+            ])),
+            PHPType({'timeout': 0}, OrderedDict([('display_errors', 'Off')])),
+        ]
+        # Compiled templates are reused between calls
+        for __ in range(2):
+            for ix, type_instance in enumerate(webapps):
+                webapp = AttrDict(type_instance=type_instance)
+                user = 'user%i' % ix
+                self.assertEqual(
+                    get_fpm_config(controller, webapp, self.get_context(user)),
+                    controller.get_fpm_config(webapp, self.get_context(user))
+                )
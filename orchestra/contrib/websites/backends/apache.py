@@ -2,11 +2,11 @@ import os
 import re
 import textwrap
 
-from django.template import Template, Context
 from django.utils.translation import ugettext_lazy as _
 
 from orchestra.contrib.orchestration import ServiceController
 from orchestra.contrib.resources import ServiceMonitor
+from orchestra.utils.templates import render_template
 
 from .. import settings
 from ..utils import normurlpath
@@ -61,7 +61,7 @@ class Apache2Controller(ServiceController):
             'server_alias_lines': ' \\\n                '.join(context['server_alias'])
         })
         context['extra_conf'] = self.get_extra_conf(site, context, ssl)
-        return Template(textwrap.dedent("""\
+        return render_template("""\
             <VirtualHost{% for ip in ips %} {{ ip }}:{{ port }}{% endfor %}>
                 IncludeOptional /etc/apache2/site[s]-override/{{ site_unique_name }}.con[f]
                 ServerName {{ server_name }}\
@@ -75,12 +75,11 @@ class Apache2Controller(ServiceController):
             {% for line in extra_conf.splitlines %}
                 {{ line | safe }}{% endfor %}
             </VirtualHost>
-            """)
-        ).render(Context(context))
+            """, context)
     
     def render_redirect_https(self, context):
         context['port'] = self.HTTP_PORT
-        return Template(textwrap.dedent("""
+        return render_template("""
             <VirtualHost{% for ip in ips %} {{ ip }}:{{ port }}{% endfor %}>
                 ServerName {{ server_name }}\
             {% if server_alias %}
@@ -93,8 +92,7 @@ class Apache2Controller(ServiceController):
                 RewriteCond %{HTTPS} off
                 RewriteRule (.*) https://%{HTTP_HOST}%{REQUEST_URI}
             </VirtualHost>
-            """)
-        ).render(Context(context))
+            """, context)
     
     def save(self, site):
         context = self.get_context(site)
@@ -428,70 +426,113 @@ class Apache2Traffic(ServiceMonitor):
     """
     Parses apache logs,
     looking for the size of each request on the last word of the log line.
+    The logs of all the websites are read by a single process.
     """
     model = 'websites.Website'
     resource = ServiceMonitor.TRAFFIC
     verbose_name = _("Apache 2 Traffic")
+    script_executable = '/usr/bin/python'
     monthly_sum_old_values = True
     doc_settings = (settings,
         ('WEBSITES_TRAFFIC_IGNORE_HOSTS',)
     )
     
     def prepare(self):
-        super(Apache2Traffic, self).prepare()
-        ignore_hosts = '\\|'.join(settings.WEBSITES_TRAFFIC_IGNORE_HOSTS)
         context = {
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'ignore_hosts': '-v "%s"' % ignore_hosts if ignore_hosts else '',
+            'ignore_hosts': repr('|'.join(settings.WEBSITES_TRAFFIC_IGNORE_HOSTS)),
         }
+        self.append_log_reader()
         self.append(textwrap.dedent("""\
-            function monitor () {
-                OBJECT_ID=$1
-                INI_DATE=$(date "+%%Y%%m%%d%%H%%M%%S" -d "$2")
-                END_DATE=$(date '+%%Y%%m%%d%%H%%M%%S' -d '%(current_date)s')
-                LOG_FILE="$3"
-                {
-                    { grep %(ignore_hosts)s ${LOG_FILE} || echo -e '\\r'; } \\
-                        | awk -v ini="${INI_DATE}" -v end="${END_DATE}" '
-                            BEGIN {
-                                sum = 0
-                                months["Jan"] = "01"
-                                months["Feb"] = "02"
-                                months["Mar"] = "03"
-                                months["Apr"] = "04"
-                                months["May"] = "05"
-                                months["Jun"] = "06"
-                                months["Jul"] = "07"
-                                months["Aug"] = "08"
-                                months["Sep"] = "09"
-                                months["Oct"] = "10"
-                                months["Nov"] = "11"
-                                months["Dec"] = "12"
-                            } {
-                                # date = [11/Jul/2014:13:50:41
-                                date = substr($4, 2)
-                                year = substr(date, 8, 4)
-                                month = months[substr(date, 4, 3)];
-                                day = substr(date, 1, 2)
-                                hour = substr(date, 13, 2)
-                                minute = substr(date, 16, 2)
-                                second = substr(date, 19, 2)
-                                line_date = year month day hour minute second
-                                if ( line_date > ini && line_date < end)
-                                    sum += $NF
-                            } END {
-                                print sum
-                            }' || [[ $? == 1 ]] && true
-                } | xargs echo ${OBJECT_ID}
-            }""") % context)
+            import re
+            import sys
+            from datetime import datetime
+            from dateutil import tz
+            
+            def to_local_timezone(date, tzlocal=tz.tzlocal()):
+                date = datetime.strptime(date, '%Y-%m-%d %H:%M:%S %Z')
+                date = date.replace(tzinfo=tz.tzutc())
+                date = date.astimezone(tzlocal)
+                return date
+            
+            # Use local timezone
+            end_date = to_local_timezone('{current_date}')
+            end_date = int(end_date.strftime('%Y%m%d%H%M%S'))
+            ignore_hosts = {ignore_hosts}
+            ignore_hosts = re.compile(ignore_hosts) if ignore_hosts else None
+            sites = []
+            months = {{
+                'Jan': '01',
+                'Feb': '02',
+                'Mar': '03',
+                'Apr': '04',
+                'May': '05',
+                'Jun': '06',
+                'Jul': '07',
+                'Aug': '08',
+                'Sep': '09',
+                'Oct': '10',
+                'Nov': '11',
+                'Dec': '12',
+            }}
+            
+            def prepare(object_id, access_log, ini_date):
+                global sites
+                ini_date = to_local_timezone(ini_date)
+                ini_date = int(ini_date.strftime('%Y%m%d%H%M%S'))
+                sites.append([ini_date, object_id, access_log, 0])
+            
+            def monitor(sites, end_date, months, ignore_hosts):
+                # Consecutive lines share the hour, '[11/Jul/2014:13' -> '2014071113'
+                hours = {{}}
+                for site in sites:
+                    ini_date = site[0]
+                    reader = LogReader(log_state, site[2], ini_date, end_date)
+                    for line in reader:
+                        if ignore_hosts and ignore_hosts.search(line):
+                            continue
+                        line = line.split()
+                        if len(line) < 4:
+                            continue
+                        # [11/Jul/2014:13:50:41
+                        date = line[3]
+                        try:
+                            hour = hours[date[:15]]
+                        except KeyError:
+                            try:
+                                day, month, year = date[1:15].split('/')
+                                year, hour = year.split(':')
+                                hour = year + months[month] + day + hour
+                            except (ValueError, KeyError):
+                                continue
+                            hours[date[:15]] = hour
+                        try:
+                            date = int(hour + date[16:18] + date[19:21])
+                        except ValueError:
+                            continue
+                        if ini_date < date < end_date:
+                            try:
+                                site[3] += int(line[-1])
+                            except ValueError:
+                                pass
+                        elif date >= end_date:
+                            reader.hold()
+                for ini_date, object_id, access_log, size in sites:
+                    sys.stdout.write('%s %s\\n' % (object_id, size))
+            """).format(**context)
+        )
     
     def monitor(self, site):
         context = self.get_context(site)
-        self.append('monitor {object_id} "{last_date}" {log_file}'.format(**context))
+        self.append("prepare(%(object_id)s, '%(log_file)s', '%(last_date)s')" % context)
+    
+    def commit(self):
+        self.append('monitor(sites, end_date, months, ignore_hosts)')
+        self.append('log_state.save()')
     
     def get_context(self, site):
         return {
-            'log_file': '%s{,.1}' % site.get_www_access_log_path(),
+            'log_file': site.get_www_access_log_path(),
             'last_date': self.get_last_date(site.pk).strftime("%Y-%m-%d %H:%M:%S %Z"),
             'object_id': site.pk,
         }
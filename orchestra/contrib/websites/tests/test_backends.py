@@ -0,0 +1,182 @@
+import datetime
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+from django.template import Template, Context
+
+from orchestra.contrib.resources import settings as resources_settings
+from orchestra.utils.python import AttrDict
+from orchestra.utils.tests import BaseTestCase
+
+from ..backends.apache import Apache2Controller, Apache2Traffic
+
+
+def render_virtual_host(controller, site, context, ssl=False):
+    """ Former implementation, compiling the template on every call """
+    context.update({
+        'port': controller.HTTPS_PORT if ssl else controller.HTTP_PORT,
+        'vhost_set_fcgid': False,
+        'server_alias_lines': ' \\\n                '.join(context['server_alias'])
+    })
+    context['extra_conf'] = controller.get_extra_conf(site, context, ssl)
+    return Template(textwrap.dedent("""\
+            <VirtualHost{% for ip in ips %} {{ ip }}:{{ port }}{% endfor %}>
+                IncludeOptional /etc/apache2/site[s]-override/{{ site_unique_name }}.con[f]
+                ServerName {{ server_name }}\
+            {% if server_alias %}
+                ServerAlias {{ server_alias_lines }}{% endif %}\
+            {% if access_log %}
+                CustomLog {{ access_log }} common{% endif %}\
+            {% if error_log %}
+                ErrorLog {{ error_log }}{% endif %}
+                SuexecUserGroup {{ user }} {{ group }}\
+            {% for line in extra_conf.splitlines %}
+                {{ line | safe }}{% endfor %}
+            </VirtualHost>
+            """)
+    ).render(Context(context))
+
+
+def render_redirect_https(controller, context):
+    """ Former implementation, compiling the template on every call """
+    context['port'] = controller.HTTP_PORT
+    return Template(textwrap.dedent("""
+            <VirtualHost{% for ip in ips %} {{ ip }}:{{ port }}{% endfor %}>
+                ServerName {{ server_name }}\
+            {% if server_alias %}
+                ServerAlias {{ server_alias|join:' ' }}{% endif %}\
+            {% if access_log %}
+                CustomLog {{ access_log }} common{% endif %}\
+            {% if error_log %}
+                ErrorLog {{ error_log }}{% endif %}
+                RewriteEngine On
+                RewriteCond %{HTTPS} off
+                RewriteRule (.*) https://%{HTTP_HOST}%{REQUEST_URI}
+            </VirtualHost>
+            """)
+    ).render(Context(context))
+
+
+class Apache2ControllerTests(BaseTestCase):
+    def get_sites(self):
+        extra_conf = 'Alias /static/ /home/user/static/\n<Directory /home/user/>\n</Directory>'
+        return [
+            AttrDict(extra_conf=''),
+            AttrDict(extra_conf=extra_conf),
+        ]
+    
+    def get_contexts(self):
+        return [
+            {
+                'ips': ['*'],
+                'site_unique_name': 'user-site',
+                'user': 'user',
+                'group': 'user',
+                'server_name': 'example.com',
+                'server_alias': [],
+                'access_log': '',
+                'error_log': '',
+            }, {
+                'ips': ['10.0.0.1', '10.0.0.2'],
+                'site_unique_name': 'user2-blog',
+                'user': 'user2',
+                'group': 'www-data',
+                'server_name': 'blog.example.com',
+                'server_alias': ['www.blog.example.com', 'blog.example.org'],
+                'access_log': '/var/log/apache2/virtual/blog.example.com.log',
+                'error_log': '/var/log/apache2/virtual/blog.example.com-error.log',
+            }
+        ]
+    
+    def test_render(self):
+        controller = Apache2Controller()
+        # Extra configuration without website directives and contents
+        controller.get_extra_conf = lambda site, context, ssl: site.extra_conf
+        # Compiled templates are reused between calls
+        for __ in range(2):
+            for site, context in zip(self.get_sites(), self.get_contexts()):
+                for ssl in (False, True):
+                    self.assertEqual(
+                        render_virtual_host(controller, site, dict(context), ssl=ssl),
+                        controller.render_virtual_host(site, dict(context), ssl=ssl)
+                    )
+                self.assertEqual(
+                    render_redirect_https(controller, dict(context)),
+                    controller.render_redirect_https(dict(context))
+                )
+
+
+class Apache2TrafficTests(BaseTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.state_dir = resources_settings.RESOURCES_MONITOR_STATE_DIR
+        resources_settings.RESOURCES_MONITOR_STATE_DIR = os.path.join(self.tmp, 'state')
+    
+    def tearDown(self):
+        resources_settings.RESOURCES_MONITOR_STATE_DIR = self.state_dir
+        shutil.rmtree(self.tmp)
+    
+    def write(self, path, lines):
+        with open(os.path.join(self.tmp, path), 'w') as handler:
+            for host, date, size in lines:
+                handler.write('%s - - [%s +0000] "GET / HTTP/1.1" 200 %s\n' % (host, date, size))
+    
+    def get_site(self, pk):
+        path = os.path.join(self.tmp, 'site%i.log' % pk)
+        return AttrDict(pk=pk, get_www_access_log_path=lambda: path)
+    
+    def run_monitor(self, sites, last_dates, current_date):
+        """ generates the script as the orchestration manager does and runs it """
+        monitor = Apache2Traffic()
+        monitor.current_date = current_date
+        monitor.last_dates = last_dates
+        monitor.set_head()
+        monitor.prepare()
+        monitor.set_content()
+        for site in sites:
+            monitor.monitor(site)
+        monitor.set_tail()
+        monitor.commit()
+        (method, cmds), = monitor.scripts
+        env = dict(os.environ, TZ='UTC')
+        output = subprocess.check_output([sys.executable], input='\n'.join(cmds).encode(), env=env)
+        return sorted(output.decode().splitlines())
+    
+    def test_monitor(self):
+        utc = datetime.timezone.utc
+        self.write('site1.log.1', [
+            # Before the last date
+            ('10.0.0.1', '11/Jul/2016:11:59:59', 1000),
+            ('10.0.0.1', '11/Jul/2016:12:30:00', 200),
+        ])
+        self.write('site1.log', [
+            ('10.0.0.1', '11/Jul/2016:13:00:00', 300),
+            # WEBSITES_TRAFFIC_IGNORE_HOSTS
+            ('127.0.0.1', '11/Jul/2016:13:05:00', 5000),
+            ('10.0.0.1', '11/Jul/2016:13:10:00', '-'),
+            # Not before the current date
+            ('10.0.0.1', '11/Jul/2016:14:00:00', 7),
+            ('10.0.0.1', '11/Jul/2016:14:30:00', 9),
+        ])
+        self.write('site2.log', [
+            # Not after the last date
+            ('10.0.0.2', '10/Jul/2016:00:00:00', 11),
+            ('10.0.0.2', '10/Jul/2016:08:00:00', 22),
+        ])
+        with open(os.path.join(self.tmp, 'site2.log'), 'a') as handler:
+            handler.write('malformed line without date 33\n')
+        sites = [self.get_site(pk) for pk in (1, 2, 3)]
+        last_dates = {
+            1: datetime.datetime(2016, 7, 11, 12, 0, 0, tzinfo=utc),
+            2: datetime.datetime(2016, 7, 10, 0, 0, 0, tzinfo=utc),
+            # No data, a day before the current date
+            3: None,
+        }
+        current_date = datetime.datetime(2016, 7, 11, 14, 0, 0, tzinfo=utc)
+        # Site 3 has no logs
+        self.assertEqual(['1 500', '2 22', '3 0'],
+            self.run_monitor(sites, last_dates, current_date))
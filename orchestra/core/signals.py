@@ -0,0 +1,6 @@
+import django.dispatch
+
+
+# Sent once per model by bulk operations in place of one post_save per instance,
+# post_save is not sent for these instances: receivers have to connect to both signals
+post_save_many = django.dispatch.Signal(providing_args=['instances', 'update_fields'])
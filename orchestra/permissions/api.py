@@ -1,9 +1,39 @@
+from django.contrib.auth import get_user_model
 from django.core.urlresolvers import resolve
 from rest_framework.permissions import DjangoModelPermissions
 
 
+def get_owner(obj):
+    """ account that owns obj, permission decisions are shared between objects of an owner """
+    if obj is None:
+        return None
+    if isinstance(obj, get_user_model()):
+        return ('account', obj.pk)
+    account_id = getattr(obj, 'account_id', None)
+    if account_id is not None:
+        return ('account', account_id)
+    return ('object', obj.pk)
+
+
 class OrchestraPermissionBackend(DjangoModelPermissions):
-    """ Permissions according to each user """
+    """ Permissions according to each user, decisions are cached during the request """
+    
+    def get_cache(self, request):
+        try:
+            return request._permission_cache
+        except AttributeError:
+            request._permission_cache = {}
+            return request._permission_cache
+    
+    def has_perms(self, request, perms, model_cls, obj=None):
+        cache = self.get_cache(request)
+        key = (request.user.pk, tuple(perms), model_cls._meta.label, get_owner(obj))
+        try:
+            return cache[key]
+        except KeyError:
+            has_perms = request.user.has_perms(perms, model_cls if obj is None else obj)
+            cache[key] = has_perms
+            return has_perms
     
     def has_permission(self, request, view):
         queryset = getattr(view, 'queryset', None)
@@ -15,7 +45,7 @@ class OrchestraPermissionBackend(DjangoModelPermissions):
         perms = self.get_required_permissions(request.method, model_cls)
         if (request.user and
             request.user.is_authenticated() and
-            request.user.has_perms(perms, model_cls)):
+            self.has_perms(request, perms, model_cls)):
             return True
         return False
     
@@ -23,6 +53,7 @@ class OrchestraPermissionBackend(DjangoModelPermissions):
         perms = self.get_required_permissions(request.method, type(obj))
         if (request.user and
             request.user.is_authenticated() and
-            request.user.has_perms(perms, obj)):
+            self.has_perms(request, perms, type(obj), obj)):
             return True
         return False
+
@@ -0,0 +1,58 @@
+from orchestra.contrib.accounts.models import Account
+from orchestra.contrib.systemusers.models import SystemUser
+from orchestra.utils.python import AttrDict
+from orchestra.utils.tests import BaseTestCase
+
+from ..api import OrchestraPermissionBackend
+
+
+class User(object):
+    """ Fake user counting permission checks """
+    pk = 1
+    
+    def __init__(self):
+        self.checks = []
+    
+    def has_perms(self, perms, obj):
+        self.checks.append((perms, obj))
+        return getattr(obj, 'account_id', None) != 3
+
+
+class PermissionCacheTests(BaseTestCase):
+    DEPENDENCIES = (
+        'orchestra.contrib.systemusers',
+    )
+    
+    def setUp(self):
+        self.backend = OrchestraPermissionBackend()
+        self.user = User()
+        self.request = AttrDict(user=self.user)
+        self.perms = ['systemusers.change_systemuser']
+    
+    def has_perms(self, obj=None, model=SystemUser, perms=None, request=None):
+        return self.backend.has_perms(request or self.request, perms or self.perms, model, obj)
+    
+    def test_same_owner(self):
+        self.assertTrue(self.has_perms(SystemUser(pk=1, account_id=2)))
+        self.assertTrue(self.has_perms(SystemUser(pk=2, account_id=2)))
+        self.assertEqual(1, len(self.user.checks))
+        self.assertFalse(self.has_perms(SystemUser(pk=3, account_id=3)))
+        self.assertFalse(self.has_perms(SystemUser(pk=4, account_id=3)))
+        self.assertEqual(2, len(self.user.checks))
+    
+    def test_different_keys(self):
+        obj = SystemUser(pk=1, account_id=2)
+        self.has_perms(obj)
+        self.has_perms()
+        self.has_perms(obj, perms=['systemusers.delete_systemuser'])
+        self.has_perms(Account(pk=2), model=Account)
+        self.assertEqual(4, len(self.user.checks))
+        self.has_perms(obj)
+        self.has_perms()
+        self.assertEqual(4, len(self.user.checks))
+    
+    def test_per_request(self):
+        obj = SystemUser(pk=1, account_id=2)
+        self.has_perms(obj)
+        self.has_perms(obj, request=AttrDict(user=self.user))
+        self.assertEqual(2, len(self.user.checks))
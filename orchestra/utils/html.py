@@ -1,4 +1,12 @@
+import atexit
+import collections
+import os
+import shutil
+import subprocess
 import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.templatetags.static import static
 from django.utils.translation import ugettext_lazy as _
@@ -6,8 +14,106 @@ from django.utils.translation import ugettext_lazy as _
 from orchestra.utils.sys import run
 
 
+class VirtualDisplay(object):
+    """
+    Headless X server shared by all the wkhtmltopdf executions of the process,
+    started on first use instead of spawning a new xvfb-run per document
+    """
+    SCREEN = '2480x3508x16'
+    
+    def __init__(self):
+        self.process = None
+        self.display = None
+        self.lock = threading.Lock()
+    
+    def get_free_display(self):
+        num = 99
+        while os.path.exists('/tmp/.X%i-lock' % num):
+            num += 1
+        return num
+    
+    def start(self):
+        for __ in range(5):
+            num = self.get_free_display()
+            process = subprocess.Popen(
+                ['Xvfb', ':%i' % num, '-screen', '0', self.SCREEN, '-nolisten', 'tcp'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            # Wait for the server to be ready, or to die because the display is taken
+            for __ in range(50):
+                if process.poll() is not None or os.path.exists('/tmp/.X11-unix/X%i' % num):
+                    break
+                time.sleep(0.1)
+            if process.poll() is None:
+                self.process = process
+                self.display = ':%i' % num
+                atexit.register(self.stop)
+                return self.display
+        raise OSError("Xvfb could not be started.")
+    
+    def get(self):
+        """ returns the display, None when Xvfb is not available """
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                if self.process is None and not shutil.which('Xvfb'):
+                    return None
+                self.start()
+            return self.display
+    
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+        self.process = None
+
+
+virtual_display = VirtualDisplay()
+
+
 def html_to_pdf(html, pagination=False):
     """ converts HTL to PDF using wkhtmltopdf """
+    display = virtual_display.get()
+    if display is None:
+        return xvfb_html_to_pdf(html, pagination=pagination)
+    cmd = ['wkhtmltopdf', '-q', '--use-xserver']
+    if pagination:
+        cmd += [
+            '--footer-center', 'Page [page] of [topage]',
+            '--footer-font-name', 'sans',
+            '--footer-font-size', '7',
+            '--footer-spacing', '7',
+        ]
+    cmd += ['--margin-bottom', '22', '--margin-top', '20', '-', '-']
+    env = dict(os.environ, DISPLAY=display)
+    env['PATH'] = env.get('PATH', '') + ':/usr/local/bin/'
+    process = subprocess.Popen(cmd, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate(html.encode('utf-8'))
+    if process.returncode != 0:
+        raise OSError("wkhtmltopdf exit code %i: %s" % (process.returncode, stderr.decode('utf8', 'replace')))
+    return stdout
+
+
+def html_to_pdf_many(documents, workers=4):
+    """
+    documents: iterable of (html, pagination)
+    yields the PDFs in the same order, rendering up to workers documents concurrently,
+    only the documents being rendered are kept in memory
+    """
+    if workers < 2:
+        for html, pagination in documents:
+            yield html_to_pdf(html, pagination=pagination)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = collections.deque()
+        for html, pagination in documents:
+            futures.append(executor.submit(html_to_pdf, html, pagination=pagination))
+            if len(futures) >= workers:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def xvfb_html_to_pdf(html, pagination=False):
     context = {
         'pagination': textwrap.dedent("""\
             --footer-center "Page [page] of [topage]" \\
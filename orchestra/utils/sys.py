@@ -67,8 +67,11 @@ def read_async(fd):
             return ''
 
 
-def runiterator(command, display=False, stdin=b''):
-    """ Subprocess wrapper for running commands concurrently """
+def runiterator(command, display=False, stdin=b'', timeout=None):
+    """
+    Subprocess wrapper for running commands concurrently
+    timeout: seconds after which an empty state is yielded when there is no output
+    """
     if display:
         sys.stderr.write("\n\033[1m $ %s\033[0m\n" % command)
     
@@ -87,7 +90,7 @@ def runiterator(command, display=False, stdin=b''):
         stdout = b''
         stderr = b''
         # Get complete unicode chunks
-        select.select([p.stdout, p.stderr], [], [])
+        select.select([p.stdout, p.stderr], [], [], timeout)
         
         stdoutPiece = read_async(p.stdout)
         stderrPiece = read_async(p.stderr)
@@ -151,8 +154,9 @@ def joinall(iterators, **kwargs):
     return results
 
 
-def run(command, display=False, valid_codes=(0,), silent=False, stdin=b'', async=False):
-    iterator = runiterator(command, display, stdin)
+def run(command, display=False, valid_codes=(0,), silent=False, stdin=b'', async=False,
+        timeout=None):
+    iterator = runiterator(command, display, stdin, timeout=timeout)
     next(iterator)
     if async:
         return iterator
@@ -0,0 +1,17 @@
+import textwrap
+from functools import lru_cache
+
+from django.template import Context, Template
+
+
+@lru_cache(maxsize=None)
+def compile_template(source):
+    """
+    Template sources are dedented and compiled once per process
+    Backends render configuration files of many objects with the same literal sources
+    """
+    return Template(textwrap.dedent(source))
+
+
+def render_template(source, context):
+    return compile_template(source).render(Context(context))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Before/after micro-benchmark of the configuration files rendered by the backends
+    before: the template is dedented and compiled on every call
+    after: orchestra.utils.templates.render_template()
+
+Usage, from the directory of an orchestra project:
+    DJANGO_SETTINGS_MODULE=panel.settings python3 render_templates.py [iterations]
+"""
+import sys
+import timeit
+from collections import OrderedDict
+
+import django
+django.setup()
+
+from orchestra.contrib.webapps.backends.php import PHPController
+from orchestra.contrib.webapps.tests.test_backends import PHPType, get_fpm_config
+from orchestra.contrib.websites.backends.apache import Apache2Controller
+from orchestra.contrib.websites.tests.test_backends import render_virtual_host
+from orchestra.utils.python import AttrDict
+
+
+def get_fpm_context():
+    return {
+        'banner': 'Managed by Orchestra',
+        'user': 'user',
+        'group': 'user',
+        'app_name': 'blog',
+        'max_requests': 200,
+    }
+
+
+def get_vhost_context():
+    return {
+        'ips': ['10.0.0.1', '10.0.0.2'],
+        'site_unique_name': 'user-blog',
+        'user': 'user',
+        'group': 'www-data',
+        'server_name': 'blog.example.com',
+        'server_alias': ['www.blog.example.com', 'blog.example.org'],
+        'access_log': '/var/log/apache2/virtual/blog.example.com.log',
+        'error_log': '/var/log/apache2/virtual/blog.example.com-error.log',
+    }
+
+
+def main(iterations):
+    php = PHPController()
+    webapp = AttrDict(type_instance=PHPType({'processes': 8, 'timeout': 60}, OrderedDict([
+        ('memory_limit', '256M'),
+        ('open_basedir', '/home/user/webapps/blog:/tmp'),
+    ])))
+    apache = Apache2Controller()
+    apache.get_extra_conf = lambda site, context, ssl: site.extra_conf
+    site = AttrDict(extra_conf='Alias /static/ /home/user/static/\n<Directory /home/user/>\n</Directory>')
+    benchmarks = (
+        ('PHPController.get_fpm_config',
+            lambda: get_fpm_config(php, webapp, get_fpm_context()),
+            lambda: php.get_fpm_config(webapp, get_fpm_context())),
+        ('Apache2Controller.render_virtual_host',
+            lambda: render_virtual_host(apache, site, get_vhost_context()),
+            lambda: apache.render_virtual_host(site, get_vhost_context())),
+    )
+    for name, before, after in benchmarks:
+        assert before() == after()
+        before_time = timeit.timeit(before, number=iterations)
+        after_time = timeit.timeit(after, number=iterations)
+        print("%s x%i: before %.3fs, after %.3fs (%.1fx)" % (
+            name, iterations, before_time, after_time, before_time/after_time))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)